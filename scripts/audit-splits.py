@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+# Audit generated splits for correctness, balance, and overlap.
+# Every partition of every split (under a path) is checked with vectorized checks,
+# and splits are audited in parallel.
+
+import argparse
+import functools
+import multiprocessing
+import os
+import re
+import sys
+
+import numpy
+
+import imagehash
+import puzzles
+import scoring
+import splits
+
+VIOLATIONS_NOTE_PATTERN = re.compile(r'^violations\((\d+)\)$')
+
+def auditPartition(splitDir, partition, options, labels, checkPixels):
+    '''
+    Returns: (summary, [failure, ...]).
+    '''
+
+    failures = []
+
+    cellLabels = splits.readCellLabels(splitDir, partition, labels)
+    puzzleLabels = splits.readPuzzleLabels(splitDir, partition)
+    notes = splits.readNotes(splitDir, partition)
+
+    numPuzzles = len(puzzleLabels)
+    correct = numpy.all(puzzleLabels == numpy.array(puzzles.PUZZLE_LABEL_CORRECT), axis = 1)
+    incorrect = numpy.all(puzzleLabels == numpy.array(puzzles.PUZZLE_LABEL_INCORRECT), axis = 1)
+
+    expectedPuzzles = 2 * options[splits.PARTITION_SIZE_OPTIONS[partition]]
+    if (numPuzzles != expectedPuzzles):
+        failures.append("Expected %d puzzles, found %d." % (expectedPuzzles, numPuzzles))
+
+    if (len(cellLabels) != numPuzzles or len(notes) != numPuzzles):
+        failures.append("Mismatched number of puzzles. Cell Labels: %d, Puzzle Labels: %d, Notes: %d." % (len(cellLabels), numPuzzles, len(notes)))
+        return "%d puzzles" % (numPuzzles), failures
+
+    if (numpy.any(~(correct | incorrect))):
+        failures.append("Found %d unknown puzzle labels." % (numpy.sum(~(correct | incorrect))))
+
+    if (numpy.sum(correct) != numpy.sum(incorrect)):
+        failures.append("Unbalanced puzzle labels. Correct: %d, Incorrect: %d." % (numpy.sum(correct), numpy.sum(incorrect)))
+
+    violations = scoring.countViolations(cellLabels, numLabels = len(labels))
+
+    if (numpy.any(violations[correct] != 0)):
+        failures.append("Found %d correct puzzles that fail checkPuzzle." % (numpy.sum(violations[correct] != 0)))
+
+    if (numpy.any(violations[incorrect] == 0)):
+        failures.append("Found %d incorrect puzzles that pass checkPuzzle." % (numpy.sum(violations[incorrect] == 0)))
+
+    solvedNotes = numpy.array([(len(row) > 0 and row[0] == puzzles.PUZZLE_NOTE_CORRRECT) for row in notes])
+    if (numpy.any(solvedNotes != correct)):
+        failures.append("Found %d puzzles where the notes disagree with the puzzle label." % (numpy.sum(solvedNotes != correct)))
+
+    # Notes may be annotated with the number of violations (see puzzles.ConstraintTracker).
+    noteViolations = numpy.full(numPuzzles, -1)
+    for i in range(numPuzzles):
+        for note in notes[i]:
+            match = VIOLATIONS_NOTE_PATTERN.match(note)
+            if (match is not None):
+                noteViolations[i] = int(match.group(1))
+
+    annotated = (noteViolations >= 0)
+    if (numpy.any(noteViolations[annotated] != violations[annotated])):
+        failures.append("Found %d puzzles where the noted violations are wrong." % (numpy.sum(noteViolations[annotated] != violations[annotated])))
+
+    labelCounts = numpy.bincount(cellLabels.reshape(-1), minlength = len(labels))
+    usedCounts = labelCounts[labelCounts > 0]
+
+    summary = "%d puzzles (%d correct, %d incorrect), %d labels used (%d - %d cells each), mean corrupt violations: %.2f" % (
+            numPuzzles, numpy.sum(correct), numpy.sum(incorrect),
+            len(usedCounts), usedCounts.min() if (len(usedCounts) > 0) else 0, usedCounts.max(initial = 0),
+            numpy.mean(violations[incorrect]) if numpy.any(incorrect) else 0.0)
+
+    if (options.get('labelsOnly', False)):
+        summary += ", labels only (no pixels)"
+    elif (checkPixels):
+        duplicateFraction = _duplicateFraction(splitDir, partition, correct)
+        # Without overlap, examples are never reused between correct puzzles
+        # (so any duplicates come from the overlap, or from duplicates in the source dataset).
+        summary += ", duplicate cells in correct puzzles: %.2f%% (overlap: %.2f)" % (duplicateFraction * 100.0, options['overlap'])
+
+    return summary, failures
+
+def _duplicateFraction(splitDir, partition, correct):
+    loader = splits.SplitLoader(splitDir, partition, shuffle = False)
+
+    digests = []
+    offset = 0
+    for (images, _, _) in loader:
+        batchCorrect = correct[offset:(offset + len(images))]
+        digests.append(imagehash.hashImages(images[batchCorrect]).reshape(-1))
+        offset += len(images)
+
+    digests = numpy.concatenate(digests)
+    if (len(digests) == 0):
+        return 0.0
+
+    return 1.0 - (len(numpy.unique(digests)) / len(digests))
+
+def auditSplit(splitDir, checkPixels):
+    '''
+    Returns: (splitDir, [report line, ...], number of failures).
+    '''
+
+    lines = []
+    numFailures = 0
+
+    try:
+        options = splits.loadOptions(splitDir)
+        labels = splits.getLabels(options)
+
+        for partition in splits.PARTITIONS:
+            summary, failures = auditPartition(splitDir, partition, options, labels, checkPixels)
+
+            lines.append("    %s: %s" % (partition, summary))
+            for failure in failures:
+                lines.append("        FAIL: %s" % (failure))
+
+            numFailures += len(failures)
+    except Exception as ex:
+        lines.append("    FAIL: %s: %s" % (type(ex).__name__, ex))
+        numFailures += 1
+
+    return splitDir, lines, numFailures
+
+def main(arguments):
+    splitDirs = splits.findSplits(arguments.path)
+    if (len(splitDirs) == 0):
+        print("Could not find any splits in: " + arguments.path, file = sys.stderr)
+        sys.exit(1)
+
+    audit = functools.partial(auditSplit, checkPixels = arguments.checkPixels)
+
+    failedSplits = 0
+    with multiprocessing.Pool(arguments.numWorkers) as pool:
+        # Report each split as soon as it (and all the splits before it) are done.
+        for (splitDir, lines, numFailures) in pool.imap(audit, splitDirs):
+            if (numFailures > 0):
+                failedSplits += 1
+
+            print("%s %s" % ('PASS' if (numFailures == 0) else 'FAIL', splitDir))
+            for line in lines:
+                print(line)
+
+    print("Passed %d / %d splits." % (len(splitDirs) - failedSplits, len(splitDirs)))
+
+    if (failedSplits > 0):
+        sys.exit(1)
+
+def _load_args():
+    parser = argparse.ArgumentParser(description = 'Audit generated splits for correctness, balance, and overlap.')
+
+    parser.add_argument('path',
+        action = 'store', type = str,
+        help = 'A split directory, or any directory above split directories (e.g. the root of a data tree).')
+
+    parser.add_argument('--no-pixels', dest = 'checkPixels',
+        action = 'store_false', default = True,
+        help = 'Skip reading pixels (and checking for duplicate images).')
+
+    parser.add_argument('--num-workers', dest = 'numWorkers',
+        action = 'store', type = int, default = os.cpu_count(),
+        help = 'The number of splits to audit in parallel (defaults to the number of cores).')
+
+    arguments = parser.parse_args()
+
+    if (arguments.numWorkers < 1):
+        print("Number of workers must be >= 1, got: %d." % (arguments.numWorkers), file = sys.stderr)
+        sys.exit(2)
+
+    return arguments
+
+if (__name__ == '__main__'):
+    main(_load_args())
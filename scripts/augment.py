@@ -0,0 +1,180 @@
+'''
+Seeded, batched image augmentation for gathered cell images.
+
+Every transform works on a whole batch of (flattened) images at once:
+rotations, shifts, and elastic distortions are combined into a single displacement of every pixel
+and applied with one bilinear sampling pass, then (optional) Gaussian noise is added.
+Augmented pixels are snapped back to the normalized intensities of the source datasets (see datasets.PIXEL_VALUES),
+so augmented splits can still be written as text or converted to binary without loss.
+'''
+
+import math
+
+import numpy
+
+import datasets
+
+DEFAULT_ELASTIC_SIGMA = 4.0
+
+# How many standard deviations the smoothing kernel for elastic distortions covers.
+KERNEL_WIDTH_SIGMAS = 3.0
+
+class Augmenter(object):
+    '''
+    A set of augmentations (all disabled by default):
+        rotation: the maximum rotation (in degrees, in either direction).
+        shift: the maximum shift (in pixels, in each direction).
+        noise: the standard deviation of additive Gaussian noise.
+        elastic: the strength (alpha) of elastic distortions (smoothed with a Gaussian of elasticSigma pixels).
+    Each image gets its own random parameters, all drawn from the rng (a numpy.random.Generator) passed to augment().
+    '''
+
+    def __init__(self, rotation = 0.0, shift = 0.0, noise = 0.0, elastic = 0.0, elasticSigma = DEFAULT_ELASTIC_SIGMA):
+        for (name, value) in [('rotation', rotation), ('shift', shift), ('noise', noise), ('elastic', elastic)]:
+            if (value < 0.0):
+                raise ValueError("Augmentation %s must be non-negative, got: %f." % (name, value))
+
+        if (elasticSigma <= 0.0):
+            raise ValueError("Elastic sigma must be positive, got: %f." % (elasticSigma))
+
+        self.rotation = rotation
+        self.shift = shift
+        self.noise = noise
+        self.elastic = elastic
+        self.elasticSigma = elasticSigma
+
+    def isEnabled(self):
+        return (self.rotation > 0.0 or self.shift > 0.0 or self.noise > 0.0 or self.elastic > 0.0)
+
+    def getOptions(self):
+        return {
+            'rotation': self.rotation,
+            'shift': self.shift,
+            'noise': self.noise,
+            'elastic': self.elastic,
+            'elasticSigma': self.elasticSigma,
+        }
+
+    def augment(self, images, rng):
+        '''
+        Augment a batch of images: float [..., MNIST_DIMENSION ** 2].
+        Returns a new array of the same shape.
+        '''
+
+        images = numpy.asarray(images)
+        shape = images.shape
+
+        images = images.reshape((-1, datasets.MNIST_DIMENSION, datasets.MNIST_DIMENSION))
+        numImages = len(images)
+
+        if (numImages == 0 or not self.isEnabled()):
+            return images.reshape(shape).copy()
+
+        rows, cols = _identityCoordinates(numImages)
+
+        if (self.rotation > 0.0 or self.shift > 0.0):
+            rows, cols = _affineCoordinates(rows, cols, rng, self.rotation, self.shift)
+
+        if (self.elastic > 0.0):
+            rowDisplacements = _smooth(rng.uniform(-1.0, 1.0, size = rows.shape), self.elasticSigma)
+            colDisplacements = _smooth(rng.uniform(-1.0, 1.0, size = cols.shape), self.elasticSigma)
+
+            rows = rows + (self.elastic * rowDisplacements)
+            cols = cols + (self.elastic * colDisplacements)
+
+        if (self.rotation > 0.0 or self.shift > 0.0 or self.elastic > 0.0):
+            images = _sample(images, rows, cols)
+
+        if (self.noise > 0.0):
+            images = images + rng.normal(0.0, self.noise, size = images.shape)
+
+        return quantize(images).reshape(shape)
+
+def quantize(images):
+    '''
+    Snap pixels to the closest normalized intensity (see datasets.PIXEL_VALUES).
+    '''
+
+    intensities = numpy.rint(numpy.clip(images, 0.0, 1.0) * 255).astype(numpy.uint8)
+    return datasets.PIXEL_VALUES[intensities]
+
+def _identityCoordinates(numImages):
+    '''
+    Returns: the (row, col) coordinate of every pixel, as two float [numImages, MNIST_DIMENSION, MNIST_DIMENSION] arrays.
+    '''
+
+    rows, cols = numpy.meshgrid(numpy.arange(datasets.MNIST_DIMENSION, dtype = float), numpy.arange(datasets.MNIST_DIMENSION, dtype = float), indexing = 'ij')
+    shape = (numImages, datasets.MNIST_DIMENSION, datasets.MNIST_DIMENSION)
+
+    return numpy.broadcast_to(rows, shape), numpy.broadcast_to(cols, shape)
+
+def _affineCoordinates(rows, cols, rng, maxDegrees, maxShift):
+    '''
+    Get the (source) coordinates for a random rotation (about the center) and shift of each image.
+    '''
+
+    numImages = len(rows)
+
+    angles = numpy.radians(rng.uniform(-maxDegrees, maxDegrees, size = numImages))[:, numpy.newaxis, numpy.newaxis]
+    rowShifts = rng.uniform(-maxShift, maxShift, size = numImages)[:, numpy.newaxis, numpy.newaxis]
+    colShifts = rng.uniform(-maxShift, maxShift, size = numImages)[:, numpy.newaxis, numpy.newaxis]
+
+    center = (datasets.MNIST_DIMENSION - 1) / 2.0
+    rows = rows - center - rowShifts
+    cols = cols - center - colShifts
+
+    # Each output pixel samples from the inverse rotation.
+    cosines = numpy.cos(angles)
+    sines = numpy.sin(angles)
+
+    return (cosines * rows) - (sines * cols) + center, (sines * rows) + (cosines * cols) + center
+
+def _smooth(fields, sigma):
+    '''
+    A Gaussian blur (zero padded) of [numImages, size, size] fields,
+    done as a multiplication by a banded matrix on each side.
+    '''
+
+    radius = int(math.ceil(KERNEL_WIDTH_SIGMAS * sigma))
+    kernel = numpy.exp(-0.5 * (numpy.arange(-radius, radius + 1) / sigma) ** 2)
+    kernel /= kernel.sum()
+
+    size = fields.shape[-1]
+    offsets = numpy.arange(size)[:, numpy.newaxis] - numpy.arange(size)[numpy.newaxis, :]
+    blur = numpy.where(numpy.abs(offsets) <= radius, kernel[numpy.clip(offsets + radius, 0, 2 * radius)], 0.0)
+
+    return blur @ fields @ blur.T
+
+def _sample(images, rows, cols):
+    '''
+    Bilinearly sample every image at (source) coordinates, where anything outside an image is background (0).
+    '''
+
+    (numImages, height, width) = images.shape
+
+    # Pad with a border of background, so every out-of-bounds coordinate can be clipped onto it.
+    padded = numpy.pad(images, ((0, 0), (1, 1), (1, 1))).reshape((numImages, -1))
+    paddedWidth = width + 2
+
+    row0 = numpy.floor(rows)
+    col0 = numpy.floor(cols)
+    rowWeights = rows - row0
+    colWeights = cols - col0
+
+    # Shift onto the padded image.
+    row0 = row0.astype(numpy.int64) + 1
+    col0 = col0.astype(numpy.int64) + 1
+
+    row1 = numpy.clip(row0 + 1, 0, height + 1)
+    col1 = numpy.clip(col0 + 1, 0, width + 1)
+    row0 = numpy.clip(row0, 0, height + 1)
+    col0 = numpy.clip(col0, 0, width + 1)
+
+    def gather(pixelRows, pixelCols):
+        indexes = (pixelRows * paddedWidth + pixelCols).reshape((numImages, -1))
+        return numpy.take_along_axis(padded, indexes, axis = 1).reshape(rows.shape)
+
+    top = (gather(row0, col0) * (1.0 - colWeights)) + (gather(row0, col1) * colWeights)
+    bottom = (gather(row1, col0) * (1.0 - colWeights)) + (gather(row1, col1) * colWeights)
+
+    return (top * (1.0 - rowWeights)) + (bottom * rowWeights)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Check for cell images that leak between the partitions of a split (e.g. an image in both train and test),
+# and optionally between different splits.
+# Every cell image is hashed into a compact index (see imagehash.HashIndex),
+# so images are never compared pairwise.
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+
+import imagehash
+import splits
+
+def indexSplit(splitDir):
+    '''
+    Returns: (splitDir, {partition: HashIndex, ...}).
+    '''
+
+    return splitDir, {partition: imagehash.HashIndex.fromSplit(splitDir, partition) for partition in splits.PARTITIONS}
+
+def _formatOverlap(name1, index1, name2, index2):
+    shared = index1.overlap(index2)
+    return shared, "%s / %s: %d shared images (%.2f%% of %s, %.2f%% of %s)" % (
+            name1, name2, shared,
+            100.0 * shared / max(1, len(index1)), name1,
+            100.0 * shared / max(1, len(index2)), name2)
+
+def main(arguments):
+    splitDirs = []
+    for path in arguments.paths:
+        splitDirs += splits.findSplits(path)
+
+    # Label-only splits have no images to leak.
+    for splitDir in splitDirs:
+        if (splits.isLabelsOnly(splitDir)):
+            print("SKIP %s (labels only)" % (splitDir))
+
+    splitDirs = [splitDir for splitDir in splitDirs if (not splits.isLabelsOnly(splitDir))]
+
+    if (len(splitDirs) == 0):
+        print("Could not find any splits in: [%s]." % (', '.join(arguments.paths)), file = sys.stderr)
+        sys.exit(1)
+
+    # {splitDir: {partition: HashIndex, ...}, ...}
+    indexes = {}
+    leakySplits = 0
+
+    with multiprocessing.Pool(arguments.numWorkers) as pool:
+        for (splitDir, partitionIndexes) in pool.imap(indexSplit, splitDirs):
+            lines = []
+            leaked = False
+
+            for (partition1, partition2) in itertools.combinations(splits.PARTITIONS, 2):
+                shared, line = _formatOverlap(partition1, partitionIndexes[partition1], partition2, partitionIndexes[partition2])
+                lines.append("    " + line)
+                leaked |= (shared > 0)
+
+            if (leaked):
+                leakySplits += 1
+
+            print("%s %s" % ('LEAK' if leaked else 'PASS', splitDir))
+            for line in lines:
+                print(line)
+
+            if (arguments.acrossSplits):
+                indexes[splitDir] = partitionIndexes
+
+    if (arguments.acrossSplits):
+        print("Across splits:")
+
+        for (splitDir1, splitDir2) in itertools.combinations(splitDirs, 2):
+            for (partition1, partition2) in itertools.product(splits.PARTITIONS, repeat = 2):
+                name1 = "%s (%s)" % (splitDir1, partition1)
+                name2 = "%s (%s)" % (splitDir2, partition2)
+
+                shared, line = _formatOverlap(name1, indexes[splitDir1][partition1], name2, indexes[splitDir2][partition2])
+                if (shared > 0):
+                    print("    " + line)
+
+    print("Found leaks in %d / %d splits." % (leakySplits, len(splitDirs)))
+
+    if (leakySplits > 0):
+        sys.exit(1)
+
+def _load_args():
+    parser = argparse.ArgumentParser(description = 'Check for cell images shared between partitions (and splits).')
+
+    parser.add_argument('paths', metavar = 'path',
+        action = 'store', type = str, nargs = '+',
+        help = 'A split directory, or any directory above split directories (e.g. the root of a data tree).')
+
+    parser.add_argument('--across-splits', dest = 'acrossSplits',
+        action = 'store_true', default = False,
+        help = 'Also report images shared between partitions of different splits.')
+
+    parser.add_argument('--num-workers', dest = 'numWorkers',
+        action = 'store', type = int, default = os.cpu_count(),
+        help = 'The number of splits to index in parallel (defaults to the number of cores).')
+
+    arguments = parser.parse_args()
+
+    if (arguments.numWorkers < 1):
+        print("Number of workers must be >= 1, got: %d." % (arguments.numWorkers), file = sys.stderr)
+        sys.exit(2)
+
+    return arguments
+
+if (__name__ == '__main__'):
+    main(_load_args())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+# Check that a PuzzleStream keeps the labels of each partition fixed for the whole stream.
+# Streams are built over a synthetic dataset (random images, so nothing has to be loaded),
+# and the labels they emit over many batches are compared:
+#  - a transfer train stream never emits a label of the test stream with the same seed,
+#  - an r_split stream never emits more than |dimension| labels.
+
+import argparse
+import sys
+
+import numpy
+
+import datasets
+import imagebank
+import puzzlestream
+
+DEFAULT_DIMENSION = 4
+DEFAULT_NUM_BATCHES = 50
+DEFAULT_NUM_SEEDS = 5
+
+# The number of puzzles reserved for each partition of a stream (see datasets.fetchData()).
+NUM_PUZZLES = 10
+
+def syntheticBank(datasetName, dimension, rng):
+    '''
+    A bank with random images for every label of a dataset (and just enough of them for NUM_PUZZLES puzzles per partition).
+    '''
+
+    numExamples = dimension * NUM_PUZZLES * 3
+
+    labels = datasets.getLabels(datasetName)
+    examples = {}
+    for label in labels:
+        intensities = rng.integers(0, 256, size = (numExamples, datasets.MNIST_DIMENSION ** 2))
+        examples[label] = list(datasets.PIXEL_VALUES[intensities])
+
+    return imagebank.SharedImageBank.create(examples, labels)
+
+def streamLabels(stream):
+    '''
+    Returns: the set of every label the stream emits.
+    '''
+
+    labels = set()
+    for (_, cellLabels, _) in stream:
+        labels.update([stream.labels[index] for index in numpy.unique(cellLabels).tolist()])
+
+    return labels
+
+def checkTransfer(dimension, bank, seed, numBatches):
+    streams = {}
+    for partition in ['train', 'test']:
+        streams[partition] = puzzlestream.PuzzleStream(dimension, [datasets.DATASET_MNIST], 'transfer',
+                partition = partition, numBatches = numBatches, numTrain = NUM_PUZZLES, numTest = NUM_PUZZLES, numValid = NUM_PUZZLES,
+                seed = seed, prefetch = 0, banks = {datasets.DATASET_MNIST: bank})
+
+    trainLabels = streamLabels(streams['train'])
+    testLabels = streamLabels(streams['test'])
+
+    return len(trainLabels & testLabels) == 0 and trainLabels <= set(streams['train'].partitionLabels[0])
+
+def checkRandomSplit(dimension, bank, seed, numBatches):
+    stream = puzzlestream.PuzzleStream(dimension, [datasets.DATASET_MNIST], 'r_split',
+            numBatches = numBatches, numTrain = NUM_PUZZLES, numTest = NUM_PUZZLES, numValid = NUM_PUZZLES,
+            seed = seed, prefetch = 0, banks = {datasets.DATASET_MNIST: bank})
+
+    return len(streamLabels(stream)) == dimension
+
+def main(arguments):
+    rng = numpy.random.default_rng(0)
+    bank = syntheticBank(datasets.DATASET_MNIST, arguments.dimension, rng)
+
+    failures = 0
+
+    try:
+        for seed in range(arguments.numSeeds):
+            for (name, check) in [('transfer', checkTransfer), ('r_split', checkRandomSplit)]:
+                passed = check(arguments.dimension, bank, seed, arguments.numBatches)
+                if (not passed):
+                    failures += 1
+
+                print("%s %s (seed: %d, batches: %d)" % ('PASS' if passed else 'FAIL', name, seed, arguments.numBatches))
+    finally:
+        bank.close()
+        bank.unlink()
+
+    if (failures > 0):
+        sys.exit(1)
+
+def _load_args():
+    parser = argparse.ArgumentParser(description = 'Check that puzzle streams keep the labels of each partition fixed.')
+
+    parser.add_argument('--dimension', dest = 'dimension',
+        action = 'store', type = int, default = DEFAULT_DIMENSION,
+        help = 'Size of the square grid to use.')
+
+    parser.add_argument('--num-batches', dest = 'numBatches',
+        action = 'store', type = int, default = DEFAULT_NUM_BATCHES,
+        help = 'The number of batches to draw from each stream.')
+
+    parser.add_argument('--num-seeds', dest = 'numSeeds',
+        action = 'store', type = int, default = DEFAULT_NUM_SEEDS,
+        help = 'The number of seeds (streams) to check.')
+
+    arguments = parser.parse_args()
+
+    if (arguments.dimension * 2 > datasets.NUM_LABELS[datasets.DATASET_MNIST]):
+        print("Dimension must be <= %d for transfer, got: %d." % (datasets.NUM_LABELS[datasets.DATASET_MNIST] // 2, arguments.dimension), file = sys.stderr)
+        sys.exit(2)
+
+    return arguments
+
+if (__name__ == '__main__'):
+    main(_load_args())
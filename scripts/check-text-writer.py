@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+# Check that the fast text writer for pixels (splits.writePixelRows()) writes exactly what the legacy writer (util.writeRows()) does,
+# and report how much faster it is.
+# Random puzzles (with no cells shared between them, plus some cells that are not normalized intensities) are written both ways and compared byte for byte.
+# The pixel files of existing (text) splits can also be rewritten and compared against the originals.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+
+import datasets
+import splits
+import textio
+import util
+
+DEFAULT_MIN_SPEEDUP = 10.0
+DEFAULT_NUM_PUZZLES = 64
+DEFAULT_SEED = 4
+
+# Each writer is timed this many times (and the fastest time is kept).
+TIMING_REPEATS = 5
+
+# About this fraction of the pixels in MNIST-style images are background.
+BACKGROUND_FRACTION = 0.8
+
+def randomPuzzles(dimension, numPuzzles, rng):
+    '''
+    Returns: float [numPuzzles, dimension, dimension, MNIST_DIMENSION ** 2] (the images strategies generate).
+    Every cell is drawn on its own (no cell is shared between puzzles), so the writer cannot gain anything from repeated cells.
+    '''
+
+    intensities = rng.integers(0, 256, size = (numPuzzles, dimension, dimension, datasets.MNIST_DIMENSION ** 2))
+    intensities[rng.random(size = intensities.shape) < BACKGROUND_FRACTION] = 0
+
+    images = datasets.PIXEL_VALUES[intensities]
+
+    # Cells the fast path does not cover (and has to write the legacy way).
+    images[0, 0, 0, 0] = 0.12345
+    images[-1, -1, -1, -1] = -0.0
+
+    return images
+
+def compare(images, tempDir):
+    '''
+    Returns: (identical, legacy seconds, fast seconds).
+    '''
+
+    legacyPath = os.path.join(tempDir, 'legacy.txt')
+    fastPath = os.path.join(tempDir, 'fast.txt')
+
+    # The legacy path: flatten every puzzle into a list of pixels, then format every pixel on its own.
+    def writeLegacy():
+        rows = [[pixel for row in puzzle for cell in row for pixel in cell] for puzzle in images]
+        util.writeRows(legacyPath, rows)
+
+    def writeFast():
+        splits.writePixelRows(fastPath, images.reshape((len(images), -1)))
+
+    # Alternate the writers, so they see the same conditions.
+    legacySeconds = []
+    fastSeconds = []
+    for _ in range(TIMING_REPEATS):
+        legacySeconds.append(_time(writeLegacy))
+        fastSeconds.append(_time(writeFast))
+
+    return _sameFiles(legacyPath, fastPath), min(legacySeconds), min(fastSeconds)
+
+def compareSplit(splitDir, partition, tempDir):
+    '''
+    Rewrite the text pixels of a split and compare them with the original file (decompressed, if it is compressed).
+    '''
+
+    path = splits.getPath(splitDir, partition, splits.PUZZLE_PIXELS_FILENAME)
+
+    with textio.openRead(path) as file:
+        images = [numpy.fromstring(line, dtype = numpy.float64, sep = '\t') for line in file]
+
+    fastPath = os.path.join(tempDir, 'split.txt')
+    splits.writePixelRows(fastPath, images)
+
+    return _sameFiles(path, fastPath)
+
+def _time(function):
+    startTime = time.perf_counter()
+    function()
+    return time.perf_counter() - startTime
+
+def _sameFiles(path1, path2):
+    # Compare the text, not how it is stored.
+    with textio.openRead(path1, binary = True) as file1, textio.openRead(path2, binary = True) as file2:
+        return file1.read() == file2.read()
+
+def main(arguments):
+    rng = numpy.random.default_rng(arguments.seed)
+    failures = 0
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        for dimension in [4, 9]:
+            images = randomPuzzles(dimension, arguments.numPuzzles, rng)
+            identical, legacySeconds, fastSeconds = compare(images, tempDir)
+            speedup = legacySeconds / max(fastSeconds, 1e-9)
+
+            passed = identical and (speedup >= arguments.minSpeedup)
+            if (not passed):
+                failures += 1
+
+            print("%s %dx%d: %d puzzles, identical: %s, legacy: %.3fs, fast: %.3fs (%.1fx)" % (
+                    'PASS' if passed else 'FAIL', dimension, dimension, len(images), identical, legacySeconds, fastSeconds, speedup))
+
+        if (arguments.path is not None):
+            for splitDir in splits.findSplits(arguments.path):
+                for partition in splits.PARTITIONS:
+                    if (not os.path.isfile(splits.getPath(splitDir, partition, splits.PUZZLE_PIXELS_FILENAME))):
+                        continue
+
+                    identical = compareSplit(splitDir, partition, tempDir)
+                    if (not identical):
+                        failures += 1
+
+                    print("%s %s (%s)" % ('PASS' if identical else 'FAIL', splitDir, partition))
+
+    if (failures > 0):
+        sys.exit(1)
+
+def _load_args():
+    parser = argparse.ArgumentParser(description = 'Check the fast text writer for pixels against the legacy writer.')
+
+    parser.add_argument('path',
+        action = 'store', type = str, nargs = '?', default = None,
+        help = 'A split directory, or any directory above split directories, whose text pixels will also be rewritten and compared.')
+
+    parser.add_argument('--min-speedup', dest = 'minSpeedup',
+        action = 'store', type = float, default = DEFAULT_MIN_SPEEDUP,
+        help = 'Fail if the fast writer is not at least this many times faster than the legacy writer.')
+
+    parser.add_argument('--num-puzzles', dest = 'numPuzzles',
+        action = 'store', type = int, default = DEFAULT_NUM_PUZZLES,
+        help = 'The number of random puzzles to write (per dimension).')
+
+    parser.add_argument('--seed', dest = 'seed',
+        action = 'store', type = int, default = DEFAULT_SEED,
+        help = 'Random seed.')
+
+    arguments = parser.parse_args()
+
+    if (arguments.numPuzzles < 2):
+        print("Number of puzzles must be >= 2, got: %d." % (arguments.numPuzzles), file = sys.stderr)
+        sys.exit(2)
+
+    return arguments
+
+if (__name__ == '__main__'):
+    main(_load_args())
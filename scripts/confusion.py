@@ -0,0 +1,115 @@
+'''
+Indexes of how confusable labels (and their examples) are, for hard corruptions (see puzzles.corruptPuzzleByReplacement()).
+
+Everything is computed once (vectorized) when an index is built, so drawing a hard replacement never computes a distance.
+Similarity is (squared) Euclidean distance between pixels:
+labels are compared by the centroids of their examples,
+and the examples of a label are ranked by how close they are to the centroid of the label they replace.
+'''
+
+import math
+
+import numpy
+
+# The most confusable labels (that a puzzle uses) a replacement is drawn from.
+# Within them, closer labels are more likely (see ConfusionIndex.sample()),
+# which matters most for small puzzles (a 4x4 puzzle only has 3 other labels, so all of them are always candidates).
+NUM_CONFUSABLE_LABELS = 3
+
+# The fraction of a label's examples (the closest to the replaced label) kept for each pair of labels.
+# The pool grows with the partition, so models cannot just memorize a handful of replacement images.
+CONFUSABLE_EXAMPLE_FRACTION = 0.1
+
+# The fewest examples kept for each pair of labels (or all of them, for labels with fewer).
+MIN_CONFUSABLE_EXAMPLES = 16
+
+# Centroids closer than this (squared distance) are weighted as if they were this close.
+MIN_SQUARED_DISTANCE = 1e-12
+
+class ConfusionIndex(object):
+    '''
+    images: float [numExamples, MNIST_DIMENSION ** 2] (e.g. datasets.ExampleChooser.getImages()).
+    labelRows: {label: (start, end), ...} (the rows of images that hold each label's examples).
+    '''
+
+    def __init__(self, images, labelRows, numLabels = NUM_CONFUSABLE_LABELS,
+            exampleFraction = CONFUSABLE_EXAMPLE_FRACTION, minExamples = MIN_CONFUSABLE_EXAMPLES):
+        self.numLabels = numLabels
+
+        self._labels = [label for (label, (start, end)) in labelRows.items() if (end > start)]
+        self._labelIndexes = {label: index for (index, label) in enumerate(self._labels)}
+
+        # {label: [label, ...] (every other label, the most confusable first), ...}
+        self._rankings = {}
+
+        # {label: [weight, ...] (the inverse centroid distance to each label in the ranking), ...}
+        self._weights = {}
+
+        # {label: int [numLabels, numExamples] (rows of images, the closest to each label's centroid first), ...}
+        self._examples = {}
+
+        if (len(self._labels) == 0):
+            return
+
+        images = numpy.asarray(images, dtype = numpy.float64)
+        centroids = numpy.stack([images[start:end].mean(axis = 0) for (start, end) in [labelRows[label] for label in self._labels]])
+
+        centroidDistances = _squaredDistances(centroids, centroids)
+        numpy.fill_diagonal(centroidDistances, numpy.inf)
+
+        # Identical centroids are just very confusable (instead of infinitely).
+        weights = 1.0 / numpy.sqrt(numpy.maximum(centroidDistances, MIN_SQUARED_DISTANCE))
+
+        for (index, ranking) in enumerate(numpy.argsort(centroidDistances, axis = 1)[:, :-1].tolist()):
+            self._rankings[self._labels[index]] = [self._labels[other] for other in ranking]
+            self._weights[self._labels[index]] = weights[index, ranking].tolist()
+
+        # [numExamples, numLabels].
+        exampleDistances = _squaredDistances(images, centroids)
+
+        for label in self._labels:
+            (start, end) = labelRows[label]
+            numExamples = max(minExamples, int(math.ceil(exampleFraction * (end - start))))
+
+            order = numpy.argsort(exampleDistances[start:end], axis = 0, kind = 'stable')[:numExamples]
+            self._examples[label] = (order + start).T
+
+    def sample(self, oldLabel, labels, rng):
+        '''
+        Draw a replacement for an example of oldLabel: a label (from labels, other than oldLabel)
+        from the NUM_CONFUSABLE_LABELS most confusable (weighted by inverse centroid distance, so closer labels are more likely),
+        and then one of its examples closest to oldLabel (uniformly, from its CONFUSABLE_EXAMPLE_FRACTION closest).
+        All randomness comes from rng (a numpy.random.Generator).
+
+        Returns:
+            (label, row of images)
+        '''
+
+        candidates = []
+        weights = []
+        for (label, weight) in zip(self._rankings[oldLabel], self._weights[oldLabel]):
+            if (label in labels):
+                candidates.append(label)
+                weights.append(weight)
+
+                if (len(candidates) == self.numLabels):
+                    break
+
+        if (len(candidates) == 0):
+            raise ValueError("No labels to replace '%s' with. Labels: [%s]." % (oldLabel, ', '.join(map(str, labels))))
+
+        weights = numpy.array(weights)
+        newLabel = candidates[int(rng.choice(len(candidates), p = weights / weights.sum()))]
+
+        examples = self._examples[newLabel][self._labelIndexes[oldLabel]]
+        return newLabel, int(examples[int(rng.integers(len(examples)))])
+
+def _squaredDistances(points, centers):
+    '''
+    Returns: float [len(points), len(centers)].
+    '''
+
+    pointNorms = numpy.einsum('ij,ij->i', points, points)
+    centerNorms = numpy.einsum('ij,ij->i', centers, centers)
+
+    return pointNorms[:, numpy.newaxis] - (2.0 * (points @ centers.T)) + centerNorms[numpy.newaxis, :]
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+# Convert the text files of existing splits into a compact binary (numpy) format.
+# Files are streamed (constant memory), splits are converted in parallel,
+# and every binary file is verified by re-encoding it as text and comparing checksums with the original.
+# Pixels stored as deltas (see generate-split.py --delta-twins) are rebuilt into full rows,
+# and compressed text files (see generate-split.py --compression) are decompressed as they are read.
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+
+import numpy
+
+import datasets
+import splits
+import textio
+
+KIND_PIXELS = 'pixels'
+KIND_LABELS = 'labels'
+KIND_INTEGERS = 'integers'
+KIND_LINES = 'lines'
+
+FILE_KINDS = {
+    splits.PUZZLE_PIXELS_FILENAME: KIND_PIXELS,
+    splits.CELL_LABELS_FILENAME: KIND_LABELS,
+    splits.PUZZLE_LABELS_FILENAME: KIND_INTEGERS,
+    splits.PUZZLE_NOTES_FILENAME: KIND_LINES,
+}
+
+TEMP_SUFFIX = '.tmp'
+
+def scanFile(path, kind):
+    '''
+    Get the shape of a text file (and the widest string it holds) along with its checksum.
+    '''
+
+    numRows = 0
+    numColumns = 0
+    width = 1
+    digest = hashlib.sha256()
+
+    with textio.openRead(path, binary = True) as file:
+        for line in file:
+            digest.update(line)
+            numRows += 1
+
+            line = line.rstrip(b'\n')
+            numColumns = max(numColumns, line.count(b'\t') + 1)
+
+            if (kind == KIND_LABELS):
+                width = max(width, max([len(token) for token in line.split(b'\t')]))
+            elif (kind == KIND_LINES):
+                width = max(width, len(line))
+
+    return numRows, numColumns, width, digest.hexdigest()
+
+def parseLine(line, kind):
+    line = line.rstrip('\n')
+
+    if (kind == KIND_PIXELS):
+        values = numpy.fromstring(line, dtype = numpy.float64, sep = '\t')
+        intensities = numpy.rint(values * 255).astype(numpy.uint8)
+
+        if (not numpy.array_equal(datasets.PIXEL_VALUES[intensities], values)):
+            raise ValueError("Found pixels that are not normalized intensities.")
+
+        return intensities
+    elif (kind == KIND_LINES):
+        return line.encode()
+    elif (kind == KIND_LABELS):
+        return [token.encode() for token in line.split('\t')]
+
+    return line.split('\t')
+
+def encodeRow(row, kind):
+    if (kind == KIND_PIXELS):
+        return splits.encodePixelRows([row])
+    elif (kind == KIND_LINES):
+        return row.decode() + "\n"
+    elif (kind == KIND_LABELS):
+        return '\t'.join([item.decode() for item in row.tolist()]) + "\n"
+
+    return '\t'.join([str(item) for item in row.tolist()]) + "\n"
+
+def checksumBinary(path, kind):
+    '''
+    Checksum a binary file as the text it was converted from.
+    '''
+
+    digest = hashlib.sha256()
+    rows = numpy.load(path, mmap_mode = 'r')
+
+    if (kind == KIND_PIXELS):
+        for start in range(0, len(rows), splits.TEXT_WRITE_BATCH_SIZE):
+            digest.update(splits.encodePixelRows(rows[start:(start + splits.TEXT_WRITE_BATCH_SIZE)]).encode())
+
+        return digest.hexdigest()
+
+    for row in rows:
+        digest.update(encodeRow(row, kind).encode())
+
+    return digest.hexdigest()
+
+def convertFile(textPath, binaryPath, kind):
+    numRows, numColumns, width, checksum = scanFile(textPath, kind)
+
+    if (kind == KIND_PIXELS):
+        dtype = numpy.uint8
+    elif (kind == KIND_INTEGERS):
+        dtype = numpy.int8
+    else:
+        dtype = numpy.dtype('S%d' % (width))
+
+    shape = (numRows, numColumns)
+    if (kind == KIND_LINES):
+        shape = (numRows, )
+
+    # Only move the binary file into place once it has been verified.
+    tempPath = binaryPath + TEMP_SUFFIX
+
+    try:
+        if (numRows == 0):
+            with open(tempPath, 'wb') as file:
+                numpy.save(file, numpy.empty(shape, dtype = dtype))
+        else:
+            out = numpy.lib.format.open_memmap(tempPath, mode = 'w+', dtype = dtype, shape = shape)
+
+            with textio.openRead(textPath) as file:
+                for (i, line) in enumerate(file):
+                    out[i] = parseLine(line, kind)
+
+            out.flush()
+            del out
+
+        if (checksumBinary(tempPath, kind) != checksum):
+            raise ValueError("Checksum mismatch after converting %s." % (textPath))
+
+        os.replace(tempPath, binaryPath)
+    finally:
+        if (os.path.exists(tempPath)):
+            os.remove(tempPath)
+
+def convertDeltaPixels(splitDir, partition, binaryPath):
+    '''
+    Convert the pixels of a partition stored with deltas (see splits.writeDeltaPixels()) into full rows.
+    There is no single text file to checksum against, so every rebuilt row is checked to be exact normalized intensities instead.
+    '''
+
+    options = splits.loadOptions(splitDir)
+    reader = splits.TextPixelReader(splitDir, partition, options['dimension'], splits.getLayout(options))
+
+    numRows = len(reader)
+    shape = (numRows, (options['dimension'] ** 2) * (datasets.MNIST_DIMENSION ** 2))
+
+    tempPath = binaryPath + TEMP_SUFFIX
+
+    try:
+        if (numRows == 0):
+            with open(tempPath, 'wb') as file:
+                numpy.save(file, numpy.empty(shape, dtype = numpy.uint8))
+        else:
+            out = numpy.lib.format.open_memmap(tempPath, mode = 'w+', dtype = numpy.uint8, shape = shape)
+
+            for start in range(0, numRows, splits.TEXT_WRITE_BATCH_SIZE):
+                values = reader.read(numpy.arange(start, min(numRows, start + splits.TEXT_WRITE_BATCH_SIZE)), dtype = numpy.float64)
+                intensities = numpy.rint(values * 255).astype(numpy.uint8)
+
+                if (not numpy.array_equal(datasets.PIXEL_VALUES[intensities], values)):
+                    raise ValueError("Found pixels that are not normalized intensities.")
+
+                out[start:(start + len(values))] = intensities
+
+            out.flush()
+            del out
+
+        os.replace(tempPath, binaryPath)
+    finally:
+        if (os.path.exists(tempPath)):
+            os.remove(tempPath)
+
+def convertSplit(splitDir, force, removeText):
+    '''
+    Returns: (splitDir, error message or None).
+    '''
+
+    try:
+        for partition in splits.PARTITIONS:
+            if (splits.hasBinary(splitDir, partition) and not force):
+                continue
+
+            for filename in splits.getFilenames(splitDir):
+                if (filename == splits.PUZZLE_PIXELS_FILENAME and splits.hasDeltas(splitDir, partition)):
+                    convertDeltaPixels(splitDir, partition, splits.getBinaryPath(splitDir, partition, filename))
+                    continue
+
+                convertFile(splits.getPath(splitDir, partition, filename), splits.getBinaryPath(splitDir, partition, filename), FILE_KINDS[filename])
+
+        if (removeText):
+            for partition in splits.PARTITIONS:
+                for filename in splits.FILENAMES + splits.DELTA_FILENAMES:
+                    path = splits.getPath(splitDir, partition, filename)
+                    if (os.path.isfile(path)):
+                        os.remove(path)
+    except Exception as ex:
+        return splitDir, "%s: %s" % (type(ex).__name__, ex)
+
+    return splitDir, None
+
+def main(arguments):
+    splitDirs = splits.findSplits(arguments.path)
+    if (len(splitDirs) == 0):
+        print("Could not find any splits in: " + arguments.path, file = sys.stderr)
+        sys.exit(1)
+
+    tasks = [(splitDir, arguments.force, arguments.removeText) for splitDir in splitDirs]
+
+    failures = 0
+    with multiprocessing.Pool(arguments.numWorkers) as pool:
+        for (splitDir, error) in pool.starmap(convertSplit, tasks, chunksize = 1):
+            if (error is None):
+                print("Converted: " + splitDir)
+            else:
+                failures += 1
+                print("Failed to convert %s -- %s" % (splitDir, error), file = sys.stderr)
+
+    print("Converted %d / %d splits." % (len(splitDirs) - failures, len(splitDirs)))
+
+    if (failures > 0):
+        sys.exit(1)
+
+def _load_args():
+    parser = argparse.ArgumentParser(description = 'Convert the text files of splits into a compact binary format.')
+
+    parser.add_argument('path',
+        action = 'store', type = str,
+        help = 'A split directory, or any directory above split directories (e.g. the root of a data tree).')
+
+    parser.add_argument('--force', dest = 'force',
+        action = 'store_true', default = False,
+        help = 'Convert splits that already have binary files.')
+
+    parser.add_argument('--num-workers', dest = 'numWorkers',
+        action = 'store', type = int, default = os.cpu_count(),
+        help = 'The number of splits to convert in parallel (defaults to the number of cores).')
+
+    parser.add_argument('--remove-text', dest = 'removeText',
+        action = 'store_true', default = False,
+        help = 'Remove the text files once their binary versions have been verified.')
+
+    arguments = parser.parse_args()
+
+    if (arguments.numWorkers < 1):
+        print("Number of workers must be >= 1, got: %d." % (arguments.numWorkers), file = sys.stderr)
+        sys.exit(2)
+
+    return arguments
+
+if (__name__ == '__main__'):
+    main(_load_args())
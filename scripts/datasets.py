@@ -2,10 +2,9 @@
 Handle loading datasets.
 '''
 
-import random
-
 import numpy
 
+import confusion
 import util
 
 DATASET_MNIST = 'mnist'
@@ -23,11 +22,25 @@ NUM_LABELS = {
     DATASET_FMNIST: 10,
 }
 
+# The number of examples for the smallest label (train and test combined).
+NUM_EXAMPLES_PER_LABEL = {
+    DATASET_MNIST: 6313,
+    DATASET_EMNIST: 2800,
+    DATASET_KMNIST: 7000,
+    DATASET_FMNIST: 7000,
+}
+
 # MNIST images are 28 x 28 = 784.
 MNIST_DIMENSION = 28
 
 SIGNIFICANT_DIGITS = 4
 
+# Every value a normalized pixel can take, indexed by its original (uint8) intensity.
+PIXEL_VALUES = (numpy.arange(256) / 255.0).round(SIGNIFICANT_DIGITS)
+
+# The number of images read (and normalized) at a time when loading a dataset.
+LOAD_CHUNK_SIZE = 4096
+
 TF_DATASET_NAME = {
     DATASET_MNIST: 'mnist',
     DATASET_EMNIST: 'emnist/balanced',
@@ -35,6 +48,9 @@ TF_DATASET_NAME = {
     DATASET_FMNIST: 'fashion_mnist',
 }
 
+# The TFDS splits that are combined into each dataset.
+TF_SPLITS = ['train', 'test']
+
 # Special case validations for classes.
 LABEL_VALIDATION = {
     DATASET_EMNIST: lambda label: (label > 10)
@@ -133,38 +149,143 @@ LABEL_MAP = {
 class ExampleChooser(object):
     '''
     An object for controlling exactly how many instances of each label are used to create puzzles.
+    Every example also has an index (into getImages()), so puzzles can be planned without touching any images.
     '''
 
     # examples: {label: [image, ...], ...}
-    def __init__(self, examples):
+    # Random examples are drawn with the rng (a numpy.random.Generator) passed to each call
+    # (taking only needs one with replacement).
+    # With replacement, examples are never consumed and takeExample() behaves like getExample().
+    def __init__(self, examples, replacement = False):
         self._examples = examples
         self._nextIndexes = {label: 0 for label in examples}
+        self.replacement = replacement
+
+        # All the examples (grouped by label) in a single sequence.
+        self._offsets = {}
+        self._pool = []
+        for label in examples:
+            self._offsets[label] = len(self._pool)
+            self._pool.extend(examples[label])
+
+        self._images = None
+        self._confusionIndex = None
 
     # Takes (consumes) the next example for a label.
-    def takeExample(self, label):
+    def takeExample(self, label, rng = None):
+        return self._pool[self.takeIndex(label, rng)]
+
+    # Get a example randomly from anywhere in the sequence.
+    def getExample(self, label, rng):
+        return self._pool[self.getIndex(label, rng)]
+
+    # The index version of takeExample().
+    def takeIndex(self, label, rng = None):
+        if (self.replacement):
+            return self.getIndex(label, rng)
+
         assert (self._nextIndexes[label] < len(self._examples[label])), 'Label: %s, Next Index: %d, Size: %d' % (label, self._nextIndexes[label], len(self._examples[label]))
 
-        image = self._examples[label][self._nextIndexes[label]]
+        index = self._offsets[label] + self._nextIndexes[label]
         self._nextIndexes[label] += 1
-        return image
+        return index
 
-    # Get a example randomly from anywhere in the sequence.
-    def getExample(self, label):
-        return random.choice(self._examples[label])
+    # The index version of getExample().
+    def getIndex(self, label, rng):
+        return self._offsets[label] + int(rng.integers(len(self._examples[label])))
+
+    # Get a hard replacement for an example of oldLabel (see confusion.ConfusionIndex.sample()).
+    # Returns: (label, example).
+    def getConfusableExample(self, oldLabel, labels, rng):
+        newLabel, index = self.getConfusableIndex(oldLabel, labels, rng)
+        return newLabel, self._pool[index]
+
+    # The index version of getConfusableExample().
+    def getConfusableIndex(self, oldLabel, labels, rng):
+        return self.getConfusionIndex().sample(oldLabel, labels, rng)
+
+    def getConfusionIndex(self):
+        '''
+        Get the index of how confusable the labels and examples are (built on first use, see confusion.py).
+        '''
+
+        if (self._confusionIndex is None):
+            labelRows = {label: (self._offsets[label], self._offsets[label] + len(self._examples[label])) for label in self._examples}
+            self._confusionIndex = confusion.ConfusionIndex(self.getImages(), labelRows)
+
+        return self._confusionIndex
+
+    def getImages(self):
+        '''
+        Get every example as a single [numExamples, MNIST_DIMENSION ** 2] array (built on first use).
+        '''
+
+        if (self._images is None):
+            if (len(self._pool) == 0):
+                self._images = numpy.empty((0, MNIST_DIMENSION ** 2))
+            else:
+                self._images = numpy.stack(self._pool)
+
+        return self._images
+
+class ExampleIndexChooser(object):
+    '''
+    A view of an ExampleChooser that gives the index of each example (see ExampleChooser.getImages()) instead of the example itself.
+    Examples taken through the view are consumed from the underlying chooser.
+    '''
+
+    def __init__(self, exampleChooser):
+        self._exampleChooser = exampleChooser
+
+    def takeExample(self, label, rng = None):
+        return self._exampleChooser.takeIndex(label, rng)
 
-def addOverlap(examples, overlapPercent):
+    def getExample(self, label, rng):
+        return self._exampleChooser.getIndex(label, rng)
+
+    def getConfusableExample(self, oldLabel, labels, rng):
+        return self._exampleChooser.getConfusableIndex(oldLabel, labels, rng)
+
+def addOverlap(examples, overlapPercent, rng):
     if (overlapPercent <= 0.0):
         return
 
     for label in examples:
         overlapCount = int(len(examples[label]) * overlapPercent)
-        overlap = random.choices(examples[label], k = overlapCount)
-        examples[label].extend(overlap)
-        random.shuffle(examples[label])
+        overlap = rng.integers(len(examples[label]), size = overlapCount)
+        labelExamples = examples[label] + [examples[label][index] for index in overlap.tolist()]
+        examples[label] = [labelExamples[index] for index in rng.permutation(len(labelExamples)).tolist()]
+
+def getLabels(datasetName):
+    '''
+    Get the labels for a dataset (the same labels loadMNIST() gives) without loading it.
+    '''
+
+    labels = []
+    for label in range(NUM_LABELS[datasetName]):
+        if (datasetName not in LABEL_VALIDATION or LABEL_VALIDATION[datasetName](label)):
+            labels.append(datasetName + '_' + str(label))
+
+    return labels
 
 def fetchData(dimension, datasetName, overlapPercent,
-        numTrain, numTest, numValid):
-    allExamples, allowedLabels = loadMNIST(datasetName)
+        numTrain, numTest, numValid,
+        bank = None, rng = None):
+    '''
+    If a bank (imagebank.SharedImageBank) for this dataset is supplied,
+    then its images will be used (without copying) instead of loading the dataset again.
+    All randomness (shuffling and overlap) comes from rng (a numpy.random.Generator, unseeded if not supplied).
+    '''
+
+    if (rng is None):
+        rng = numpy.random.default_rng()
+
+    if (bank is None):
+        allExamples, allowedLabels = loadMNIST(datasetName, rng = rng)
+    else:
+        allExamples = bank.getExamples()
+        allowedLabels = list(bank.labels)
+        _shuffleExamples(allExamples, allowedLabels, rng)
 
     requiredExamplesPerLabel = dimension * (numTrain + numTest + numValid)
     for label in allExamples:
@@ -184,59 +305,99 @@ def fetchData(dimension, datasetName, overlapPercent,
         usedExamples += exampleCount
 
     for examples in [trainExamples, testExamples, validExamples]:
-        addOverlap(examples, overlapPercent)
+        addOverlap(examples, overlapPercent, rng)
 
     return allowedLabels, ExampleChooser(trainExamples), ExampleChooser(testExamples), ExampleChooser(validExamples)
 
-def loadMNIST(name = DATASET_MNIST, shuffle = True):
+def loadMNIST(name = DATASET_MNIST, shuffle = True, rng = None, allocate = None):
     '''
     Load an MNIST-style dataset (with MNIST_DIMENSION square images).
     Train and test are combined into the same structures.
     Labels are turned into strings and prepended with the dataset name to avoid conflict with other datasets.
+    If shuffling, the examples for each label are shuffled with rng (a numpy.random.Generator, unseeded if not supplied).
+
+    The dataset is read in chunks (of LOAD_CHUNK_SIZE images), and each chunk is normalized straight into
+    a single preallocated array that holds the images of each label in a contiguous block (in the order of the returned labels).
+    So the peak memory used stays close to the size of the loaded images.
+    allocate(shape, dtype) can supply that array (e.g. in shared memory, see imagebank.loadSharedBank()).
 
     Returns:
-        {label: [image, ...], ...}
+        {label: [image, ...], ...} (every image is a view into the preallocated array)
     '''
 
     # Delay importing tensorflow to avoid waits on already existing datasets.
     import tensorflow_datasets as tfds
 
-    data = tfds.as_numpy(tfds.load(TF_DATASET_NAME[name], batch_size = -1, as_supervised = True))
-    (trainImages, trainLabels) = data['train']
-    (testImages, testLabels) = data['test']
-
-    labels = []
-    for label in sorted(set(trainLabels) | set(testLabels)):
-        if (name not in LABEL_VALIDATION or LABEL_VALIDATION[name](label)):
-            labels.append(name + '_' + str(label))
-
-    # Remove the depth dimension.
-    trainImages = trainImages.reshape((len(trainImages), MNIST_DIMENSION, MNIST_DIMENSION))
-    testImages = testImages.reshape((len(testImages), MNIST_DIMENSION, MNIST_DIMENSION))
-
-    trainImages = _normalizeMNISTImages(trainImages, name)
-    testImages = _normalizeMNISTImages(testImages, name)
+    tfName = TF_DATASET_NAME[name]
+
+    # A first pass over only the labels (the images are not decoded) sizes the array.
+    # {rawLabel: count, ...}
+    counts = {}
+    for split in TF_SPLITS:
+        chunks = tfds.load(tfName, split = split, batch_size = LOAD_CHUNK_SIZE, decoders = {'image': tfds.decode.SkipDecoding()})
+        for chunk in tfds.as_numpy(chunks):
+            chunkLabels, chunkCounts = numpy.unique(chunk['label'], return_counts = True)
+            for (rawLabel, count) in zip(chunkLabels.tolist(), chunkCounts.tolist()):
+                counts[rawLabel] = counts.get(rawLabel, 0) + count
+
+    rawLabels = []
+    for rawLabel in sorted(counts):
+        if (name not in LABEL_VALIDATION or LABEL_VALIDATION[name](rawLabel)):
+            rawLabels.append(rawLabel)
+
+    labels = [name + '_' + str(rawLabel) for rawLabel in rawLabels]
+
+    # The first row of each label's block: {rawLabel: row, ...}.
+    startRows = {}
+    numImages = 0
+    for rawLabel in rawLabels:
+        startRows[rawLabel] = numImages
+        numImages += counts[rawLabel]
+
+    shape = (numImages, MNIST_DIMENSION ** 2)
+    if (allocate is None):
+        images = numpy.empty(shape, dtype = PIXEL_VALUES.dtype)
+    else:
+        images = allocate(shape, PIXEL_VALUES.dtype)
+
+    # Train comes before test within each label.
+    nextRows = dict(startRows)
+    for split in TF_SPLITS:
+        chunks = tfds.load(tfName, split = split, batch_size = LOAD_CHUNK_SIZE, as_supervised = True)
+        for (chunkImages, chunkLabels) in tfds.as_numpy(chunks):
+            # Remove the depth dimension.
+            chunkImages = _normalizeMNISTImages(chunkImages.reshape((len(chunkImages), MNIST_DIMENSION, MNIST_DIMENSION)), name)
+
+            for rawLabel in numpy.unique(chunkLabels).tolist():
+                if (rawLabel not in nextRows):
+                    continue
+
+                labelImages = chunkImages[chunkLabels == rawLabel]
+                images[nextRows[rawLabel]:(nextRows[rawLabel] + len(labelImages))] = labelImages
+                nextRows[rawLabel] += len(labelImages)
 
     # {label: [image, ...], ...}
-    examples = {label: [] for label in labels}
-    for i in range(len(trainImages)):
-        label = name + '_' + str(trainLabels[i])
-        if (label in labels):
-            examples[label].append(trainImages[i])
-
-    for i in range(len(testImages)):
-        label = name + '_' + str(testLabels[i])
-        if (label in labels):
-            examples[label].append(testImages[i])
+    examples = {}
+    for (rawLabel, label) in zip(rawLabels, labels):
+        examples[label] = list(images[startRows[rawLabel]:nextRows[rawLabel]])
 
     if (shuffle):
-        for label in labels:
-            random.shuffle(examples[label])
-            random.shuffle(examples[label])
+        if (rng is None):
+            rng = numpy.random.default_rng()
+
+        _shuffleExamples(examples, labels, rng)
 
     return examples, labels
 
+def _shuffleExamples(examples, labels, rng):
+    for label in labels:
+        examples[label] = [examples[label][index] for index in rng.permutation(len(examples[label])).tolist()]
+
 def _normalizeMNISTImages(images, datasetName):
+    '''
+    Turn raw (uint8) images into flat rows of normalized (and rounded) pixels (see PIXEL_VALUES).
+    '''
+
     (numImages, width, height) = images.shape
 
     if (datasetName in IMAGE_TRANSFORMS):
@@ -246,10 +407,5 @@ def _normalizeMNISTImages(images, datasetName):
     # Flatten out the images into a 1d array.
     images = images.reshape(numImages, width * height)
 
-    # Normalize the greyscale intensity to [0,1].
-    images = images / 255.0
-
-    # Round so that the output is significantly smaller.
-    images = images.round(SIGNIFICANT_DIGITS)
-
-    return images
+    # Normalize the greyscale intensity to [0,1], and round so that the output is significantly smaller.
+    return PIXEL_VALUES[images]
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+# Generate a split through a running generate-daemon.py, instead of starting (and loading datasets) from scratch.
+# Takes exactly the same arguments as generate-split.py (plus --socket to pick the daemon),
+# and prints and exits the same way generate-split.py would have.
+# E.g.: ./generate-client.py --dimension 9 --dataset mnist --strategy r_puzzle --num-train 10
+
+import argparse
+import sys
+
+import splitdaemon
+
+def main(socketPath, args):
+    try:
+        exitCode, output, errors = splitdaemon.request(socketPath, args)
+    except (ConnectionError, FileNotFoundError) as ex:
+        print("Could not reach a generation daemon at %s (start one with generate-daemon.py) -- %s" % (socketPath, ex), file = sys.stderr)
+        sys.exit(3)
+
+    sys.stdout.write(output)
+    sys.stdout.flush()
+
+    sys.stderr.write(errors)
+    sys.stderr.flush()
+
+    sys.exit(exitCode)
+
+def _load_args():
+    # Everything else (including --help) is passed along to generate-split.py in the daemon.
+    parser = argparse.ArgumentParser(add_help = False, allow_abbrev = False)
+
+    parser.add_argument('--socket', dest = 'socketPath',
+        action = 'store', type = str, default = splitdaemon.DEFAULT_SOCKET_PATH,
+        help = 'The socket of the daemon to use.')
+
+    return parser.parse_known_args()
+
+if (__name__ == '__main__'):
+    arguments, args = _load_args()
+    main(arguments.socketPath, args)
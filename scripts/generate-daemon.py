@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+# A long-lived generation server, so many splits can be generated without paying for startup and dataset loading each time.
+# The datasets are loaded once (into shared image banks), and a pool of workers generates splits concurrently.
+# Requests (see splitdaemon.py) come in over a Unix domain socket, usually from generate-client.py
+# (which takes the same arguments as generate-split.py).
+# Every split is exactly the one generate-split.py would have generated with the same arguments.
+
+import argparse
+import contextlib
+import importlib
+import io
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+
+import datasets
+import imagebank
+import splitdaemon
+
+generateSplit = importlib.import_module('generate-split')
+
+# The banks attached to by each worker (see _initWorker()): {datasetName: imagebank.SharedImageBank, ...}.
+_workerBanks = {}
+
+class GenerationServer(socketserver.ThreadingUnixStreamServer):
+    '''
+    Each connection is handled on its own thread, which hands the request to the worker pool and waits for the result.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, socketPath, pool):
+        self.pool = pool
+        super().__init__(socketPath, GenerationRequestHandler)
+
+class GenerationRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        message = splitdaemon.readMessage(self.rfile)
+        if (message is None):
+            return
+
+        exitCode, output, errors = self.server.pool.apply(runJob, (message[splitdaemon.KEY_ARGS], message[splitdaemon.KEY_CWD]))
+
+        splitdaemon.writeMessage(self.wfile, {
+            splitdaemon.KEY_EXIT_CODE: exitCode,
+            splitdaemon.KEY_OUTPUT: output,
+            splitdaemon.KEY_ERRORS: errors,
+        })
+
+def runJob(args, cwd):
+    '''
+    Run generate-split.py (in a worker) with the given arguments.
+    Returns: (exit code, output, errors).
+    '''
+
+    output = io.StringIO()
+    errors = io.StringIO()
+    exitCode = 0
+
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(errors):
+        try:
+            # Workers run one job at a time, so each job can have its own working directory.
+            os.chdir(cwd)
+
+            arguments = generateSplit._load_args(args)
+            generateSplit.main(arguments, banks = _workerBanks)
+        except SystemExit as ex:
+            exitCode = _getExitCode(ex.code)
+        except Exception:
+            traceback.print_exc()
+            exitCode = 1
+
+    return exitCode, output.getvalue(), errors.getvalue()
+
+def _getExitCode(code):
+    # The same rules as the interpreter uses for sys.exit().
+    if (code is None):
+        return 0
+
+    if (isinstance(code, int)):
+        return code
+
+    print(code, file = sys.stderr)
+    return 1
+
+def _initWorker(handles):
+    global _workerBanks
+
+    # Usage and help messages should look like they came from generate-split.py.
+    sys.argv = [generateSplit.__file__]
+
+    # Only the main process handles shutdown (and terminates the pool).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    _workerBanks = {datasetName: imagebank.SharedImageBank.attach(handle) for (datasetName, handle) in handles.items()}
+
+def _removeStaleSocket(socketPath):
+    '''
+    Remove a socket left behind by a daemon that is no longer running.
+    Throws if a daemon is still listening on it.
+    '''
+
+    if (not os.path.exists(socketPath)):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socketPath)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socketPath)
+            return
+
+    raise RuntimeError("A daemon is already listening on: " + socketPath)
+
+def _shutdown(signum, frame):
+    raise KeyboardInterrupt()
+
+def main(arguments):
+    try:
+        _removeStaleSocket(arguments.socketPath)
+    except RuntimeError as ex:
+        print(str(ex), file = sys.stderr)
+        sys.exit(1)
+
+    banks = {}
+    for datasetName in arguments.datasetNames:
+        print("Loading dataset: " + datasetName)
+        banks[datasetName] = imagebank.loadSharedBank(datasetName)
+
+    handles = {datasetName: bank.handle for (datasetName, bank) in banks.items()}
+
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    server = None
+    try:
+        with multiprocessing.Pool(arguments.numWorkers, initializer = _initWorker, initargs = (handles, )) as pool:
+            server = GenerationServer(arguments.socketPath, pool)
+
+            print("Serving %d workers on: %s" % (arguments.numWorkers, arguments.socketPath))
+            sys.stdout.flush()
+
+            server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down.")
+    finally:
+        if (server is not None):
+            server.server_close()
+
+            if (os.path.exists(arguments.socketPath)):
+                os.remove(arguments.socketPath)
+
+        for bank in banks.values():
+            bank.close()
+            bank.unlink()
+
+def _load_args():
+    parser = argparse.ArgumentParser(description = 'Serve split generation requests (see generate-client.py) with datasets kept in memory.')
+
+    parser.add_argument('--dataset', dest = 'datasetNames',
+        action = 'append', default = None,
+        help = 'A dataset to load up front (can be specified multiple times or with a comma-separated list). Requests for other datasets still work, but load them per request. Defaults to all datasets.')
+
+    parser.add_argument('--num-workers', dest = 'numWorkers',
+        action = 'store', type = int, default = os.cpu_count(),
+        help = 'The number of splits to generate concurrently (defaults to the number of cores).')
+
+    parser.add_argument('--socket', dest = 'socketPath',
+        action = 'store', type = str, default = splitdaemon.DEFAULT_SOCKET_PATH,
+        help = 'The Unix domain socket to listen on.')
+
+    arguments = parser.parse_args()
+
+    if (arguments.datasetNames is None):
+        arguments.datasetNames = list(datasets.DATASETS)
+
+    flatDatasetNames = []
+    for datasetName in arguments.datasetNames:
+        flatDatasetNames += datasetName.split(',')
+    arguments.datasetNames = list(sorted(set(flatDatasetNames)))
+
+    for datasetName in arguments.datasetNames:
+        if (datasetName not in datasets.DATASETS):
+            print("Unknown dataset specified: %s." % (datasetName), file = sys.stderr)
+            sys.exit(2)
+
+    if (arguments.numWorkers < 1):
+        print("Number of workers must be >= 1, got: %d." % (arguments.numWorkers), file = sys.stderr)
+        sys.exit(2)
+
+    return arguments
+
+if (__name__ == '__main__'):
+    main(_load_args())
@@ -2,9 +2,14 @@
 
 # Create all the splits.
 # Warning: this will create more than a TB of data, it is recommended that you adjust the constants to only generate what you need.
+# Any arguments are passed along to every call of generate-split.py.
+# E.g. to spread the splits over N machines, run with "--shard i/N" on machine i (0 <= i < N).
+# Every split is assigned to a shard (and seeded) from its path, so any machine can regenerate any split.
+# To skip startup and dataset loading for every split, start generate-daemon.py and set SETUP_SCRIPT to generate-client.py.
+# To never need disk space for the uncompressed data, pass "--compression gzip" (or lzma/zlib) to compress files as they are written.
 
 readonly THIS_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd)"
-readonly SETUP_SCRIPT="${THIS_DIR}/generate-split.py"
+readonly SETUP_SCRIPT="${SETUP_SCRIPT:-${THIS_DIR}/generate-split.py}"
 
 readonly NUM_SPLITS='11'
 
@@ -53,7 +58,8 @@ function main() {
                                     --num-valid "${numTestValidPuzzles}" \
                                     --overlap-percent "${overlapPercent}" \
                                     --split "${split}" \
-                                    --strategy "${strategy}"
+                                    --strategy "${strategy}" \
+                                    "$@"
                             done
                         done
                     done
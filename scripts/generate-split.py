@@ -6,13 +6,18 @@ import argparse
 import datetime
 import json
 import os
-import random
 import shutil
 import sys
 
+import numpy
+
+import augment
 import datasets
+import gridbank
+import splits
 import strategies
 import puzzles
+import textio
 import util
 
 DEFAULT_DATASET = datasets.DATASET_MNIST
@@ -28,41 +33,74 @@ DEFAULT_OVERLAP_PERCENT = 0.0
 DEFAULT_SPLIT = '01'
 DEFAULT_TRAIN_PERCENT = 0.5
 
-SUBPATH_FORMAT = os.path.join('dimension::{:01d}', 'datasets::{:s}', 'strategy::{:s}',
-        'numTrain::{:05d}', 'numTest::{:05d}', 'numValid::{:05d}',
-        'corruptChance::{:04.2f}', 'overlap::{:04.2f}', 'split::{:s}')
-OPTIONS_FILENAME = 'options.json'
+def writeData(outDir, puzzles, prefix, layout = splits.LAYOUT_CELL_MAJOR, deltaTwins = False, compression = None, compressionLevel = None):
+    """
+    Puzzles without images (see --labels-only) get no pixel file.
+    With deltaTwins, each corrupted puzzle is stored as a delta against the correct puzzle before it (see splits.writeDeltaPixels()).
+    With compression (see textio.CODECS), every file is compressed as it is written.
+    """
 
-CELL_LABELS_FILENAME = 'cell_labels.txt'
-PUZZLE_PIXELS_FILENAME = 'puzzle_pixels.txt'
-PUZZLE_LABELS_FILENAME = 'puzzle_labels.txt'
-PUZZLE_NOTES_FILENAME = 'puzzle_notes.txt'
+    compressionOptions = {'compression': compression, 'compressionLevel': compressionLevel}
 
-def writeData(outDir, puzzles, prefix):
     basePath = os.path.join(outDir, prefix)
 
-    images = []
-    cellLabels = []
-
     # Flatten the puzzles for writing.
-    for i in range(len(puzzles['labels'])):
-        images.append([pixel for row in puzzles['images'][i] for cell in row for pixel in cell])
-        cellLabels.append([cell for row in puzzles['cellLabels'][i] for cell in row])
+    images = puzzles['images']
+    if (images is not None and deltaTwins):
+        twins = splits.findTwins(puzzles['labels'])
+        splits.writeDeltaPixels(outDir, prefix, images.reshape((len(images), images.shape[1] ** 2, -1)), twins, layout = layout, **compressionOptions)
+    elif (images is not None):
+        if (layout != splits.LAYOUT_CELL_MAJOR):
+            images = splits.viewPixels(images.reshape((len(images), -1)), images.shape[1], splits.LAYOUT_CELL_MAJOR, layout)
+        images = images.reshape((len(puzzles['labels']), -1))
+
+        splits.writePixelRows(basePath + '_' + splits.PUZZLE_PIXELS_FILENAME, images, **compressionOptions)
+
+    cellLabels = [[cell for row in puzzleCellLabels for cell in row] for puzzleCellLabels in puzzles['cellLabels']]
 
-    util.writeRows(basePath + '_' + PUZZLE_PIXELS_FILENAME, images)
-    util.writeRows(basePath + '_' + CELL_LABELS_FILENAME, cellLabels)
-    util.writeRows(basePath + '_' + PUZZLE_LABELS_FILENAME, puzzles['labels'])
-    util.writeRows(basePath + '_' + PUZZLE_NOTES_FILENAME, puzzles['notes'])
+    util.writeRows(basePath + '_' + splits.CELL_LABELS_FILENAME, cellLabels, **compressionOptions)
+    util.writeRows(basePath + '_' + splits.PUZZLE_LABELS_FILENAME, puzzles['labels'], **compressionOptions)
+    util.writeRows(basePath + '_' + splits.PUZZLE_NOTES_FILENAME, puzzles['notes'], **compressionOptions)
 
 def generateSplit(outDir, seed,
         dimension, datasetNames,
         numTrain, numTest, numValid,
-        corruptChance, overlapPercent, strategy):
-    random.seed(seed)
+        corruptChance, overlapPercent, strategy,
+        banks = None, augmenter = None, layout = splits.LAYOUT_CELL_MAJOR, gridBank = False, labelsOnly = False, deltaTwins = False,
+        compression = None, compressionLevel = None, hardCorruption = False):
+    """
+    banks may hold already loaded (shared) image banks keyed by dataset name: {datasetName: imagebank.SharedImageBank, ...}.
+    augmenter (augment.Augmenter) may be supplied to augment every cell image.
+    layout is how the pixels of each puzzle are written (see splits.LAYOUTS).
+    gridBank is whether to sample grids from the (cached) grid bank for the dimension (see gridbank.py).
+    labelsOnly skips datasets and images completely, and only writes labels (see strategies.BaseStrategy.planLabels()).
+    deltaTwins stores corrupted puzzles as deltas against their correct twins (see writeData()).
+    compression and compressionLevel compress every file as it is written (see textio.TextWriter).
+    hardCorruption replaces cells with the most confusable labels and examples (see strategies.BaseStrategy.planSplit()).
+    """
+
+    banks = banks or {}
+    writeOptions = {'compression': compression, 'compressionLevel': compressionLevel}
+
+    rng = numpy.random.default_rng(seed)
+
+    bank = None
+    if (gridBank or labelsOnly):
+        bank = gridbank.getGridBank(dimension)
+
+    if (labelsOnly):
+        data = {datasetName: {'labels': datasets.getLabels(datasetName)} for datasetName in datasetNames}
+        train, test, valid = strategy.generateLabels(dimension, data, corruptChance, numTrain, numTest, numValid, gridBank = bank, rng = rng)
+
+        writeData(outDir, train, 'train', **writeOptions)
+        writeData(outDir, test, 'test', **writeOptions)
+        writeData(outDir, valid, 'valid', **writeOptions)
+        return
 
     data = {}
     for datasetName in datasetNames:
-        labels, trainExamples, testExamples, validExamples = datasets.fetchData(dimension, datasetName, overlapPercent, numTrain, numTest, numValid)
+        labels, trainExamples, testExamples, validExamples = datasets.fetchData(dimension, datasetName, overlapPercent, numTrain, numTest, numValid,
+                bank = banks.get(datasetName), rng = rng)
         data[datasetName] = {
             'labels': labels,
             'train': trainExamples,
@@ -70,27 +108,27 @@ def generateSplit(outDir, seed,
             'valid': validExamples,
         }
 
-    train, test, valid = strategy.generateSplit(dimension, data, corruptChance, numTrain, numTest, numValid)
+    train, test, valid = strategy.generateSplit(dimension, data, corruptChance, numTrain, numTest, numValid, augmenter = augmenter, gridBank = bank, rng = rng,
+            hardCorruption = hardCorruption)
 
-    writeData(outDir, train, 'train')
-    writeData(outDir, test, 'test')
-    writeData(outDir, valid, 'valid')
+    writeData(outDir, train, 'train', layout = layout, deltaTwins = deltaTwins, **writeOptions)
+    writeData(outDir, test, 'test', layout = layout, deltaTwins = deltaTwins, **writeOptions)
+    writeData(outDir, valid, 'valid', layout = layout, deltaTwins = deltaTwins, **writeOptions)
 
-def main(arguments):
-    subpath = SUBPATH_FORMAT.format(
-            arguments.dimension,
-            ','.join(arguments.datasetNames),
-            str(arguments.strategy),
-            arguments.numTrain,
-            arguments.numTest,
-            arguments.numValid,
-            arguments.corruptChance,
-            arguments.overlapPercent,
-            arguments.split)
+def main(arguments, banks = None):
+    """
+    banks are passed along to generateSplit() (see generate-daemon.py).
+    """
 
-    outDir = os.path.join(arguments.outDir, subpath)
+    if (arguments.shard is not None):
+        (shard, numShards) = arguments.shard
+        if (splits.getShard(arguments.subpath, numShards) != shard):
+            print("Split belongs to another shard, skipping generation. " + arguments.subpath)
+            return
+
+    outDir = os.path.join(arguments.outDir, arguments.subpath)
 
-    optionsPath = os.path.join(outDir, OPTIONS_FILENAME)
+    optionsPath = os.path.join(outDir, splits.OPTIONS_FILENAME)
     if (os.path.isfile(optionsPath)):
         if (not arguments.force):
             print("Found existing split opions file, skipping generation. " + optionsPath)
@@ -102,11 +140,17 @@ def main(arguments):
     print("Generating data defined in: " + optionsPath)
     os.makedirs(outDir, exist_ok = True)
 
-    generateSplit(
-            outDir, arguments.seed,
-            arguments.dimension, arguments.datasetNames,
-            arguments.numTrain, arguments.numTest, arguments.numValid,
-            arguments.corruptChance, arguments.overlapPercent, arguments.strategy)
+    # Virtual splits are just their options (see virtualsplits.py).
+    if (not arguments.virtual):
+        generateSplit(
+                outDir, arguments.seed,
+                arguments.dimension, arguments.datasetNames,
+                arguments.numTrain, arguments.numTest, arguments.numValid,
+                arguments.corruptChance, arguments.overlapPercent, arguments.strategy,
+                banks = banks, augmenter = arguments.augmenter, layout = arguments.layout, gridBank = arguments.gridBank,
+                labelsOnly = arguments.labelsOnly, deltaTwins = arguments.deltaTwins,
+                compression = arguments.compression, compressionLevel = arguments.compressionLevel,
+                hardCorruption = arguments.hardCorruption)
 
     options = {
         'dimension': arguments.dimension,
@@ -119,6 +163,15 @@ def main(arguments):
         'overlap': arguments.overlapPercent,
         'splitId': arguments.split,
         'seed': arguments.seed,
+        'virtual': arguments.virtual,
+        'augment': arguments.augmenter.getOptions() if (arguments.augmenter is not None) else None,
+        'layout': arguments.layout,
+        'gridBank': arguments.gridBank,
+        'labelsOnly': arguments.labelsOnly,
+        'deltaTwins': arguments.deltaTwins,
+        'hardCorruption': arguments.hardCorruption,
+        'compression': arguments.compression,
+        'compressionLevel': arguments.compressionLevel,
         'timestamp': str(datetime.datetime.now()),
         'generator': os.path.basename(os.path.realpath(__file__)),
     }
@@ -126,9 +179,42 @@ def main(arguments):
     with open(optionsPath, 'w') as file:
         json.dump(options, file, indent = 4)
 
-def _load_args():
+def _load_args(args = None):
+    """
+    Parse args (defaults to the command line).
+    """
+
     parser = argparse.ArgumentParser(description = 'Generate custom visual sudoku puzzles.')
 
+    parser.add_argument('--augment-elastic', dest = 'augmentElastic',
+        action = 'store', type = float, default = 0.0,
+        help = 'The strength (alpha) of random elastic distortions applied to every cell image (0 to disable).')
+
+    parser.add_argument('--augment-elastic-sigma', dest = 'augmentElasticSigma',
+        action = 'store', type = float, default = augment.DEFAULT_ELASTIC_SIGMA,
+        help = 'The smoothness (in pixels) of elastic distortions.')
+
+    parser.add_argument('--augment-noise', dest = 'augmentNoise',
+        action = 'store', type = float, default = 0.0,
+        help = 'The standard deviation of Gaussian noise added to every cell image (0 to disable).')
+
+    parser.add_argument('--augment-rotation', dest = 'augmentRotation',
+        action = 'store', type = float, default = 0.0,
+        help = 'The maximum random rotation (in degrees) applied to every cell image (0 to disable).')
+
+    parser.add_argument('--augment-shift', dest = 'augmentShift',
+        action = 'store', type = float, default = 0.0,
+        help = 'The maximum random shift (in pixels) applied to every cell image (0 to disable).')
+
+    parser.add_argument('--compression', dest = 'compression',
+        action = 'store', type = str, default = None,
+        choices = textio.CODECS,
+        help = 'Compress every split file as it is written (readers detect compressed files on their own). Defaults to plain text.')
+
+    parser.add_argument('--compression-level', dest = 'compressionLevel',
+        action = 'store', type = int, default = None,
+        help = 'The level to compress at (%d - %d). Defaults to the level for the codec in textio.DEFAULT_LEVELS.' % (textio.MIN_LEVEL, textio.MAX_LEVEL))
+
     parser.add_argument('--corrupt-chance', dest = 'corruptChance',
         action = 'store', type = float, default = DEFAULT_CORRUPT_CHANCE,
         help = 'The chance to continue to make another corruption after one has been made.')
@@ -137,6 +223,10 @@ def _load_args():
         action = 'append', default = None,
         help = 'The dataset to use for puzzle cells (can be specified multiple times or with a comma-separated list). Defaults to "%s"' % (DEFAULT_DATASET))
 
+    parser.add_argument('--delta-twins', dest = 'deltaTwins',
+        action = 'store_true', default = False,
+        help = 'Store each corrupted puzzle as only the cells that differ from its correct twin (readers in splits.py rebuild it transparently).')
+
     parser.add_argument('--dimension', dest = 'dimension',
         action = 'store', type = int, default = DEFAULT_PUZZLE_DIM,
         choices = [4, 9],
@@ -146,6 +236,23 @@ def _load_args():
         action = 'store_true', default = False,
         help = 'Ignore existing data directories and write over them.')
 
+    parser.add_argument('--grid-bank', dest = 'gridBank',
+        action = 'store_true', default = False,
+        help = 'Sample puzzle grids from a (cached) bank of valid grids, instead of building each one cell by cell (see gridbank.py).')
+
+    parser.add_argument('--hard-corruption', dest = 'hardCorruption',
+        action = 'store_true', default = False,
+        help = 'Corrupt cells by replacing them with the most confusable labels and examples (by pixel distance, see confusion.py), instead of uniformly chosen ones.')
+
+    parser.add_argument('--labels-only', dest = 'labelsOnly',
+        action = 'store_true', default = False,
+        help = 'Only generate labels (no datasets are loaded and no pixels are written), with vectorized generation. Implies --grid-bank. Label-only splits are written to their own (labelsOnly::) directory, next to the full split with the same options.')
+
+    parser.add_argument('--layout', dest = 'layout',
+        action = 'store', type = str, default = splits.LAYOUT_CELL_MAJOR,
+        choices = splits.LAYOUTS,
+        help = 'How to order the pixels of each puzzle: cell by cell (%s) or as a single image of the whole board (%s).' % (splits.LAYOUT_CELL_MAJOR, splits.LAYOUT_GRID))
+
     parser.add_argument('--num-test', dest = 'numTest',
         action = 'store', type = int, default = DEFAULT_NUM_TEST,
         help = 'See --num-train, but for test.')
@@ -164,7 +271,11 @@ def _load_args():
 
     parser.add_argument('--seed', dest = 'seed',
         action = 'store', type = int, default = None,
-        help = 'Random seed.')
+        help = 'Random seed. Defaults to a seed derived from the split\'s path (so the same options always give the same split).')
+
+    parser.add_argument('--shard', dest = 'shard',
+        action = 'store', type = str, default = None,
+        help = 'Only generate this split if it belongs to shard i of N (given as "i/N", with 0 <= i < N). Splits are assigned to shards by a stable hash of their path.')
 
     parser.add_argument('--split', dest = 'split',
         action = 'store', type = str, default = DEFAULT_SPLIT,
@@ -175,11 +286,15 @@ def _load_args():
         choices = list(map(str, strategies.getStrategies())),
         help = 'The strategy to use when creating puzzles.')
 
+    parser.add_argument('--virtual', dest = 'virtual',
+        action = 'store_true', default = False,
+        help = 'Only write the options for the split, puzzles can then be materialized on demand with virtualsplits.VirtualSplit.')
+
     parser.add_argument('--out-dir', dest = 'outDir',
         action = 'store', type = str, default = DEFAULT_OUT_DIR,
         help = 'Where to create split directories.')
 
-    arguments = parser.parse_args()
+    arguments = parser.parse_args(args)
 
     if (arguments.datasetNames is None):
         arguments.datasetNames = [DEFAULT_DATASET]
@@ -212,12 +327,66 @@ def _load_args():
         print("Corrupt chance must be in [0, 1), got: %f." % (arguments.corruptChance), file = sys.stderr)
         sys.exit(2)
 
-    if (arguments.seed is None):
-        arguments.seed = random.randrange(2 ** 32)
+    try:
+        arguments.augmenter = augment.Augmenter(
+                rotation = arguments.augmentRotation, shift = arguments.augmentShift, noise = arguments.augmentNoise,
+                elastic = arguments.augmentElastic, elasticSigma = arguments.augmentElasticSigma)
+    except ValueError as ex:
+        print(str(ex), file = sys.stderr)
+        sys.exit(2)
+
+    if (not arguments.augmenter.isEnabled()):
+        arguments.augmenter = None
+
+    if (arguments.augmenter is not None and arguments.virtual):
+        print("Virtual splits cannot be augmented.", file = sys.stderr)
+        sys.exit(2)
+
+    # Virtual splits write no data files, so options about how they are written do not apply.
+    if (arguments.virtual and (arguments.compression is not None or arguments.compressionLevel is not None
+            or arguments.deltaTwins or arguments.layout != splits.LAYOUT_CELL_MAJOR)):
+        print("Virtual splits cannot be compressed, have delta twins, or use a layout other than %s." % (splits.LAYOUT_CELL_MAJOR), file = sys.stderr)
+        sys.exit(2)
+
+    if (arguments.labelsOnly):
+        if (arguments.virtual or arguments.augmenter is not None or arguments.hardCorruption):
+            print("Label-only splits cannot be virtual, augmented, or have hard corruptions.", file = sys.stderr)
+            sys.exit(2)
+
+        arguments.gridBank = True
+
+    if (arguments.compressionLevel is not None):
+        if (arguments.compression is None):
+            print("A compression level needs a codec (see --compression).", file = sys.stderr)
+            sys.exit(2)
+
+        if (arguments.compressionLevel < textio.MIN_LEVEL or arguments.compressionLevel > textio.MAX_LEVEL):
+            print("Compression level must be in [%d, %d], got: %d." % (textio.MIN_LEVEL, textio.MAX_LEVEL, arguments.compressionLevel), file = sys.stderr)
+            sys.exit(2)
+
+    if (arguments.shard is not None):
+        try:
+            (shard, numShards) = [int(part) for part in arguments.shard.split('/')]
+        except ValueError:
+            print("Shard must be given as \"i/N\", got: %s." % (arguments.shard), file = sys.stderr)
+            sys.exit(2)
+
+        if (numShards < 1 or shard < 0 or shard >= numShards):
+            print("Shard must be in [0, N) for N >= 1, got: %s." % (arguments.shard), file = sys.stderr)
+            sys.exit(2)
+
+        arguments.shard = (shard, numShards)
 
     arguments.strategy = strategies.getStrategy(arguments.strategy)
     arguments.strategy.validate(arguments)
 
+    arguments.subpath = splits.getSubpath(arguments.dimension, arguments.datasetNames, arguments.strategy,
+            arguments.numTrain, arguments.numTest, arguments.numValid,
+            arguments.corruptChance, arguments.overlapPercent, arguments.split, labelsOnly = arguments.labelsOnly)
+
+    if (arguments.seed is None):
+        arguments.seed = splits.getSeed(arguments.subpath)
+
     return arguments
 
 if (__name__ == '__main__'):
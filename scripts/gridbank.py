@@ -0,0 +1,215 @@
+'''
+Banks of valid (solved) sudoku grids, so puzzles can be sampled in O(dimension ** 2) with no retries.
+
+Grids are stored as symbols (0 to dimension - 1), and labels are assigned when a grid is sampled.
+Small dimensions (4x4 has only 288 valid grids) are fully enumerated, and sampled exactly uniformly.
+Larger dimensions store a bank of base grids, and each sample applies a uniformly random element of the sudoku symmetry group
+(relabeling, band and stack permutations, row/column permutations within each band/stack, and transposition) to a uniformly chosen base grid.
+So samples are uniform over the grids reachable from the bank (weighting each base grid's orbit equally).
+
+Banks are built once and kept in an on-disk cache.
+'''
+
+import math
+import os
+
+import numpy
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'visual-sudoku-puzzle-classification', 'grids')
+
+# Dimensions up to this are fully enumerated.
+MAX_ENUMERATED_DIMENSION = 4
+
+# The number of base grids to generate for dimensions that are not enumerated.
+NUM_BASE_GRIDS = 1000
+
+# Base grids are always generated from the same seed, so every cache holds the same bank.
+BANK_SEED = 4
+
+# Bump when the contents of a bank change, so stale caches are not used.
+BANK_VERSION = 2
+
+# Loaded banks: {dimension: GridBank, ...}.
+_banks = {}
+
+class GridBank(object):
+    '''
+    grids: int [numGrids, dimension, dimension] (symbols 0 to dimension - 1).
+    complete: whether the grids are every valid grid (so no symmetries need to be applied).
+    '''
+
+    def __init__(self, dimension, grids, complete):
+        self.dimension = dimension
+        self.grids = numpy.asarray(grids, dtype = numpy.uint8)
+        self.complete = complete
+
+    def __len__(self):
+        return len(self.grids)
+
+    def canSample(self, labels):
+        '''
+        Grids in a bank use exactly |dimension| labels,
+        so puzzles that draw from more labels (e.g. r_cell) have to be built the usual way.
+        '''
+
+        return len(labels) == self.dimension
+
+    def sampleGrid(self, labels, rng):
+        '''
+        Sample a valid grid over exactly |dimension| labels.
+        All randomness comes from rng (a numpy.random.Generator).
+
+        Returns:
+            [[label, ...], ...]
+        '''
+
+        if (not self.canSample(labels)):
+            raise ValueError("A %dx%d grid bank needs exactly %d labels, got %d." % (self.dimension, self.dimension, self.dimension, len(labels)))
+
+        symbolLabels = list(labels)
+        return [[symbolLabels[symbol] for symbol in row] for row in self.sampleGrids(1, rng)[0].tolist()]
+
+    def sampleGrids(self, count, rng):
+        '''
+        Sample count valid grids at once, using rng (a numpy.random.Generator).
+        Labels are left as symbols (randomly relabeled), so callers can map them onto each puzzle's labels.
+
+        Returns:
+            int [count, dimension, dimension] (symbols 0 to dimension - 1).
+        '''
+
+        grids = self.grids[rng.integers(len(self.grids), size = count)].astype(numpy.int64)
+
+        if (not self.complete):
+            grids = numpy.take_along_axis(grids.reshape((count, -1)), randomCellPermutations(self.dimension, count, rng), axis = 1)
+            grids = grids.reshape((count, self.dimension, self.dimension))
+
+        symbols = numpy.argsort(rng.random((count, self.dimension)), axis = 1)
+        return numpy.take_along_axis(symbols, grids.reshape((count, -1)), axis = 1).reshape((count, self.dimension, self.dimension))
+
+def randomCellPermutations(dimension, count, rng):
+    '''
+    Sample (uniformly) elements of the sudoku symmetry group that do not relabel:
+    band and stack permutations, row/column permutations within each band/stack, and transposition.
+    Each is given as a permutation of the cells (row-major) of a grid,
+    so permutedGrid[cell] = grid[permutation[cell]] keeps a valid grid valid (and an invalid one just as invalid).
+    All randomness comes from rng (a numpy.random.Generator).
+
+    Returns:
+        int [count, dimension ** 2].
+    '''
+
+    rows = _randomLinePermutations(dimension, count, rng)
+    cols = _randomLinePermutations(dimension, count, rng)
+
+    permutations = rows[:, :, numpy.newaxis] * dimension + cols[:, numpy.newaxis, :]
+
+    transpose = rng.random(count) < 0.5
+    permutations[transpose] = permutations[transpose].transpose((0, 2, 1))
+
+    return permutations.reshape((count, dimension ** 2))
+
+def _randomLinePermutations(dimension, count, rng):
+    '''
+    Random permutations of rows (or columns) that keep a grid valid:
+    the bands are shuffled, and then the rows within each band.
+
+    Returns:
+        int [count, dimension].
+    '''
+
+    blockSize = int(math.sqrt(dimension))
+
+    bands = numpy.argsort(rng.random((count, blockSize)), axis = 1)
+    lines = numpy.argsort(rng.random((count, blockSize, blockSize)), axis = 2)
+
+    return (bands[:, :, numpy.newaxis] * blockSize + lines).reshape((count, dimension))
+
+def getGridBank(dimension, cacheDir = DEFAULT_CACHE_DIR):
+    '''
+    Get the bank for a dimension, building it (and writing it to the cache) if it is not already cached.
+    '''
+
+    if (dimension in _banks):
+        return _banks[dimension]
+
+    complete = (dimension <= MAX_ENUMERATED_DIMENSION)
+    path = os.path.join(cacheDir, "grids-d%02d-%s-v%d.npy" % (dimension, 'all' if complete else ('n%d' % (NUM_BASE_GRIDS)), BANK_VERSION))
+
+    if (os.path.isfile(path)):
+        grids = numpy.load(path)
+    else:
+        if (complete):
+            grids = enumerateGrids(dimension)
+        else:
+            rng = numpy.random.default_rng(BANK_SEED)
+            grids = [generateGrid(dimension, rng) for _ in range(NUM_BASE_GRIDS)]
+
+        grids = numpy.array(grids, dtype = numpy.uint8).reshape((-1, dimension, dimension))
+
+        # Write to a temp file first, so concurrent builders never see a partial bank.
+        os.makedirs(cacheDir, exist_ok = True)
+        tempPath = "%s.%d.tmp" % (path, os.getpid())
+        with open(tempPath, 'wb') as file:
+            numpy.save(file, grids)
+        os.replace(tempPath, path)
+
+    _banks[dimension] = GridBank(dimension, grids, complete)
+    return _banks[dimension]
+
+def enumerateGrids(dimension):
+    '''
+    Every valid grid (over symbols 0 to dimension - 1), in lexicographic order.
+    '''
+
+    grids = []
+    _fillGrid([[None] * dimension for _ in range(dimension)], 0, list(range(dimension)), grids, None)
+    return grids
+
+def generateGrid(dimension, rng = None):
+    '''
+    Generate a single valid grid (over symbols 0 to dimension - 1) with a randomized backtracking search.
+    All randomness comes from rng (a numpy.random.Generator, unseeded if not supplied).
+    '''
+
+    if (rng is None):
+        rng = numpy.random.default_rng()
+
+    grids = []
+    _fillGrid([[None] * dimension for _ in range(dimension)], 0, list(range(dimension)), grids, rng)
+    return grids[0]
+
+def _fillGrid(grid, cell, symbols, grids, rng):
+    '''
+    Fill in a grid from cell onwards (in row-major order), adding every completed grid to grids.
+    With an rng, symbols are tried in random order and the search stops at the first completed grid.
+    Returns: True if the search should stop.
+    '''
+
+    dimension = len(grid)
+    if (cell == dimension ** 2):
+        grids.append([list(row) for row in grid])
+        return (rng is not None)
+
+    row = cell // dimension
+    col = cell % dimension
+
+    blockSize = int(math.sqrt(dimension))
+    blockRow = (row // blockSize) * blockSize
+    blockCol = (col // blockSize) * blockSize
+
+    used = set(grid[row][:col])
+    used.update([grid[i][col] for i in range(row)])
+    used.update([grid[i][j] for i in range(blockRow, row + 1) for j in range(blockCol, blockCol + blockSize)])
+
+    candidates = [symbol for symbol in symbols if symbol not in used]
+    if (rng is not None):
+        candidates = [candidates[index] for index in rng.permutation(len(candidates)).tolist()]
+
+    for symbol in candidates:
+        grid[row][col] = symbol
+        if (_fillGrid(grid, cell + 1, symbols, grids, rng)):
+            return True
+
+    grid[row][col] = None
+    return False
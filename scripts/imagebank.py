@@ -0,0 +1,144 @@
+'''
+Handle sharing loaded datasets (image banks) between processes.
+'''
+
+import multiprocessing.shared_memory
+
+import numpy
+
+import datasets
+
+class SharedImageBank(object):
+    '''
+    All the images for a dataset packed (grouped by label) into a single block of shared memory.
+    The owning process loads the dataset once and creates the bank.
+    Workers are then given the (small and picklable) handle and attach to the same memory,
+    so no images are loaded, copied, or unpickled per worker.
+    '''
+
+    def __init__(self, handle, sharedMemory, owner):
+        self.handle = handle
+        self.labels = list(handle['labels'])
+
+        self._sharedMemory = sharedMemory
+        self._owner = owner
+        self._images = numpy.ndarray(tuple(handle['shape']), dtype = numpy.dtype(handle['dtype']), buffer = sharedMemory.buf)
+
+    @staticmethod
+    def create(examples, labels):
+        '''
+        Pack examples ({label: [image, ...], ...}) into a new block of shared memory.
+        The caller owns the memory and should unlink() it when all workers are done.
+        '''
+
+        numImages = sum([len(examples[label]) for label in labels])
+        imageSize = len(examples[labels[0]][0])
+        dtype = numpy.asarray(examples[labels[0]][0]).dtype
+
+        sharedMemory, images = _allocate((numImages, imageSize), dtype)
+
+        start = 0
+        for label in labels:
+            end = start + len(examples[label])
+            if (end > start):
+                images[start:end] = examples[label]
+
+            start = end
+
+        return SharedImageBank(_newHandle(sharedMemory, images, examples, labels), sharedMemory, True)
+
+    @staticmethod
+    def attach(handle):
+        '''
+        Attach to a bank created in another process.
+        '''
+
+        try:
+            # Attaching processes should not clean up memory they do not own.
+            sharedMemory = multiprocessing.shared_memory.SharedMemory(name = handle['name'], track = False)
+        except TypeError:
+            # Python < 3.13.
+            sharedMemory = multiprocessing.shared_memory.SharedMemory(name = handle['name'])
+
+        return SharedImageBank(handle, sharedMemory, False)
+
+    def getExamples(self):
+        '''
+        Get zero-copy views into the bank.
+
+        Returns:
+            {label: [image, ...], ...}
+        '''
+
+        examples = {}
+        for label in self.labels:
+            (start, end) = self.handle['offsets'][label]
+            examples[label] = list(self._images[start:end])
+
+        return examples
+
+    def close(self):
+        # Views into the buffer must be released before the memory can be closed.
+        self._images = None
+        self._sharedMemory.close()
+
+    def unlink(self):
+        if (self._owner):
+            self._sharedMemory.unlink()
+
+def loadSharedBank(datasetName):
+    '''
+    Load a dataset (unshuffled) into a new shared bank.
+    The images are normalized straight into the shared memory (see datasets.loadMNIST()), so they are never held twice.
+    Pass the bank to datasets.fetchData() to have it shuffled and split the same way a fresh load would be.
+    '''
+
+    # [(shared memory, images), ...]
+    allocated = []
+    def allocate(shape, dtype):
+        allocated.append(_allocate(shape, dtype))
+        return allocated[-1][1]
+
+    try:
+        examples, labels = datasets.loadMNIST(datasetName, shuffle = False, allocate = allocate)
+        (sharedMemory, images) = allocated[0]
+        handle = _newHandle(sharedMemory, images, examples, labels)
+    except BaseException:
+        for (sharedMemory, _) in allocated:
+            sharedMemory.close()
+            sharedMemory.unlink()
+        raise
+
+    return SharedImageBank(handle, sharedMemory, True)
+
+def _allocate(shape, dtype):
+    '''
+    Returns: (a new block of shared memory, an array of the given shape and dtype backed by it).
+    '''
+
+    dtype = numpy.dtype(dtype)
+    size = int(numpy.prod(shape)) * dtype.itemsize
+
+    sharedMemory = multiprocessing.shared_memory.SharedMemory(create = True, size = max(1, size))
+    return sharedMemory, numpy.ndarray(shape, dtype = dtype, buffer = sharedMemory.buf)
+
+def _newHandle(sharedMemory, images, examples, labels):
+    '''
+    The handle for a bank holding the images of each label (in the order of labels) in a contiguous block.
+    '''
+
+    # {label: [start, end], ...}
+    offsets = {}
+    start = 0
+    for label in labels:
+        end = start + len(examples[label])
+        offsets[label] = [start, end]
+        start = end
+
+    return {
+        'name': sharedMemory.name,
+        'shape': list(images.shape),
+        'dtype': images.dtype.str,
+        'labels': list(labels),
+        'offsets': offsets,
+    }
@@ -0,0 +1,108 @@
+'''
+Handle hashing cell images, e.g. to find the same image being used in multiple places.
+'''
+
+import numpy
+
+import datasets
+import splits
+
+HASH_SEED = 4
+
+# A seed for every 8 bytes of an image (of uint8 intensities), so the same word in different places hashes differently.
+_WORD_SEEDS = numpy.random.default_rng(HASH_SEED).integers(0, 2 ** 64, size = (datasets.MNIST_DIMENSION ** 2) // 8, dtype = numpy.uint64)
+
+def toIntensities(images):
+    '''
+    Convert normalized pixels (see datasets.PIXEL_VALUES) back to their original uint8 intensities.
+    '''
+
+    images = numpy.asarray(images)
+    if (images.dtype == numpy.uint8):
+        return images
+
+    return numpy.rint(images * 255).astype(numpy.uint8)
+
+def hashImages(images):
+    '''
+    Get a 64-bit digest for every image (the last axis is the pixels of one image).
+    The same image (exact same pixels) always gets the same digest (across processes and runs).
+
+    Returns:
+        uint64 [images.shape[:-1]].
+    '''
+
+    intensities = toIntensities(images)
+    shape = intensities.shape[:-1]
+
+    words = numpy.ascontiguousarray(intensities.reshape((-1, intensities.shape[-1]))).view(numpy.uint64)
+
+    # Every word is mixed (with its seed) before the words are summed,
+    # so changes to different words never cancel out (as they can in a weighted sum of the raw words).
+    digests = _mix(words ^ _WORD_SEEDS).sum(axis = 1, dtype = numpy.uint64)
+
+    # Mix again so that similar images do not get similar digests.
+    return _mix(digests).reshape(shape)
+
+def _mix(values):
+    '''
+    The splitmix64 finalizer (on a new uint64 array).
+    '''
+
+    values = values ^ (values >> numpy.uint64(30))
+    values *= numpy.uint64(0xbf58476d1ce4e5b9)
+    values ^= values >> numpy.uint64(27)
+    values *= numpy.uint64(0x94d049bb133111eb)
+    values ^= values >> numpy.uint64(31)
+
+    return values
+
+class HashIndex(object):
+    '''
+    A compact index of distinct images: their digests (see hashImages()) in a sorted uint64 array.
+    Indexes are compared with sorted merges, so finding the images two indexes share is O(n log n).
+    '''
+
+    def __init__(self, digests):
+        self.digests = numpy.unique(numpy.asarray(digests, dtype = numpy.uint64).reshape(-1))
+
+    @staticmethod
+    def fromImages(images):
+        return HashIndex(hashImages(images))
+
+    @staticmethod
+    def fromSplit(splitDir, partition):
+        '''
+        Index every cell image in one partition of a split (streamed one batch at a time).
+        '''
+
+        digests = []
+        for (images, _, _) in splits.SplitLoader(splitDir, partition, shuffle = False):
+            digests.append(numpy.unique(hashImages(images)))
+
+        return HashIndex(numpy.concatenate(digests) if (len(digests) > 0) else [])
+
+    def __len__(self):
+        return len(self.digests)
+
+    def contains(self, digests):
+        '''
+        Check which digests are in this index.
+
+        Returns:
+            bool [digests.shape].
+        '''
+
+        digests = numpy.asarray(digests, dtype = numpy.uint64)
+        if (len(self.digests) == 0):
+            return numpy.zeros(digests.shape, dtype = bool)
+
+        positions = numpy.minimum(numpy.searchsorted(self.digests, digests), len(self.digests) - 1)
+        return self.digests[positions] == digests
+
+    def overlap(self, other):
+        '''
+        The number of distinct images in both indexes.
+        '''
+
+        return len(numpy.intersect1d(self.digests, other.digests, assume_unique = True))
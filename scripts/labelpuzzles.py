@@ -0,0 +1,197 @@
+'''
+Vectorized generation of label-only puzzles (no images), for symbolic experiments (see generate-split.py --labels-only).
+
+Everything works on whole batches of puzzles at once, with all randomness from a numpy.random.Generator.
+Puzzles follow the same rules as puzzles.generatePuzzle() and puzzles.corruptPuzzle(),
+but are not the same puzzles the (per-puzzle) builders would make for a seed.
+'''
+
+import math
+
+import numpy
+
+import puzzles
+import scoring
+
+# The most puzzles to work on at once (bounds the memory used for option masks and violation counts).
+BATCH_SIZE = 4096
+
+# How many times fillGrids() goes back to the start of a row (after dead ends) before starting a grid over.
+MAX_ROW_RETRIES = 8
+
+def fillGrids(dimension, numLabels, count, rng):
+    '''
+    Build valid grids cell by cell (row by row), choosing uniformly from the labels still allowed at each cell.
+    This is meant for puzzles with more than |dimension| labels (e.g. r_cell).
+    Dead ends are common (e.g. only about 1 in 80 9x9 grids over 10 labels gets through without one),
+    so instead of starting a grid over (like puzzles.generatePuzzle() does), a grid that reaches a dead end
+    goes back to the start of its row, and only starts over after MAX_ROW_RETRIES tries at the same row.
+    Grids are not drawn from exactly the same distribution as puzzles.generatePuzzle(), but follow the same rules.
+
+    Every grid moves at its own pace: each step places one cell in each of (up to) BATCH_SIZE grids,
+    and a finished grid makes room for a new one.
+
+    Returns:
+        int [count, dimension, dimension] (indexes into the numLabels labels).
+    '''
+
+    numCells = dimension ** 2
+    grids = numpy.empty((count, numCells), dtype = numpy.int64)
+    if (count == 0):
+        return grids.reshape((count, dimension, dimension))
+
+    peers = _getPeers(dimension)
+
+    numSlots = min(count, BATCH_SIZE)
+    slots = numpy.arange(numSlots)
+
+    cells = numpy.zeros((numSlots, numCells), dtype = numpy.int64)
+    positions = numpy.zeros(numSlots, dtype = numpy.int64)
+    rowRetries = numpy.zeros(numSlots, dtype = numpy.int64)
+
+    # [slot, cell, label], and the same at the start of each slot's current row.
+    allowed = numpy.ones((numSlots, numCells, numLabels), dtype = bool)
+    rowAllowed = allowed.copy()
+
+    numDone = 0
+    while (numDone < count):
+        options = allowed[slots, positions]
+        numOptions = options.sum(axis = 1)
+        live = (numOptions > 0)
+
+        # Take the k-th allowed label (k uniform over the allowed labels).
+        choices = numpy.floor(rng.random(numSlots) * numOptions)
+        labels = numpy.argmax(numpy.cumsum(options, axis = 1) > choices[:, numpy.newaxis], axis = 1)
+
+        liveSlots = slots[live]
+        cells[liveSlots, positions[live]] = labels[live]
+        allowed[liveSlots[:, numpy.newaxis], peers[positions[live]], labels[live][:, numpy.newaxis]] = False
+        positions[live] += 1
+
+        newRows = live & (positions % dimension == 0)
+        rowAllowed[newRows] = allowed[newRows]
+        rowRetries[newRows] = 0
+
+        deadSlots = slots[~live]
+        allowed[deadSlots] = rowAllowed[deadSlots]
+        positions[deadSlots] -= positions[deadSlots] % dimension
+        rowRetries[deadSlots] += 1
+
+        finished = (positions == numCells)
+        numFinished = min(int(finished.sum()), count - numDone)
+        grids[numDone:(numDone + numFinished)] = cells[finished][:numFinished]
+        numDone += numFinished
+
+        restart = finished | (rowRetries > MAX_ROW_RETRIES)
+        allowed[restart] = True
+        rowAllowed[restart] = True
+        positions[restart] = 0
+        rowRetries[restart] = 0
+
+    return grids.reshape((count, dimension, dimension))
+
+def _getPeers(dimension):
+    '''
+    Returns: int [dimension ** 2, numPeers], the cells (flat indexes) that share a row, column, or block with each cell
+    (including the cell itself).
+    '''
+
+    blockSize = int(math.sqrt(dimension))
+    rows, cols = numpy.divmod(numpy.arange(dimension ** 2), dimension)
+    blocks = (rows // blockSize) * blockSize + (cols // blockSize)
+
+    peers = (rows[:, numpy.newaxis] == rows) | (cols[:, numpy.newaxis] == cols) | (blocks[:, numpy.newaxis] == blocks)
+    return numpy.stack([numpy.nonzero(cellPeers)[0] for cellPeers in peers])
+
+def corruptGrids(cellLabels, numLabels, corruptionChance, rng):
+    '''
+    Corrupt valid grids the same way puzzles.corruptPuzzle() does:
+    each puzzle is corrupted by either swapping pairs of cells or replacing cells (with another of its labels),
+    always making one change and then continuing with corruptionChance (up to the same limits),
+    and trying again until the puzzle has at least one violation.
+
+    Args:
+        cellLabels: int [numPuzzles, dimension, dimension] (indexes into each puzzle's labels, in [0, numLabels)).
+
+    Returns:
+        (int [numPuzzles, dimension, dimension] corrupted cell labels, [note, ...], int [numPuzzles] violations).
+    '''
+
+    (numPuzzles, dimension, _) = cellLabels.shape
+    numCells = dimension ** 2
+
+    maxSwaps = min(puzzles.PUZZLE_CORRUPTION_MAX, numCells // 2)
+    maxReplacements = min(puzzles.PUZZLE_CORRUPTION_MAX, numCells)
+
+    corruptCellLabels = numpy.empty_like(cellLabels)
+    violations = numpy.zeros(numPuzzles, dtype = numpy.int64)
+    counts = numpy.zeros(numPuzzles, dtype = numpy.int64)
+
+    # 1 for replacement, 0 for swap (see puzzles.corruptPuzzle()).
+    methods = rng.integers(2, size = numPuzzles)
+
+    # Swaps can never break a grid where every label is different (possible when puzzles draw from more than |dimension| labels),
+    # so those grids are always corrupted by replacement (puzzles.corruptPuzzle() would retry forever).
+    sortedLabels = numpy.sort(cellLabels.reshape((numPuzzles, numCells)), axis = 1)
+    distinct = numpy.all(sortedLabels[:, 1:] != sortedLabels[:, :-1], axis = 1)
+    methods[distinct] = 1
+
+    pending = numpy.arange(numPuzzles)
+    while (len(pending) > 0):
+        numPending = len(pending)
+        rows = numpy.arange(numPending)
+
+        grids = cellLabels[pending].reshape((numPending, numCells)).copy()
+        replace = (methods[pending] == 1)
+
+        # One change, then keep going while the chance holds (see puzzles.corruptionCount()).
+        batchCounts = rng.geometric(1.0 - corruptionChance, size = numPending)
+        batchCounts = numpy.minimum(batchCounts, numpy.where(replace, maxReplacements, maxSwaps))
+
+        # Every change uses cells that have not been used yet.
+        cells = numpy.argsort(rng.random((numPending, numCells)), axis = 1)
+
+        for i in range(maxSwaps):
+            active = (~replace) & (i < batchCounts)
+            cells1 = cells[active, 2 * i]
+            cells2 = cells[active, (2 * i) + 1]
+
+            activeRows = rows[active]
+            grids[activeRows, cells1], grids[activeRows, cells2] = grids[activeRows, cells2], grids[activeRows, cells1]
+
+        # Replacement labels are drawn from every label except the current one.
+        newLabels = rng.integers(numLabels - 1, size = (numPending, maxReplacements))
+        for i in range(maxReplacements):
+            active = replace & (i < batchCounts)
+            activeRows = rows[active]
+            corruptCells = cells[active, i]
+
+            oldLabels = grids[activeRows, corruptCells]
+            labels = newLabels[active, i]
+            grids[activeRows, corruptCells] = labels + (labels >= oldLabels)
+
+        grids = grids.reshape((numPending, dimension, dimension))
+        batchViolations = countViolations(grids, numLabels)
+
+        done = (batchViolations > 0)
+        corruptCellLabels[pending[done]] = grids[done]
+        violations[pending[done]] = batchViolations[done]
+        counts[pending[done]] = batchCounts[done]
+
+        pending = pending[~done]
+
+    notes = [((puzzles.PUZZLE_NOTE_REPLACE if (method == 1) else puzzles.PUZZLE_NOTE_SWAP) % (count)) for (method, count) in zip(methods.tolist(), counts.tolist())]
+
+    return corruptCellLabels, notes, violations
+
+def countViolations(cellLabels, numLabels):
+    '''
+    scoring.countViolations() in batches (to bound the memory for its one-hot counts).
+    '''
+
+    violations = numpy.empty(len(cellLabels), dtype = numpy.int64)
+    for start in range(0, len(cellLabels), BATCH_SIZE):
+        end = start + BATCH_SIZE
+        violations[start:end] = scoring.countViolations(cellLabels[start:end], numLabels = numLabels)
+
+    return violations
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+
+# Plan a sweep of splits (like generate-data.sh) before generating anything.
+# For every config this reports the number of puzzles and images, the size of the output (in each format),
+# an estimate of the wall time (from a quick benchmark of this machine),
+# and any config that generate-split.py would reject (e.g. datasets without enough examples per label).
+# No datasets are loaded, unless --measure-datasets is given to get the size of text pixels from each dataset's intensities
+# (otherwise text pixel sizes are rough estimates).
+# Sizes are for uncompressed splits with every puzzle stored in full:
+# --compression, --delta-twins, and --labels-only (see generate-split.py) are out of scope.
+# Notes (and the width of binary labels) depend on the corruptions and labels each split chooses, so sizes are given as a range (min - max).
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+
+import datasets
+import imagehash
+import puzzles
+import splits
+import strategies
+
+# The sweep from generate-data.sh.
+DEFAULT_NUM_SPLITS = 11
+DEFAULT_DIMENSIONS = [4, 9]
+DEFAULT_NUM_TRAIN = [1, 2, 5, 10, 20, 30, 40, 50, 100]
+DEFAULT_NUM_TEST_VALID = [100]
+DEFAULT_OVERLAP_PERCENTS = [0.0, 0.5, 1.0, 2.0]
+DEFAULT_STRATEGIES = ['simple', 'r_split', 'r_puzzle', 'r_cell', 'transfer']
+DEFAULT_CORRUPT_CHANCE = 0.5
+
+SINGLE_DATASETS = ['mnist', 'emnist', 'fmnist', 'kmnist']
+LARGE_DATASETS = ['emnist']
+ALL_DATASETS = ['mnist', 'emnist', 'fmnist', 'kmnist',
+        'mnist,emnist', 'mnist,fmnist', 'mnist,kmnist', 'emnist,fmnist', 'emnist,kmnist', 'fmnist,kmnist',
+        'emnist,fmnist,kmnist', 'mnist,fmnist,kmnist', 'mnist,emnist,fmnist', 'mnist,emnist,fmnist,kmnist']
+
+# {(dimension, strategy): [datasets, ...], ...}
+ALLOWED_DATASETS = {
+    (4, 'simple'): SINGLE_DATASETS,
+    (4, 'r_split'): ALL_DATASETS,
+    (4, 'r_puzzle'): ALL_DATASETS,
+    (4, 'r_cell'): ALL_DATASETS,
+    (4, 'transfer'): SINGLE_DATASETS,
+    (9, 'simple'): SINGLE_DATASETS,
+    (9, 'r_split'): ALL_DATASETS,
+    (9, 'r_puzzle'): ALL_DATASETS,
+    (9, 'r_cell'): ALL_DATASETS,
+    (9, 'transfer'): LARGE_DATASETS,
+}
+
+# Text pixels are written with str() (e.g. '0.0' or '0.9922', see splits.PIXEL_STRINGS), so their size depends on the data.
+# These are rough estimates of the mean bytes per pixel (including the separator), used unless datasets are measured (see measureDataset()).
+MEAN_PIXEL_TEXT_BYTES = {
+    datasets.DATASET_MNIST: 4.6,
+    datasets.DATASET_EMNIST: 4.8,
+    datasets.DATASET_KMNIST: 5.0,
+    datasets.DATASET_FMNIST: 5.5,
+}
+
+# The note every correct puzzle gets (see generate-split.py), without its newline.
+CORRECT_NOTE_BYTES = len(puzzles.PUZZLE_NOTE_CORRRECT + '\t' + puzzles.PUZZLE_NOTE_VIOLATIONS % (0))
+
+# The size of the header numpy writes for an .npy file.
+NPY_HEADER_BYTES = 128
+
+# Roughly how long it takes to start generate-split.py and load the datasets for one split.
+DEFAULT_LOAD_SECONDS = 20.0
+
+DEFAULT_BENCHMARK_SECONDS = 1.0
+
+FORMAT_TEXT = 'text'
+FORMAT_BINARY = 'binary'
+FORMATS = [FORMAT_TEXT, FORMAT_BINARY]
+
+class _IndexChooser(object):
+    '''
+    A stand-in for datasets.ExampleChooser that does not need any images.
+    '''
+
+    def takeExample(self, label, rng = None):
+        return label
+
+    def getExample(self, label, rng = None):
+        return label
+
+def benchmark(dimension, seconds):
+    '''
+    Time this machine making (correct and corrupted) puzzle pairs and writing their text pixels.
+
+    Returns:
+        (seconds per pair generated, seconds per puzzle written).
+    '''
+
+    labels = list(range(dimension))
+    chooser = _IndexChooser()
+    rng = numpy.random.default_rng(0)
+
+    numPairs = 0
+    startTime = time.time()
+    while (numPairs == 0 or (time.time() - startTime) < seconds):
+        images, cellLabels = puzzles.generatePuzzle(dimension, labels, chooser, rng = rng)
+        puzzles.corruptPuzzle(dimension, labels, chooser, images, cellLabels, DEFAULT_CORRUPT_CHANCE, rng = rng)
+        numPairs += 1
+    generateSeconds = (time.time() - startTime) / numPairs
+
+    # Write random pixels the same way generate-split.py does.
+    intensities = numpy.random.default_rng(0).integers(0, 256, size = (4, (dimension ** 2) * (datasets.MNIST_DIMENSION ** 2)))
+    rows = datasets.PIXEL_VALUES[intensities]
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        startTime = time.time()
+        splits.writePixelRows(os.path.join(tempDir, splits.PUZZLE_PIXELS_FILENAME), rows)
+        writeSeconds = (time.time() - startTime) / len(rows)
+
+    return generateSeconds, writeSeconds
+
+def getPixelTextBytes(histogram):
+    '''
+    The mean bytes of text per pixel (including the tab or newline after it) for pixels with an intensity histogram (int [256]).
+    '''
+
+    lengths = numpy.array([len(string) + 1 for string in splits.PIXEL_STRINGS])
+    return float((numpy.asarray(histogram) * lengths).sum() / numpy.sum(histogram))
+
+def measureDataset(datasetName):
+    '''
+    Load a dataset and get the mean bytes of text per pixel (see getPixelTextBytes()) for its cells.
+    Splits use the same number of examples for every label, so every label is weighted equally.
+    '''
+
+    examples, labels = datasets.loadMNIST(datasetName, shuffle = False)
+
+    histogram = numpy.zeros(256)
+    for label in labels:
+        if (len(examples[label]) == 0):
+            continue
+
+        labelHistogram = numpy.bincount(imagehash.toIntensities(numpy.stack(examples[label])).reshape(-1), minlength = 256)
+        histogram += labelHistogram / len(examples[label])
+
+    return getPixelTextBytes(histogram)
+
+def getIncorrectNoteBytes(dimension):
+    '''
+    The shortest and longest note a corrupted puzzle can get (see puzzles.corruptPuzzle()), without its newline.
+    Every changed cell adds at most one violation to each of its row, column, and block,
+    and no unit can have more than |dimension| - 1 violations.
+
+    Returns: (min bytes, max bytes).
+    '''
+
+    maxViolations = 3 * dimension * (dimension - 1)
+
+    # [(note, most corruptions, cells changed per corruption), ...]
+    methods = [
+        (puzzles.PUZZLE_NOTE_SWAP, min(puzzles.PUZZLE_CORRUPTION_MAX, dimension ** 2 // 2), 2),
+        (puzzles.PUZZLE_NOTE_REPLACE, min(puzzles.PUZZLE_CORRUPTION_MAX, dimension ** 2), 1),
+    ]
+
+    minBytes = min([len(note % (1)) for (note, _, _) in methods]) + len('\t' + puzzles.PUZZLE_NOTE_VIOLATIONS % (1))
+    maxBytes = max([len(note % (count)) + len('\t' + puzzles.PUZZLE_NOTE_VIOLATIONS % (min(maxViolations, 3 * cells * count)))
+            for (note, count, cells) in methods])
+
+    return minBytes, maxBytes
+
+def getEmittedLabels(dimension, datasetNames, strategy):
+    '''
+    The labels a split of this strategy can use.
+    Only simple always uses the same labels, every other strategy can draw from all the labels of its datasets.
+    '''
+
+    if (isinstance(strategy, strategies.SimpleStrategy)):
+        return datasets.getLabels(datasetNames[0])[0:dimension]
+
+    return [label for datasetName in datasetNames for label in datasets.getLabels(datasetName)]
+
+def checkConfig(dimension, datasetNames, strategy, numTrain, numTest, numValid):
+    '''
+    Returns: a reason that generate-split.py would reject this config (or None).
+    '''
+
+    try:
+        strategy.validate(argparse.Namespace(dimension = dimension, datasetNames = datasetNames))
+    except ValueError as ex:
+        return str(ex)
+
+    # See datasets.fetchData().
+    requiredExamplesPerLabel = dimension * (numTrain + numTest + numValid)
+    for datasetName in datasetNames:
+        if (datasets.NUM_EXAMPLES_PER_LABEL[datasetName] < requiredExamplesPerLabel):
+            return "%s does not have enough examples per label. Want %d, have %d." % (
+                    datasetName, requiredExamplesPerLabel, datasets.NUM_EXAMPLES_PER_LABEL[datasetName])
+
+    return None
+
+def planConfig(dimension, datasetNames, strategy, numTrain, numTest, numValid, pixelTextBytes = MEAN_PIXEL_TEXT_BYTES):
+    '''
+    pixelTextBytes: {datasetName: mean bytes of text per pixel, ...}.
+    Sizes are a range, since notes (and the width of binary labels) depend on the corruptions and labels that are chosen.
+    Returns: {'puzzles': int, 'images': int, 'bytes': {format: (min int, max int), ...}} for one split.
+    '''
+
+    numPuzzles = 2 * (numTrain + numTest + numValid)
+    numCells = dimension ** 2
+    numImages = numPuzzles * numCells
+    numPixels = numImages * (datasets.MNIST_DIMENSION ** 2)
+
+    labels = getEmittedLabels(dimension, datasetNames, strategy)
+    labelBytes = list(sorted([len(label) for label in labels]))
+    meanLabelBytes = sum(labelBytes) / len(labelBytes)
+    meanPixelTextBytes = sum([pixelTextBytes[datasetName] for datasetName in datasetNames]) / len(datasetNames)
+
+    # Every puzzle uses at least |dimension| labels.
+    minLabelBytes = labelBytes[min(dimension, len(labelBytes)) - 1]
+    maxLabelBytes = labelBytes[-1]
+
+    # Half of the puzzles are correct and half are corrupted.
+    (minIncorrectNoteBytes, maxIncorrectNoteBytes) = getIncorrectNoteBytes(dimension)
+    minNoteBytes = max(CORRECT_NOTE_BYTES, minIncorrectNoteBytes)
+    maxNoteBytes = max(CORRECT_NOTE_BYTES, maxIncorrectNoteBytes)
+
+    # [(min, max), ...]
+    textBytes = {
+        splits.PUZZLE_PIXELS_FILENAME: (numPixels * meanPixelTextBytes, ) * 2,
+        splits.CELL_LABELS_FILENAME: (numImages * (meanLabelBytes + 1), ) * 2,
+        # "1\t0\n"
+        splits.PUZZLE_LABELS_FILENAME: (numPuzzles * 4, ) * 2,
+        splits.PUZZLE_NOTES_FILENAME: (
+            (numPuzzles / 2) * (CORRECT_NOTE_BYTES + 1 + minIncorrectNoteBytes + 1),
+            (numPuzzles / 2) * (CORRECT_NOTE_BYTES + 1 + maxIncorrectNoteBytes + 1),
+        ),
+    }
+
+    # See convert-splits.py (labels and notes are as wide as the longest one).
+    binaryBytes = {
+        splits.PUZZLE_PIXELS_FILENAME: (numPixels, ) * 2,
+        splits.CELL_LABELS_FILENAME: (numImages * minLabelBytes, numImages * maxLabelBytes),
+        splits.PUZZLE_LABELS_FILENAME: (numPuzzles * 2, ) * 2,
+        splits.PUZZLE_NOTES_FILENAME: (numPuzzles * minNoteBytes, numPuzzles * maxNoteBytes),
+    }
+
+    numFiles = len(splits.PARTITIONS) * len(splits.FILENAMES)
+
+    return {
+        'puzzles': numPuzzles,
+        'images': numImages,
+        'bytes': {
+            FORMAT_TEXT: tuple([int(sum([size[i] for size in textBytes.values()])) for i in range(2)]),
+            FORMAT_BINARY: tuple([int(sum([size[i] for size in binaryBytes.values()])) + (numFiles * NPY_HEADER_BYTES) for i in range(2)]),
+        },
+    }
+
+def formatBytes(numBytes):
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if (numBytes < 1024 or unit == 'TB'):
+            return "%.1f %s" % (numBytes, unit)
+
+        numBytes /= 1024.0
+
+def formatByteRange(byteRange):
+    (minText, maxText) = [formatBytes(numBytes) for numBytes in byteRange]
+    if (minText == maxText):
+        return minText
+
+    return "%s - %s" % (minText, maxText)
+
+def formatSeconds(seconds):
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    return "%dh%02dm%02ds" % (hours, minutes, int(math.ceil(seconds % 60)))
+
+def main(arguments):
+    pixelTextBytes = MEAN_PIXEL_TEXT_BYTES
+    textPrefix = '~'
+
+    if (arguments.measureDatasets):
+        pixelTextBytes = {}
+        for datasetName in datasets.DATASETS:
+            pixelTextBytes[datasetName] = measureDataset(datasetName)
+            print("Measured %s: %.4f bytes of text per pixel." % (datasetName, pixelTextBytes[datasetName]))
+
+        textPrefix = ''
+    else:
+        print("Text pixel sizes are rough estimates (see --measure-datasets).")
+
+    timings = {}
+    for dimension in arguments.dimensions:
+        timings[dimension] = benchmark(dimension, arguments.benchmarkSeconds)
+        print("Benchmark (%dx%d): %.4f seconds per puzzle pair, %.4f seconds to write a puzzle's text pixels." % (
+                dimension, dimension, timings[dimension][0], timings[dimension][1]))
+
+    totals = {'splits': 0, 'rejected': 0, 'puzzles': 0, 'images': 0, 'seconds': 0.0, 'bytes': {outputFormat: [0, 0] for outputFormat in FORMATS}}
+
+    for dimension in arguments.dimensions:
+        for numTrain in arguments.numTrain:
+            for numTestValid in arguments.numTestValid:
+                for overlapPercent in arguments.overlapPercents:
+                    for strategyName in arguments.strategies:
+                        strategy = strategies.getStrategy(strategyName)
+
+                        allDatasets = arguments.datasets
+                        if (allDatasets is None):
+                            allDatasets = ALLOWED_DATASETS.get((dimension, strategyName), [])
+
+                        for datasetNames in allDatasets:
+                            datasetNames = list(sorted(set(datasetNames.split(','))))
+
+                            subpath = os.path.dirname(splits.getSubpath(dimension, datasetNames, strategyName,
+                                    numTrain, numTestValid, numTestValid, arguments.corruptChance, overlapPercent, ''))
+
+                            reason = checkConfig(dimension, datasetNames, strategy, numTrain, numTestValid, numTestValid)
+                            if (reason is not None):
+                                totals['rejected'] += arguments.numSplits
+                                print("REJECT %s -- %s" % (subpath, reason))
+                                continue
+
+                            plan = planConfig(dimension, datasetNames, strategy, numTrain, numTestValid, numTestValid, pixelTextBytes = pixelTextBytes)
+
+                            (generateSeconds, writeSeconds) = timings[dimension]
+                            seconds = arguments.loadSeconds + (plan['puzzles'] / 2 * generateSeconds) + (plan['puzzles'] * writeSeconds)
+
+                            totals['splits'] += arguments.numSplits
+                            totals['puzzles'] += plan['puzzles'] * arguments.numSplits
+                            totals['images'] += plan['images'] * arguments.numSplits
+                            totals['seconds'] += seconds * arguments.numSplits
+                            for outputFormat in FORMATS:
+                                for i in range(2):
+                                    totals['bytes'][outputFormat][i] += plan['bytes'][outputFormat][i] * arguments.numSplits
+
+                            if (arguments.verbose):
+                                print("%s -- %d splits x (%d puzzles, %d images, text: %s%s, binary: %s, ~%s)" % (
+                                        subpath, arguments.numSplits, plan['puzzles'], plan['images'], textPrefix,
+                                        formatByteRange(plan['bytes'][FORMAT_TEXT]), formatByteRange(plan['bytes'][FORMAT_BINARY]),
+                                        formatSeconds(seconds)))
+
+    print("Total: %d splits (%d rejected), %d puzzles, %d images, text: %s%s, binary: %s, ~%s on one core." % (
+            totals['splits'], totals['rejected'], totals['puzzles'], totals['images'], textPrefix,
+            formatByteRange(totals['bytes'][FORMAT_TEXT]), formatByteRange(totals['bytes'][FORMAT_BINARY]),
+            formatSeconds(totals['seconds'])))
+
+def _load_args():
+    parser = argparse.ArgumentParser(description = 'Plan the size and cost of a sweep of splits (defaults to the sweep in generate-data.sh).')
+
+    parser.add_argument('--benchmark-seconds', dest = 'benchmarkSeconds',
+        action = 'store', type = float, default = DEFAULT_BENCHMARK_SECONDS,
+        help = 'How long to benchmark puzzle generation for (per dimension).')
+
+    parser.add_argument('--corrupt-chance', dest = 'corruptChance',
+        action = 'store', type = float, default = DEFAULT_CORRUPT_CHANCE,
+        help = 'The corrupt chance for every split (only used for paths).')
+
+    parser.add_argument('--dataset', dest = 'datasets',
+        action = 'append', default = None,
+        help = 'Datasets to sweep over (can be specified multiple times, each can be a comma-separated list of datasets for a single split). Defaults to the datasets allowed for each dimension/strategy in generate-data.sh.')
+
+    parser.add_argument('--dimension', dest = 'dimensions',
+        action = 'append', type = int, default = None,
+        choices = [4, 9],
+        help = 'Dimensions to sweep over (can be specified multiple times).')
+
+    parser.add_argument('--load-seconds', dest = 'loadSeconds',
+        action = 'store', type = float, default = DEFAULT_LOAD_SECONDS,
+        help = 'How long it takes to start up and load datasets for a single split.')
+
+    parser.add_argument('--measure-datasets', dest = 'measureDatasets',
+        action = 'store_true', default = False,
+        help = 'Load every dataset to get the expected size of text pixels from its intensities (instead of using rough estimates).')
+
+    parser.add_argument('--num-splits', dest = 'numSplits',
+        action = 'store', type = int, default = DEFAULT_NUM_SPLITS,
+        help = 'The number of splits for each config.')
+
+    parser.add_argument('--num-test-valid', dest = 'numTestValid',
+        action = 'append', type = int, default = None,
+        help = 'Numbers of test/valid puzzles to sweep over (can be specified multiple times).')
+
+    parser.add_argument('--num-train', dest = 'numTrain',
+        action = 'append', type = int, default = None,
+        help = 'Numbers of train puzzles to sweep over (can be specified multiple times).')
+
+    parser.add_argument('--overlap-percent', dest = 'overlapPercents',
+        action = 'append', type = float, default = None,
+        help = 'Overlap percents to sweep over (can be specified multiple times).')
+
+    parser.add_argument('--strategy', dest = 'strategies',
+        action = 'append', type = str, default = None,
+        choices = list(map(str, strategies.getStrategies())),
+        help = 'Strategies to sweep over (can be specified multiple times).')
+
+    parser.add_argument('--verbose', dest = 'verbose',
+        action = 'store_true', default = False,
+        help = 'Report every config (not just rejected ones and the totals).')
+
+    arguments = parser.parse_args()
+
+    defaults = {
+        'dimensions': DEFAULT_DIMENSIONS,
+        'numTrain': DEFAULT_NUM_TRAIN,
+        'numTestValid': DEFAULT_NUM_TEST_VALID,
+        'overlapPercents': DEFAULT_OVERLAP_PERCENTS,
+        'strategies': DEFAULT_STRATEGIES,
+    }
+
+    for (name, value) in defaults.items():
+        if (getattr(arguments, name) is None):
+            setattr(arguments, name, value)
+
+    if (arguments.datasets is not None):
+        for datasetNames in arguments.datasets:
+            for datasetName in datasetNames.split(','):
+                if (datasetName not in datasets.DATASETS):
+                    print("Unknown dataset specified: %s." % (datasetName), file = sys.stderr)
+                    sys.exit(2)
+
+    return arguments
+
+if (__name__ == '__main__'):
+    main(_load_args())
@@ -4,7 +4,8 @@ Handle puzzle creation and utils.
 
 import copy
 import math
-import random
+
+import numpy
 
 PUZZLE_LABEL_CORRECT = [1, 0]
 PUZZLE_LABEL_INCORRECT = [0, 1]
@@ -12,21 +13,105 @@ PUZZLE_LABEL_INCORRECT = [0, 1]
 PUZZLE_CORRUPTION_MAX = 10
 
 PUZZLE_NOTE_CORRRECT = 'solved'
+PUZZLE_NOTE_VIOLATIONS = 'violations(%d)'
+PUZZLE_NOTE_SWAP = 'swap(%d)'
+PUZZLE_NOTE_REPLACE = 'replace(%d)'
+
+class ConstraintTracker(object):
+    '''
+    Keep per-row, per-column, and per-block label counts for a puzzle grid.
+    Swaps and replacements made through the tracker update the counts (and the grid) in O(1),
+    so validity and the number of violated constraints can be checked without rescanning the grid.
+    A violation is a duplicate label within a row, column, or block
+    (a unit where a label appears k times contributes k - 1 violations).
+    '''
+
+    # cellLabels: [[label, ...], ...] (modified in-place).
+    def __init__(self, cellLabels):
+        self._cellLabels = cellLabels
+        self._dimension = len(cellLabels)
+        self._blockSize = int(math.sqrt(self._dimension))
+
+        # [unitIndex][label] -> count.
+        self._rowCounts = [{} for _ in range(self._dimension)]
+        self._colCounts = [{} for _ in range(self._dimension)]
+        self._blockCounts = [{} for _ in range(self._dimension)]
+
+        self._violations = 0
+
+        for row in range(self._dimension):
+            for col in range(self._dimension):
+                self._add(row, col, cellLabels[row][col])
+
+    def isValid(self):
+        return self._violations == 0
+
+    def numViolations(self):
+        return self._violations
+
+    def swap(self, row1, col1, row2, col2):
+        label1 = self._cellLabels[row1][col1]
+        label2 = self._cellLabels[row2][col2]
+
+        self._remove(row1, col1, label1)
+        self._remove(row2, col2, label2)
+        self._add(row1, col1, label2)
+        self._add(row2, col2, label1)
 
-def generatePuzzle(dimension, labels, exampleChooser):
+        self._cellLabels[row1][col1] = label2
+        self._cellLabels[row2][col2] = label1
+
+    def replace(self, row, col, newLabel):
+        self._remove(row, col, self._cellLabels[row][col])
+        self._add(row, col, newLabel)
+
+        self._cellLabels[row][col] = newLabel
+
+    def _units(self, row, col):
+        block = (row // self._blockSize) * self._blockSize + (col // self._blockSize)
+        return (self._rowCounts[row], self._colCounts[col], self._blockCounts[block])
+
+    def _add(self, row, col, label):
+        for counts in self._units(row, col):
+            count = counts.get(label, 0)
+            if (count >= 1):
+                self._violations += 1
+
+            counts[label] = count + 1
+
+    def _remove(self, row, col, label):
+        for counts in self._units(row, col):
+            count = counts[label]
+            if (count >= 2):
+                self._violations -= 1
+
+            counts[label] = count - 1
+
+def generatePuzzle(dimension, labels, exampleChooser, rng = None, gridBank = None):
     """
     Generate a valid puzzle and return the visual (pixel) and label representation for it.
+    All randomness comes from rng (a numpy.random.Generator, unseeded if not supplied).
+    If a grid bank (gridbank.GridBank) is supplied (and can sample grids for these labels),
+    then the grid is sampled from it (with no retries) instead of being built cell by cell.
     """
 
+    if (rng is None):
+        rng = numpy.random.default_rng()
+
+    if (gridBank is not None and gridBank.canSample(labels)):
+        puzzleCellLabels = gridBank.sampleGrid(labels, rng)
+        puzzleImages = [[exampleChooser.takeExample(label, rng) for label in row] for row in puzzleCellLabels]
+        return puzzleImages, puzzleCellLabels
+
     puzzleImages = None
     puzzleCellLabels = None
 
     while (puzzleImages is None):
-        puzzleImages, puzzleCellLabels = _generatePuzzle(dimension, labels, exampleChooser)
+        puzzleImages, puzzleCellLabels = _generatePuzzle(dimension, labels, exampleChooser, rng)
 
     return puzzleImages, puzzleCellLabels
 
-def _generatePuzzle(dimension, labels, exampleChooser):
+def _generatePuzzle(dimension, labels, exampleChooser, rng):
     """
     Generate a puzzle, but return (None, None) on failure.
     Failure can be encountered because this does not backtrack.
@@ -43,13 +128,16 @@ def _generatePuzzle(dimension, labels, exampleChooser):
 
     blockSize = int(math.sqrt(dimension))
 
+    # Each cell takes the label at a uniform position among its remaining options.
+    choices = rng.random((dimension, dimension)).tolist()
+
     for row in range(dimension):
         for col in range(dimension):
             if (len(options[row][col]) == 0):
                 # Failed to create a puzzle, try again.
                 return None, None
 
-            label = random.choice(options[row][col])
+            label = options[row][col][int(choices[row][col] * len(options[row][col]))]
             options[row][col].clear()
 
             puzzleCellLabels[row][col] = label
@@ -73,7 +161,7 @@ def _generatePuzzle(dimension, labels, exampleChooser):
     # Once we have a complete puzzle, choose the examples.
     for row in range(dimension):
         for col in range(dimension):
-            puzzleImages[row][col] = exampleChooser.takeExample(puzzleCellLabels[row][col])
+            puzzleImages[row][col] = exampleChooser.takeExample(puzzleCellLabels[row][col], rng)
 
     return puzzleImages, puzzleCellLabels
 
@@ -131,79 +219,115 @@ def checkPuzzle(puzzleCellLabels):
 
     return True
 
-def corruptPuzzle(dimension, labels, exampleChooser, originalImages, originalCellLabels, corruptionChance):
+def corruptPuzzle(dimension, labels, exampleChooser, originalImages, originalCellLabels, corruptionChance, rng = None, hard = False):
     """
     Take in a valid puzzle and return a copy that is corrupted.
+    Also returns the number of constraint violations in the corrupted puzzle (see ConstraintTracker).
+    All randomness comes from rng (a numpy.random.Generator, unseeded if not supplied).
+    If hard, then replacements are drawn from the most confusable labels and examples (see corruptPuzzleByReplacement()).
     """
 
-    corruptMethod = random.randrange(2)
+    if (rng is None):
+        rng = numpy.random.default_rng()
+
+    corruptMethod = int(rng.integers(2))
 
-    corruptCellLabels = None
-    while (corruptCellLabels is None or checkPuzzle(corruptCellLabels)):
+    tracker = None
+    while (tracker is None or tracker.isValid()):
         corruptImages = copy.deepcopy(originalImages)
         corruptCellLabels = copy.deepcopy(originalCellLabels)
+        tracker = ConstraintTracker(corruptCellLabels)
 
         if (corruptMethod):
-            corruptImages, corruptCellLabels, corruptNote = corruptPuzzleByReplacement(dimension, labels, exampleChooser, corruptImages, corruptCellLabels, corruptionChance)
+            corruptImages, corruptCellLabels, corruptNote = corruptPuzzleByReplacement(dimension, labels, exampleChooser, corruptImages, corruptCellLabels, corruptionChance, tracker = tracker, rng = rng, hard = hard)
         else:
-            corruptImages, corruptCellLabels, corruptNote = corruptPuzzleBySwap(dimension, labels, exampleChooser, corruptImages, corruptCellLabels, corruptionChance)
+            corruptImages, corruptCellLabels, corruptNote = corruptPuzzleBySwap(dimension, labels, exampleChooser, corruptImages, corruptCellLabels, corruptionChance, tracker = tracker, rng = rng)
 
-    return corruptImages, corruptCellLabels, corruptNote
+    return corruptImages, corruptCellLabels, corruptNote, tracker.numViolations()
 
-def corruptPuzzleBySwap(dimension, labels, exampleChooser, corruptImages, corruptCellLabels, corruptionChance):
+def corruptPuzzleBySwap(dimension, labels, exampleChooser, corruptImages, corruptCellLabels, corruptionChance, tracker = None, rng = None):
     """
     Corrupt a puzzle by swaping cells from the same puzzle.
+    If a tracker (for corruptCellLabels) is supplied, it will be kept up-to-date.
     """
 
-    count = 0
-    seenLocations = set()
-    maxSwaps = min(PUZZLE_CORRUPTION_MAX, dimension ** 2 // 2)
+    if (tracker is None):
+        tracker = ConstraintTracker(corruptCellLabels)
 
-    while ((count < maxSwaps) and (count == 0 or random.random() < corruptionChance)):
-        count += 1
+    if (rng is None):
+        rng = numpy.random.default_rng()
 
-        row1, col1 = randCell(dimension, seenLocations)
-        seenLocations.add((row1, col1))
+    maxSwaps = min(PUZZLE_CORRUPTION_MAX, dimension ** 2 // 2)
+    count = corruptionCount(maxSwaps, corruptionChance, rng)
 
-        row2, col2 = randCell(dimension, seenLocations)
-        seenLocations.add((row2, col2))
+    # Every swap uses two cells that have not been used yet.
+    cells = randCells(dimension, 2 * count, rng)
+
+    for i in range(count):
+        row1, col1 = cells[2 * i]
+        row2, col2 = cells[(2 * i) + 1]
 
         corruptImages[row1][col1], corruptImages[row2][col2] = corruptImages[row2][col2], corruptImages[row1][col1]
-        corruptCellLabels[row1][col1], corruptCellLabels[row2][col2] = corruptCellLabels[row2][col2], corruptCellLabels[row1][col1]
+        tracker.swap(row1, col1, row2, col2)
 
-    return corruptImages, corruptCellLabels, "swap(%d)" % (count)
+    return corruptImages, corruptCellLabels, PUZZLE_NOTE_SWAP % (count)
 
-def corruptPuzzleByReplacement(dimension, labels, exampleChooser, corruptImages, corruptCellLabels, corruptionChance):
+def corruptPuzzleByReplacement(dimension, labels, exampleChooser, corruptImages, corruptCellLabels, corruptionChance, tracker = None, rng = None, hard = False):
     """
     Corrupt a puzzle by replacing single cells at a time.
+    If a tracker (for corruptCellLabels) is supplied, it will be kept up-to-date.
+    If hard, then each replacement comes from exampleChooser.getConfusableExample()
+    (one of the puzzle's labels that is most confusable with the replaced one, and one of its examples that looks most like it)
+    instead of a uniformly chosen label and example.
     """
 
-    count = 0
-    seenLocations = set()
+    if (tracker is None):
+        tracker = ConstraintTracker(corruptCellLabels)
+
+    if (rng is None):
+        rng = numpy.random.default_rng()
+
+    labels = list(labels)
+
     maxReplacements = min(PUZZLE_CORRUPTION_MAX, dimension ** 2)
+    count = corruptionCount(maxReplacements, corruptionChance, rng)
 
-    while ((count < maxReplacements) and (count == 0 or random.random() < corruptionChance)):
-        count += 1
+    cells = randCells(dimension, count, rng)
 
-        corruptRow, corruptCol = randCell(dimension, seenLocations)
-        seenLocations.add((corruptRow, corruptCol))
+    # Replacement labels are drawn from every label except the current one.
+    newLabelIndexes = rng.integers(len(labels) - 1, size = count).tolist()
+
+    for i in range(count):
+        corruptRow, corruptCol = cells[i]
 
         oldLabel = corruptCellLabels[corruptRow][corruptCol]
-        newLabel = oldLabel
-        while (oldLabel == newLabel):
-            newLabel = random.choice(labels)
 
-        corruptImages[corruptRow][corruptCol] = exampleChooser.getExample(newLabel)
-        corruptCellLabels[corruptRow][corruptCol] = newLabel
+        if (hard):
+            newLabel, corruptImages[corruptRow][corruptCol] = exampleChooser.getConfusableExample(oldLabel, labels, rng)
+        else:
+            newLabelIndex = newLabelIndexes[i]
+            if (newLabelIndex >= labels.index(oldLabel)):
+                newLabelIndex += 1
+            newLabel = labels[newLabelIndex]
+
+            corruptImages[corruptRow][corruptCol] = exampleChooser.getExample(newLabel, rng)
 
-    return corruptImages, corruptCellLabels, "replace(%d)" % (count)
+        tracker.replace(corruptRow, corruptCol, newLabel)
 
-def randCell(dimension, skipLocations = set()):
-    row = None
-    col = None
+    return corruptImages, corruptCellLabels, PUZZLE_NOTE_REPLACE % (count)
 
-    while (row is None or (row, col) in skipLocations):
-        row = random.randrange(0, dimension)
-        col = random.randrange(0, dimension)
+def corruptionCount(maxCount, corruptionChance, rng):
+    """
+    The number of corruptions to make: always one, and then another with corruptionChance each time (up to maxCount).
+    So the count is geometric (with a success chance of 1 - corruptionChance), and is drawn in one go.
+    """
+
+    return min(maxCount, int(rng.geometric(1.0 - corruptionChance)))
+
+def randCells(dimension, count, rng):
+    """
+    Choose count distinct cells (uniformly, without replacement).
+    Returns: [(row, col), ...].
+    """
 
-    return row, col
+    return [divmod(cell, dimension) for cell in rng.choice(dimension ** 2, size = count, replace = False).tolist()]
@@ -0,0 +1,145 @@
+'''
+Stream freshly generated puzzles (e.g. for training) without writing anything to disk.
+'''
+
+import argparse
+import math
+
+import numpy
+
+import datasets
+import splits
+import strategies
+import util
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_CORRUPT_CHANCE = 0.5
+DEFAULT_NUM_PUZZLES = 100
+DEFAULT_PREFETCH = 2
+
+class PuzzleStream(object):
+    '''
+    An iterable over batches of generated puzzles: (images, cellLabels, puzzleLabels).
+        images: float32 [batchSize, dimension ** 2, MNIST_DIMENSION ** 2]
+        cellLabels: int [batchSize, dimension ** 2] (indexes into self.labels)
+        puzzleLabels: int [batchSize, 2] (PUZZLE_LABEL_CORRECT or PUZZLE_LABEL_INCORRECT)
+
+    Puzzles are generated with the same strategies as generate-split.py.
+    The examples for each partition are reserved the same way as a split (see datasets.fetchData),
+    but are drawn with replacement so the stream never runs out.
+    The labels each partition draws from (see strategies.BaseStrategy.chooseSplitLabels()) are chosen once for the stream
+    and kept in self.partitionLabels (train, test, and valid), so streams with the same seed share them
+    (e.g. a transfer train stream never emits a label of the test stream, and r_split keeps the same labels for every batch).
+    Each batch is then generated as its own small split (of shuffled correct/corrupted pairs) over those labels.
+
+    If an augmenter (augment.Augmenter) is supplied, then every batch is augmented (also deterministically for the seed).
+    If a grid bank (gridbank.GridBank) is supplied, then grids are sampled from it (see strategies.BaseStrategy.planSplit()).
+    If hardCorruption, then corruptions use the most confusable labels and examples (see strategies.BaseStrategy.planSplit()).
+
+    With numBatches set, iteration stops after that many batches (otherwise the stream is unbounded).
+    Every iteration over the stream produces the same batches for the same seed.
+    All randomness comes from numpy.random.Generators seeded from the seed,
+    so generation (on the prefetch thread if prefetch > 0) neither uses nor disturbs any global random state.
+    '''
+
+    def __init__(self, dimension, datasetNames, strategy,
+            partition = 'train', batchSize = DEFAULT_BATCH_SIZE, numBatches = None,
+            corruptChance = DEFAULT_CORRUPT_CHANCE, overlapPercent = 0.0,
+            numTrain = DEFAULT_NUM_PUZZLES, numTest = DEFAULT_NUM_PUZZLES, numValid = DEFAULT_NUM_PUZZLES,
+            seed = None, prefetch = DEFAULT_PREFETCH, banks = None, augmenter = None, gridBank = None, hardCorruption = False):
+        banks = banks or {}
+
+        if (partition not in splits.PARTITIONS):
+            raise ValueError("Unknown partition '%s'. Known partitions: [%s]." % (partition, ', '.join(splits.PARTITIONS)))
+
+        if (batchSize < 1):
+            raise ValueError("Batch size must be >= 1, got: %d." % (batchSize))
+
+        if (isinstance(strategy, str)):
+            strategy = strategies.getStrategy(strategy)
+
+        strategy.validate(argparse.Namespace(dimension = dimension, datasetNames = datasetNames))
+
+        if (seed is None):
+            seed = int(numpy.random.default_rng().integers(2 ** 32))
+
+        self.dimension = dimension
+        self.strategy = strategy
+        self.partition = partition
+        self.batchSize = batchSize
+        self.numBatches = numBatches
+        self.corruptChance = corruptChance
+        self.seed = seed
+        self.prefetch = prefetch
+        self.augmenter = augmenter
+        self.gridBank = gridBank
+        self.hardCorruption = hardCorruption
+
+        rng = numpy.random.default_rng(seed)
+
+        self._data = {}
+        for datasetName in datasetNames:
+            labels, trainExamples, testExamples, validExamples = datasets.fetchData(dimension, datasetName, overlapPercent, numTrain, numTest, numValid,
+                    bank = banks.get(datasetName), rng = rng)
+            self._data[datasetName] = {
+                'labels': labels,
+                'train': datasets.ExampleChooser(trainExamples._examples, replacement = True),
+                'test': datasets.ExampleChooser(testExamples._examples, replacement = True),
+                'valid': datasets.ExampleChooser(validExamples._examples, replacement = True),
+            }
+
+        # Plans index into the (merged) labels and examples of the data.
+        # They are merged once, so every batch plans from the same examples (and confusion indexes, for hard corruptions).
+        self._mergedData = strategy._mergeDatasets(self._data)
+        self.labels = self._mergedData[0]
+        self._examples = self._mergedData[1 + splits.PARTITIONS.index(partition)]
+
+        self.partitionLabels = strategy.chooseSplitLabels(dimension, self._data, rng)
+
+        # Every iteration starts from the same state.
+        self._randomState = rng.bit_generator.state
+
+    def __len__(self):
+        if (self.numBatches is None):
+            raise TypeError("An unbounded %s has no length." % (type(self).__name__))
+
+        return self.numBatches
+
+    def __iter__(self):
+        if (self.prefetch <= 0):
+            return self._generateBatches()
+
+        return util.prefetch(self._generateBatches(), self.prefetch)
+
+    def _generateBatches(self):
+        rng = numpy.random.default_rng()
+        rng.bit_generator.state = self._randomState
+
+        numPairs = int(math.ceil(self.batchSize / 2))
+
+        # Some strategies choose test/valid labels from the ones seen in train,
+        # so train is always generated.
+        counts = [numPairs, 0, 0]
+        counts[splits.PARTITIONS.index(self.partition)] = numPairs
+
+        augmentRng = numpy.random.default_rng(rng.integers(2 ** 63))
+
+        count = 0
+        while (self.numBatches is None or count < self.numBatches):
+            plan = self.strategy.planSplit(self.dimension, self._data, self.corruptChance, *counts, rng = rng, gridBank = self.gridBank,
+                    hardCorruption = self.hardCorruption, mergedData = self._mergedData, partitionLabels = self.partitionLabels)
+            yield self._toBatch(plan['partitions'][self.partition], rng, augmentRng)
+            count += 1
+
+    def _toBatch(self, partitionPlan, rng, augmentRng):
+        indexes = rng.choice(len(partitionPlan['puzzleLabels']), size = self.batchSize, replace = False)
+
+        numCells = self.dimension ** 2
+        images = strategies.gatherImages(self._examples, partitionPlan['examples'][indexes],
+                augmenter = self.augmenter, rng = augmentRng).astype(numpy.float32)
+        images = images.reshape((self.batchSize, numCells, datasets.MNIST_DIMENSION ** 2))
+
+        cellLabels = partitionPlan['cellLabels'][indexes].reshape((self.batchSize, numCells))
+        puzzleLabels = partitionPlan['puzzleLabels'][indexes]
+
+        return images, cellLabels, puzzleLabels
@@ -0,0 +1,134 @@
+'''
+Score whole splits of puzzles from cell predictions (e.g. the output of a cell classifier).
+Everything is vectorized over puzzles, so a split is scored in a few numpy passes.
+
+Cell predictions are class probabilities: float [numPuzzles, dimension, dimension, numLabels]
+(or [numPuzzles, dimension ** 2, numLabels], the layout splits.SplitLoader gives).
+Like puzzles.ConstraintTracker, a violation is a duplicate label in a row, column, or block
+(a unit where a label appears k times contributes k - 1 violations).
+'''
+
+import math
+
+import numpy
+
+import puzzles
+import splits
+
+def unitCounts(cellValues):
+    '''
+    Sum cell values over every row, column, and block.
+
+    Args:
+        cellValues: [numPuzzles, dimension, dimension, numLabels] (probabilities or one-hot labels).
+
+    Returns:
+        [numPuzzles, 3 * dimension, numLabels]: the row sums, then the column sums, then the block sums.
+    '''
+
+    (numPuzzles, dimension, _, numLabels) = cellValues.shape
+    blockSize = int(math.sqrt(dimension))
+
+    rowCounts = cellValues.sum(axis = 2)
+    colCounts = cellValues.sum(axis = 1)
+    blockCounts = cellValues.reshape((numPuzzles, blockSize, blockSize, blockSize, blockSize, numLabels)).sum(axis = (2, 4))
+    blockCounts = blockCounts.reshape((numPuzzles, dimension, numLabels))
+
+    return numpy.concatenate((rowCounts, colCounts, blockCounts), axis = 1)
+
+def countViolations(cellLabels, numLabels = None):
+    '''
+    Count the violations in hard-labeled puzzles.
+
+    Args:
+        cellLabels: int [numPuzzles, dimension, dimension] or [numPuzzles, dimension ** 2] (label indexes).
+
+    Returns:
+        int [numPuzzles].
+    '''
+
+    cellLabels = _toGrid(numpy.asarray(cellLabels)[..., numpy.newaxis])[..., 0]
+
+    if (numLabels is None):
+        numLabels = int(cellLabels.max()) + 1
+
+    oneHot = (cellLabels[..., numpy.newaxis] == numpy.arange(numLabels)).astype(numpy.int32)
+    counts = unitCounts(oneHot)
+
+    return numpy.maximum(counts - 1, 0).sum(axis = (1, 2))
+
+def softViolations(cellProbabilities):
+    '''
+    The expected-count relaxation of countViolations():
+    the amount by which the expected count of each label in each unit exceeds one.
+
+    Returns:
+        float [numPuzzles].
+    '''
+
+    counts = unitCounts(_toGrid(cellProbabilities))
+    return numpy.maximum(counts - 1.0, 0.0).sum(axis = (1, 2))
+
+def maxViolations(dimension):
+    '''
+    The most violations a puzzle can have (every cell with the same label).
+    '''
+
+    return 3 * dimension * (dimension - 1)
+
+def scorePuzzles(cellProbabilities, puzzleLabels = None):
+    '''
+    Score puzzles by how well their predicted cells satisfy the Sudoku constraints.
+
+    Args:
+        cellProbabilities: float [numPuzzles, dimension, dimension, numLabels] or [numPuzzles, dimension ** 2, numLabels].
+        puzzleLabels: (optional) the true puzzle labels, int [numPuzzles, 2].
+
+    Returns:
+        {
+            'hardViolations': int [numPuzzles] (violations of the most likely labels),
+            'hardScores': float [numPuzzles] (1 - hardViolations / maxViolations),
+            'softScores': float [numPuzzles] (1 - softViolations / maxViolations),
+            'predictions': int [numPuzzles, 2] (PUZZLE_LABEL_CORRECT iff there are no hard violations),
+            'accuracy': float (only if puzzleLabels are supplied),
+        }
+    '''
+
+    cellProbabilities = _toGrid(numpy.asarray(cellProbabilities))
+    (numPuzzles, dimension, _, numLabels) = cellProbabilities.shape
+
+    hardViolations = countViolations(cellProbabilities.argmax(axis = 3), numLabels = numLabels)
+
+    predictions = numpy.where((hardViolations == 0)[:, numpy.newaxis],
+            numpy.array(puzzles.PUZZLE_LABEL_CORRECT), numpy.array(puzzles.PUZZLE_LABEL_INCORRECT))
+
+    scores = {
+        'hardViolations': hardViolations,
+        'hardScores': 1.0 - (hardViolations / maxViolations(dimension)),
+        'softScores': 1.0 - (softViolations(cellProbabilities) / maxViolations(dimension)),
+        'predictions': predictions,
+    }
+
+    if (puzzleLabels is not None):
+        puzzleLabels = numpy.asarray(puzzleLabels)
+        scores['accuracy'] = float(numpy.mean(predictions.argmax(axis = 1) == puzzleLabels.argmax(axis = 1)))
+
+    return scores
+
+def scoreSplit(cellProbabilities, splitDir, partition):
+    '''
+    Score predictions for every puzzle (in file order) of one partition of a split directory.
+    '''
+
+    return scorePuzzles(cellProbabilities, splits.readPuzzleLabels(splitDir, partition))
+
+def _toGrid(cellValues):
+    '''
+    Reshape [numPuzzles, dimension ** 2, numLabels] to [numPuzzles, dimension, dimension, numLabels].
+    '''
+
+    if (cellValues.ndim == 4):
+        return cellValues
+
+    dimension = int(round(math.sqrt(cellValues.shape[1])))
+    return cellValues.reshape((cellValues.shape[0], dimension, dimension, cellValues.shape[2]))
@@ -7,13 +7,16 @@ import os
 import re
 
 import matplotlib.pyplot
+import numpy
 
 import datasets
+import splits
+import textio
 
 def readPuzzle(path, index):
     count = 0
 
-    with open(path, 'r') as file:
+    with textio.openRead(path) as file:
         for line in file:
             line = line.strip()
             if (line == ''):
@@ -38,26 +41,25 @@ def main(arguments):
 
     imageDimension = datasets.MNIST_DIMENSION * dimension
 
-    pixels = readPuzzle(arguments.path, arguments.index)
+    layout = arguments.layout
+    if (layout is None):
+        layout = splits.LAYOUT_CELL_MAJOR
 
-    puzzle = [[None] * imageDimension for _ in range(imageDimension)]
+        splitDir = os.path.dirname(arguments.path)
+        if (os.path.isfile(os.path.join(splitDir, splits.OPTIONS_FILENAME))):
+            layout = splits.getLayout(splits.loadOptions(splitDir))
 
-    # Map the pixels as a list back to a grid.
-    # Note that the list version is stored one image at a time.
-    for puzzleRow in range(dimension):
-        for puzzleCol in range(dimension):
-            puzzleIndex = (puzzleRow * dimension) + puzzleCol
-
-            for cellRow in range(datasets.MNIST_DIMENSION):
-                for cellCol in range(datasets.MNIST_DIMENSION):
-                    cellIndex = (cellRow * datasets.MNIST_DIMENSION) + cellCol
-
-                    pixelIndex = (puzzleIndex * (datasets.MNIST_DIMENSION ** 2)) + cellIndex
+    splitDir, filename = os.path.split(arguments.path)
+    partition = filename.split('_')[0]
 
-                    pixelRow = (puzzleRow * datasets.MNIST_DIMENSION) + cellRow
-                    pixelCol = (puzzleCol * datasets.MNIST_DIMENSION) + cellCol
+    if (splits.hasDeltas(splitDir, partition)):
+        # Puzzles stored as deltas are not a line of their own, so the reader has to rebuild them.
+        pixels = splits.TextPixelReader(splitDir, partition, dimension, layout).read([arguments.index], dtype = numpy.float64)[0]
+    else:
+        pixels = numpy.array(readPuzzle(arguments.path, arguments.index))
 
-                    puzzle[pixelRow][pixelCol] = pixels[pixelIndex]
+    # Map the pixels as a list back to a grid.
+    puzzle = splits.viewPixels(pixels.reshape((1, -1)), dimension, layout, splits.LAYOUT_GRID).reshape((imageDimension, imageDimension))
 
     matplotlib.pyplot.imshow(puzzle, cmap = 'gray_r')
     matplotlib.pyplot.axis('off')
@@ -83,6 +85,11 @@ def _load_args():
         action = 'store', type = int, default = 0,
         help = 'The index of the puzzle to visualize.')
 
+    parser.add_argument('--layout', dest = 'layout',
+        action = 'store', type = str, default = None,
+        choices = splits.LAYOUTS,
+        help = 'The layout of the pixels. If not specified, it will be read from the split\'s options (or assumed to be %s).' % (splits.LAYOUT_CELL_MAJOR))
+
     parser.add_argument('--no-show', dest = 'show',
         action = 'store_false', default = True,
         help = "Don't pop a window up showing the puzzle.")
@@ -0,0 +1,63 @@
+'''
+The protocol between generate-daemon.py (a long-lived generation server) and generate-client.py.
+
+A client connects to the daemon's Unix domain socket and sends a single request (one line of JSON):
+    {"args": [generate-split.py argument, ...], "cwd": the client's working directory}
+The daemon runs the request like a call to generate-split.py with those arguments (relative paths are relative to cwd),
+and replies with a single line of JSON:
+    {"exitCode": the exit code generate-split.py would have had, "output": what it printed to stdout, "errors": what it printed to stderr}
+
+This module is kept light (no numpy or datasets), so clients start quickly.
+'''
+
+import json
+import os
+import socket
+import tempfile
+
+# One daemon per user by default.
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'generate-split-%d.sock' % (os.getuid()))
+
+ENCODING = 'utf-8'
+
+KEY_ARGS = 'args'
+KEY_CWD = 'cwd'
+KEY_ERRORS = 'errors'
+KEY_EXIT_CODE = 'exitCode'
+KEY_OUTPUT = 'output'
+
+def request(socketPath, args, cwd = None):
+    '''
+    Send a generation request to a daemon and wait for it to finish.
+    Returns: (exit code, output, errors).
+    '''
+
+    if (cwd is None):
+        cwd = os.getcwd()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socketPath)
+
+        with connection.makefile('rwb') as stream:
+            writeMessage(stream, {KEY_ARGS: list(args), KEY_CWD: cwd})
+            response = readMessage(stream)
+
+    if (response is None):
+        raise ConnectionError("Daemon at %s closed the connection without a response." % (socketPath))
+
+    return response[KEY_EXIT_CODE], response[KEY_OUTPUT], response[KEY_ERRORS]
+
+def readMessage(stream):
+    '''
+    Returns: the next message on a (binary) stream, or None if the stream is closed.
+    '''
+
+    line = stream.readline()
+    if (len(line) == 0):
+        return None
+
+    return json.loads(line.decode(ENCODING))
+
+def writeMessage(stream, message):
+    stream.write((json.dumps(message) + "\n").encode(ENCODING))
+    stream.flush()
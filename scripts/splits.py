@@ -0,0 +1,681 @@
+'''
+Handle the layout of split directories and reading splits back in.
+'''
+
+import hashlib
+import json
+import math
+import os
+
+import numpy
+
+import datasets
+import gridbank
+import puzzles
+import textio
+import util
+
+SUBPATH_FORMAT = os.path.join('dimension::{:01d}', 'datasets::{:s}', 'strategy::{:s}',
+        'numTrain::{:05d}', 'numTest::{:05d}', 'numValid::{:05d}',
+        'corruptChance::{:04.2f}', 'overlap::{:04.2f}', 'split::{:s}')
+
+# Label-only splits (see generate-split.py --labels-only) live next to the full split of the same options, never in its place.
+LABELS_ONLY_SUBPATH_FORMAT = os.path.join(os.path.dirname(SUBPATH_FORMAT), 'labelsOnly::{:s}')
+
+OPTIONS_FILENAME = 'options.json'
+
+CELL_LABELS_FILENAME = 'cell_labels.txt'
+PUZZLE_PIXELS_FILENAME = 'puzzle_pixels.txt'
+PUZZLE_LABELS_FILENAME = 'puzzle_labels.txt'
+PUZZLE_NOTES_FILENAME = 'puzzle_notes.txt'
+
+FILENAMES = [PUZZLE_PIXELS_FILENAME, CELL_LABELS_FILENAME, PUZZLE_LABELS_FILENAME, PUZZLE_NOTES_FILENAME]
+
+# Puzzles can be stored as deltas against a twin (e.g. a corrupted puzzle against its correct puzzle, see writeDeltaPixels()).
+# Then the pixel file only holds the puzzles stored in full (in order),
+# and the deltas file has a line for every puzzle: the index of its twin (NO_TWIN for puzzles stored in full),
+# followed by a (cell, source) pair for every cell that differs from the twin (cells are numbered in row-major order).
+# A source is either a cell of the twin (whose image is reused) or NEW_CELL_IMAGE (the next row of the delta pixels file,
+# which holds a single cell image per row).
+PUZZLE_DELTAS_FILENAME = 'puzzle_deltas.txt'
+PUZZLE_DELTA_PIXELS_FILENAME = 'puzzle_delta_pixels.txt'
+DELTA_FILENAMES = [PUZZLE_DELTAS_FILENAME, PUZZLE_DELTA_PIXELS_FILENAME]
+
+NO_TWIN = -1
+NEW_CELL_IMAGE = -1
+
+# Binary versions of the split files (see convert-splits.py) are numpy arrays with the same basename.
+# Pixels are stored as their original uint8 intensity (see datasets.PIXEL_VALUES),
+# and strings (cell labels and note lines) are stored as (utf-8) bytes.
+BINARY_EXTENSION = '.npy'
+
+# How the pixels of each puzzle are ordered (in a single row).
+# cell-major: every pixel of the first cell (row-major), then every pixel of the next cell, ... (cells in row-major order).
+# grid: every pixel of the whole board as a single (dimension * MNIST_DIMENSION) square image (row-major).
+LAYOUT_CELL_MAJOR = 'cell-major'
+LAYOUT_GRID = 'grid'
+LAYOUTS = [LAYOUT_CELL_MAJOR, LAYOUT_GRID]
+
+PARTITIONS = ['train', 'test', 'valid']
+
+# The option (in options.json) with the number of correct puzzles in each partition.
+PARTITION_SIZE_OPTIONS = {
+    'train': 'numTrain',
+    'test': 'numTest',
+    'valid': 'numValid',
+}
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_PREFETCH = 4
+
+# The text for each possible pixel (indexed by intensity), exactly as util.writeRows() writes it.
+PIXEL_STRINGS = numpy.array([str(value) for value in datasets.PIXEL_VALUES], dtype = object)
+
+# The text for every pair of pixels (indexed by their intensities as a little-endian uint16), followed by a tab.
+PIXEL_PAIR_STRINGS = numpy.array([PIXEL_STRINGS[index & 0xFF] + '\t' + PIXEL_STRINGS[index >> 8] + '\t' for index in range(256 ** 2)], dtype = object)
+
+# The same pairs, followed by a newline (for the last pair of a row).
+PIXEL_PAIR_LINE_STRINGS = numpy.array([string[:-1] + "\n" for string in PIXEL_PAIR_STRINGS.tolist()], dtype = object)
+
+# The bits (of float64 normalized values, see datasets.PIXEL_VALUES) of every pair of pixels, indexed like PIXEL_PAIR_STRINGS.
+PIXEL_PAIR_BITS = datasets.PIXEL_VALUES.view(numpy.uint64)[numpy.stack([numpy.arange(256 ** 2) & 0xFF, numpy.arange(256 ** 2) >> 8], axis = 1)]
+
+# How many rows (puzzles) of pixels to encode as text at a time.
+TEXT_WRITE_BATCH_SIZE = 64
+
+def getSubpath(dimension, datasetNames, strategy, numTrain, numTest, numValid, corruptChance, overlapPercent, split, labelsOnly = False):
+    subpathFormat = SUBPATH_FORMAT
+    if (labelsOnly):
+        subpathFormat = LABELS_ONLY_SUBPATH_FORMAT
+
+    return subpathFormat.format(dimension, ','.join(datasetNames), str(strategy),
+            numTrain, numTest, numValid, corruptChance, overlapPercent, split)
+
+def getSeed(subpath):
+    '''
+    Get a (stable) seed for a split from its subpath, so the same config always generates the same split on any machine.
+    '''
+
+    return int.from_bytes(_hashSubpath(subpath)[0:4], 'big')
+
+def getShard(subpath, numShards):
+    '''
+    Get the (stable) shard in [0, numShards) that a split belongs to.
+    '''
+
+    return int.from_bytes(_hashSubpath(subpath)[4:12], 'big') % numShards
+
+def _hashSubpath(subpath):
+    # Always hash the same form of the path, regardless of the OS.
+    return hashlib.sha256(subpath.replace(os.sep, '/').encode()).digest()
+
+def getPath(splitDir, partition, filename):
+    return os.path.join(splitDir, partition + '_' + filename)
+
+def getBinaryPath(splitDir, partition, filename):
+    return os.path.splitext(getPath(splitDir, partition, filename))[0] + BINARY_EXTENSION
+
+def hasBinary(splitDir, partition):
+    return all([os.path.isfile(getBinaryPath(splitDir, partition, filename)) for filename in getFilenames(splitDir)])
+
+def hasDeltas(splitDir, partition):
+    return os.path.isfile(getPath(splitDir, partition, PUZZLE_DELTAS_FILENAME))
+
+def findSplits(path, includeVirtual = False):
+    '''
+    Find all the split directories (ones with an options file) at or under a path.
+    Virtual splits (see virtualsplits.py) have no files to read, so they are skipped unless asked for.
+    '''
+
+    splitDirs = []
+
+    for (dirpath, dirnames, filenames) in os.walk(path):
+        dirnames.sort()
+        if (OPTIONS_FILENAME not in filenames):
+            continue
+
+        if (not includeVirtual and isVirtual(dirpath)):
+            continue
+
+        splitDirs.append(dirpath)
+
+    return splitDirs
+
+def loadOptions(splitDir):
+    with open(os.path.join(splitDir, OPTIONS_FILENAME), 'r') as file:
+        return json.load(file)
+
+def isVirtual(splitDir):
+    return loadOptions(splitDir).get('virtual', False)
+
+def isLabelsOnly(splitDir):
+    return loadOptions(splitDir).get('labelsOnly', False)
+
+def getFilenames(splitDir):
+    '''
+    Get the files each partition of a split has (label-only splits have no pixels).
+    '''
+
+    if (isLabelsOnly(splitDir)):
+        return [filename for filename in FILENAMES if (filename != PUZZLE_PIXELS_FILENAME)]
+
+    return FILENAMES
+
+def getLabels(options):
+    '''
+    Get all the cell labels that a split could use (sorted, so the same datasets always give the same indexes).
+    '''
+
+    return list(sorted(set([label for datasetName in options['datasets'] for label in datasets.getLabels(datasetName)])))
+
+def getLayout(options):
+    # Splits from before layouts were an option are all cell-major.
+    return options.get('layout', LAYOUT_CELL_MAJOR)
+
+def viewPixels(pixels, dimension, layout, outLayout = LAYOUT_CELL_MAJOR):
+    '''
+    View pixel rows ([numPuzzles, (dimension * MNIST_DIMENSION) ** 2], stored in layout) in another layout without copying.
+    The view is a strided reshape/transpose of the rows:
+        cell-major: [numPuzzles, dimension (cell row), dimension (cell col), MNIST_DIMENSION (pixel row), MNIST_DIMENSION (pixel col)]
+        grid: [numPuzzles, dimension (cell row), MNIST_DIMENSION (pixel row), dimension (cell col), MNIST_DIMENSION (pixel col)]
+    Copying the view (e.g. with numpy.ascontiguousarray() or any lookup/arithmetic) gives an array that reshapes
+    (for free) to the images of outLayout (see getImageShape()).
+    '''
+
+    if (layout not in LAYOUTS or outLayout not in LAYOUTS):
+        raise ValueError("Unknown layout. Known layouts: [%s]." % (', '.join(LAYOUTS)))
+
+    numPuzzles = len(pixels)
+    size = datasets.MNIST_DIMENSION
+
+    if (layout == LAYOUT_CELL_MAJOR):
+        cells = pixels.reshape((numPuzzles, dimension, dimension, size, size))
+    else:
+        cells = pixels.reshape((numPuzzles, dimension, size, dimension, size)).transpose((0, 1, 3, 2, 4))
+
+    if (outLayout == LAYOUT_CELL_MAJOR):
+        return cells
+
+    return cells.transpose((0, 1, 3, 2, 4))
+
+def getImageShape(numPuzzles, dimension, layout):
+    '''
+    The shape of a batch of puzzle images:
+        cell-major: [numPuzzles, dimension ** 2, MNIST_DIMENSION ** 2]
+        grid: [numPuzzles, dimension * MNIST_DIMENSION, dimension * MNIST_DIMENSION]
+    '''
+
+    if (layout == LAYOUT_CELL_MAJOR):
+        return (numPuzzles, dimension ** 2, datasets.MNIST_DIMENSION ** 2)
+
+    return (numPuzzles, dimension * datasets.MNIST_DIMENSION, dimension * datasets.MNIST_DIMENSION)
+
+def readPixels(splitDir, partition, layout = LAYOUT_CELL_MAJOR):
+    '''
+    Get all the pixels (as uint8 intensities, see datasets.PIXEL_VALUES) of a binary split as a memory-mapped view in a layout
+    (see viewPixels()), without reading or copying anything.
+    '''
+
+    if (not hasBinary(splitDir, partition)):
+        raise ValueError("Pixels can only be viewed in binary splits (see convert-splits.py): %s (%s)." % (splitDir, partition))
+
+    options = loadOptions(splitDir)
+    pixels = numpy.load(getBinaryPath(splitDir, partition, PUZZLE_PIXELS_FILENAME), mmap_mode = 'r')
+
+    return viewPixels(pixels, options['dimension'], getLayout(options), layout)
+
+def encodePixelRows(intensities):
+    '''
+    Encode rows of pixels (uint8 intensities) as the exact text util.writeRows() writes for their normalized values.
+    Pixels are looked up two at a time in PIXEL_PAIR_STRINGS, and all the rows are joined at once.
+    '''
+
+    intensities = numpy.ascontiguousarray(intensities, dtype = numpy.uint8)
+    if (intensities.size == 0):
+        return "\n" * len(intensities)
+
+    if (intensities.shape[1] % 2 == 0):
+        codes = intensities.view(numpy.dtype('<u2'))
+        (strings, lineStrings) = (PIXEL_PAIR_STRINGS, PIXEL_PAIR_LINE_STRINGS)
+    else:
+        codes = intensities
+        strings = numpy.array([string + '\t' for string in PIXEL_STRINGS.tolist()], dtype = object)
+        lineStrings = numpy.array([string + "\n" for string in PIXEL_STRINGS.tolist()], dtype = object)
+
+    rowStrings = strings[codes]
+    rowStrings[:, -1] = lineStrings[codes[:, -1]]
+
+    return ''.join(rowStrings.ravel().tolist())
+
+def writePixelRows(path, images, batchSize = TEXT_WRITE_BATCH_SIZE, compression = None, compressionLevel = None):
+    '''
+    Write rows of normalized pixels (float [numRows, numPixels]) to a text file.
+    The file is byte-identical to util.writeRows(path, images), but nothing is formatted pixel by pixel.
+
+    Rows that are all (bit for bit) normalized intensities (see datasets.PIXEL_VALUES) are encoded by encodePixelRows(),
+    and any other pixel is formatted the same way util.writeRows() would.
+    The text can be compressed as it is written (see util.writeRows()).
+    '''
+
+    with textio.TextWriter(path, codec = compression, level = compressionLevel) as file:
+        for start in range(0, len(images), batchSize):
+            batch = numpy.asarray(images[start:(start + batchSize)])
+            if (batch.dtype != numpy.float64 or batch.ndim != 2):
+                for row in batch:
+                    file.write('\t'.join([str(item) for item in row]) + "\n")
+                continue
+
+            batch = numpy.ascontiguousarray(batch)
+
+            # Any value is cast to a valid index, and then only the exact values pass.
+            with numpy.errstate(invalid = 'ignore'):
+                intensities = (batch * 255 + 0.5).astype(numpy.uint8)
+            exactPixels = _exactPixels(batch, intensities)
+
+            # Runs of exact rows are encoded together.
+            # In any other row, only the pixels that are not exact are formatted the legacy way.
+            runStart = 0
+            for i in numpy.nonzero(~numpy.all(exactPixels, axis = 1))[0].tolist():
+                file.write(encodePixelRows(intensities[runStart:i]))
+
+                rowStrings = PIXEL_STRINGS[intensities[i]]
+                rowStrings[~exactPixels[i]] = [str(item) for item in batch[i][~exactPixels[i]]]
+                file.write('\t'.join(rowStrings.tolist()) + "\n")
+
+                runStart = i + 1
+
+            file.write(encodePixelRows(intensities[runStart:]))
+
+def _exactPixels(batch, intensities):
+    '''
+    Returns: bool [numRows, numPixels], whether each pixel of batch (contiguous float64) is (bit for bit) the normalized value of its intensity.
+    '''
+
+    bits = batch.view(numpy.uint64)
+    if (batch.shape[1] % 2 != 0):
+        return (datasets.PIXEL_VALUES.view(numpy.uint64)[intensities] == bits)
+
+    # Looking up pairs (like encodePixelRows() does) is much faster than looking up every pixel.
+    pairBits = numpy.take(PIXEL_PAIR_BITS, intensities.view(numpy.dtype('<u2')), axis = 0)
+    return (pairBits.reshape(bits.shape) == bits)
+
+def findTwins(puzzleLabels):
+    '''
+    Pair each incorrect puzzle with the correct puzzle just before it (the correct puzzle it was corrupted from).
+    Returns: the twin of each puzzle (see writeDeltaPixels()).
+    '''
+
+    twins = [NO_TWIN] * len(puzzleLabels)
+    for i in range(1, len(puzzleLabels)):
+        if (list(puzzleLabels[i]) == puzzles.PUZZLE_LABEL_INCORRECT and list(puzzleLabels[i - 1]) == puzzles.PUZZLE_LABEL_CORRECT):
+            twins[i] = i - 1
+
+    return twins
+
+def writeDeltaPixels(splitDir, partition, cells, twins, layout = LAYOUT_CELL_MAJOR, compression = None, compressionLevel = None):
+    '''
+    Write the pixels of puzzles (float [numPuzzles, dimension ** 2, MNIST_DIMENSION ** 2], cell-major)
+    with puzzles stored as deltas against their twins (see PUZZLE_DELTAS_FILENAME).
+    twins holds the index of the twin of each puzzle (which must itself be stored in full), or NO_TWIN.
+    A puzzle that differs from its twin in more than half of its cells (e.g. an augmented copy) is stored in full anyway.
+    Cells are matched bit for bit, so a swapped cell is stored as a reference to the twin's cell (not as a new image).
+    '''
+
+    cells = numpy.ascontiguousarray(cells)
+    (numPuzzles, numCells, _) = cells.shape
+    dimension = math.isqrt(numCells)
+
+    twins = numpy.array(twins, dtype = numpy.int64).reshape(numPuzzles)
+    hasTwin = (twins != NO_TWIN)
+    if (numpy.any(twins[twins[hasTwin]] != NO_TWIN)):
+        raise ValueError("Twins must be stored in full (they cannot have a twin of their own).")
+
+    bits = cells.view(numpy.dtype('u%d' % (cells.itemsize)))
+
+    deltas = []
+    newImages = []
+
+    for puzzle in range(numPuzzles):
+        twin = twins[puzzle]
+        if (twin == NO_TWIN):
+            deltas.append([NO_TWIN])
+            continue
+
+        changedCells = numpy.nonzero(numpy.any(bits[puzzle] != bits[twin], axis = 1))[0]
+        if (len(changedCells) > numCells // 2):
+            twins[puzzle] = NO_TWIN
+            deltas.append([NO_TWIN])
+            continue
+
+        delta = [twin]
+        for cell in changedCells.tolist():
+            sources = numpy.nonzero(numpy.all(bits[twin] == bits[puzzle, cell], axis = 1))[0]
+            if (len(sources) > 0):
+                delta += [cell, int(sources[0])]
+            else:
+                delta += [cell, NEW_CELL_IMAGE]
+                newImages.append(cells[puzzle, cell])
+
+        deltas.append(delta)
+
+    rows = cells[twins == NO_TWIN].reshape((-1, numCells * cells.shape[2]))
+    if (layout != LAYOUT_CELL_MAJOR):
+        rows = viewPixels(rows, dimension, LAYOUT_CELL_MAJOR, layout).reshape((len(rows), -1))
+
+    newImages = numpy.array(newImages, dtype = cells.dtype).reshape((-1, cells.shape[2]))
+
+    writePixelRows(getPath(splitDir, partition, PUZZLE_PIXELS_FILENAME), rows,
+            compression = compression, compressionLevel = compressionLevel)
+    writePixelRows(getPath(splitDir, partition, PUZZLE_DELTA_PIXELS_FILENAME), newImages,
+            compression = compression, compressionLevel = compressionLevel)
+    util.writeRows(getPath(splitDir, partition, PUZZLE_DELTAS_FILENAME), deltas,
+            compression = compression, compressionLevel = compressionLevel)
+
+def readRows(path):
+    rows = []
+
+    with textio.openRead(path) as file:
+        for line in file:
+            line = line.strip()
+            if (line == ''):
+                continue
+
+            rows.append(line.split("\t"))
+
+    return rows
+
+def _readLines(lineIndex, rowIndexes, rowSize, dtype):
+    '''
+    Parse the given rows (of a textio.LineIndex) of a tab-separated text file of numbers.
+    '''
+
+    rows = numpy.empty((len(rowIndexes), rowSize), dtype = dtype)
+
+    for (i, line) in enumerate(lineIndex.read(rowIndexes)):
+        rows[i] = numpy.fromstring(line.decode(), dtype = dtype, sep = '\t')
+
+    return rows
+
+def readDeltas(splitDir, partition):
+    '''
+    Read the deltas of a partition (see PUZZLE_DELTAS_FILENAME).
+    Returns: (int [numPuzzles] twins, [[(cell, source), ...], ...]).
+    '''
+
+    rows = [[int(item) for item in row] for row in readRows(getPath(splitDir, partition, PUZZLE_DELTAS_FILENAME))]
+
+    twins = numpy.array([row[0] for row in rows], dtype = numpy.int64)
+    changes = [list(zip(row[1::2], row[2::2])) for row in rows]
+
+    return twins, changes
+
+class TextPixelReader(object):
+    '''
+    Random access to the pixel rows (in the layout they were written in) of the text version (possibly compressed) of a partition.
+    Puzzles stored as deltas (see writeDeltaPixels()) are rebuilt from their twin, so every puzzle has a row.
+    '''
+
+    def __init__(self, splitDir, partition, dimension, layout = LAYOUT_CELL_MAJOR):
+        self.dimension = dimension
+        self.layout = layout
+
+        self._pixelLines = textio.LineIndex(getPath(splitDir, partition, PUZZLE_PIXELS_FILENAME))
+
+        self._twins = None
+
+        if (hasDeltas(splitDir, partition)):
+            self._deltaPixelLines = textio.LineIndex(getPath(splitDir, partition, PUZZLE_DELTA_PIXELS_FILENAME))
+            self._twins, self._changes = readDeltas(splitDir, partition)
+
+            # The row of each full puzzle in the pixel file, and the first new cell image (if any) of each puzzle.
+            self._fullRows = numpy.cumsum(self._twins == NO_TWIN) - 1
+            numNewImages = [sum([1 for (_, source) in changes if (source == NEW_CELL_IMAGE)]) for changes in self._changes]
+            self._newImageRows = numpy.cumsum([0] + numNewImages)[:-1]
+
+            numFull = int(numpy.sum(self._twins == NO_TWIN))
+            if (numFull != len(self._pixelLines) or sum(numNewImages) != len(self._deltaPixelLines)):
+                raise ValueError("Mismatched deltas in %s (%s). Full puzzles: %d (pixel rows: %d), new cell images: %d (delta pixel rows: %d)." % (
+                        splitDir, partition, numFull, len(self._pixelLines), sum(numNewImages), len(self._deltaPixelLines)))
+
+    def __len__(self):
+        if (self._twins is not None):
+            return len(self._twins)
+
+        return len(self._pixelLines)
+
+    def read(self, indexes, dtype = numpy.float32):
+        '''
+        Returns: the pixel rows of the given puzzles, dtype [len(indexes), (dimension * MNIST_DIMENSION) ** 2].
+        '''
+
+        rowSize = (self.dimension ** 2) * (datasets.MNIST_DIMENSION ** 2)
+
+        if (self._twins is None):
+            return _readLines(self._pixelLines, indexes, rowSize, dtype)
+
+        indexes = numpy.asarray(indexes, dtype = numpy.int64)
+        twins = self._twins[indexes]
+        bases = numpy.where(twins == NO_TWIN, indexes, twins)
+
+        pixels = _readLines(self._pixelLines, self._fullRows[bases], rowSize, dtype)
+
+        deltaRows = numpy.nonzero(twins != NO_TWIN)[0]
+        if (len(deltaRows) == 0):
+            return pixels
+
+        # Copy the cells of the twins first, since a swap reads cells that are also being written.
+        twinCells = viewPixels(pixels[deltaRows], self.dimension, self.layout)
+        cells = viewPixels(pixels, self.dimension, self.layout)
+
+        newImageRows = []
+        for row in deltaRows.tolist():
+            newImageRow = self._newImageRows[indexes[row]]
+            for (_, source) in self._changes[indexes[row]]:
+                if (source == NEW_CELL_IMAGE):
+                    newImageRows.append(newImageRow)
+                    newImageRow += 1
+
+        newImages = _readLines(self._deltaPixelLines, newImageRows, datasets.MNIST_DIMENSION ** 2, dtype)
+        newImages = newImages.reshape((-1, datasets.MNIST_DIMENSION, datasets.MNIST_DIMENSION))
+
+        newImageIndex = 0
+        for (i, row) in enumerate(deltaRows.tolist()):
+            for (cell, source) in self._changes[indexes[row]]:
+                if (source == NEW_CELL_IMAGE):
+                    image = newImages[newImageIndex]
+                    newImageIndex += 1
+                else:
+                    image = twinCells[i, source // self.dimension, source % self.dimension]
+
+                cells[row, cell // self.dimension, cell % self.dimension] = image
+
+        return pixels
+
+def readCellLabels(splitDir, partition, labels):
+    '''
+    Read the cell labels (as an int [numPuzzles, dimension ** 2] array of indexes into labels, see getLabels())
+    from the binary or text version of a split.
+    '''
+
+    if (hasBinary(splitDir, partition)):
+        cellLabels = numpy.load(getBinaryPath(splitDir, partition, CELL_LABELS_FILENAME))
+
+        # labels are sorted (see getLabels()), but a label that is not in them would still be given a (neighbouring) index.
+        sortedLabels = numpy.array(labels).astype(bytes)
+        indexes = numpy.searchsorted(sortedLabels, cellLabels)
+
+        known = (indexes < len(sortedLabels))
+        known[known] = (sortedLabels[indexes[known]] == cellLabels[known])
+        if (not numpy.all(known)):
+            raise KeyError(cellLabels[~known][0].decode())
+
+        return indexes.astype(numpy.int64)
+
+    labelIndexes = {label: index for (index, label) in enumerate(labels)}
+    cellLabels = readRows(getPath(splitDir, partition, CELL_LABELS_FILENAME))
+    return numpy.array([[labelIndexes[label] for label in row] for row in cellLabels], dtype = numpy.int64)
+
+def readPuzzleLabels(splitDir, partition):
+    '''
+    Read the puzzle labels (as an int [numPuzzles, 2] array) from the binary or text version of a split.
+    '''
+
+    if (hasBinary(splitDir, partition)):
+        return numpy.load(getBinaryPath(splitDir, partition, PUZZLE_LABELS_FILENAME)).astype(numpy.int64)
+
+    return numpy.array(readRows(getPath(splitDir, partition, PUZZLE_LABELS_FILENAME)), dtype = numpy.int64)
+
+def readNotes(splitDir, partition):
+    '''
+    Read the puzzle notes (as a list of string lists) from the binary or text version of a split.
+    '''
+
+    if (hasBinary(splitDir, partition)):
+        return [line.decode().split("\t") for line in numpy.load(getBinaryPath(splitDir, partition, PUZZLE_NOTES_FILENAME)).tolist()]
+
+    return readRows(getPath(splitDir, partition, PUZZLE_NOTES_FILENAME))
+
+class SplitLoader(object):
+    '''
+    An iterable over batches of one partition of a split directory: (images, cellLabels, puzzleLabels).
+        images: float32 [batchSize, dimension ** 2, MNIST_DIMENSION ** 2]
+            (or [batchSize, dimension * MNIST_DIMENSION, dimension * MNIST_DIMENSION] for the grid layout)
+        cellLabels: int [batchSize, dimension ** 2] (indexes into self.labels)
+        puzzleLabels: int [batchSize, 2] (PUZZLE_LABEL_CORRECT or PUZZLE_LABEL_INCORRECT)
+
+    Label-only splits (see generate-split.py --labels-only) have no pixels, so their images are always None.
+    Labels are read up front (they are small), but pixels are only indexed (by line, see textio.LineIndex).
+    Pixels are parsed one batch at a time on a background thread (if prefetch > 0),
+    with at most prefetch batches waiting to be used.
+    If the split has been converted to binary (see convert-splits.py), then it is memory-mapped instead of parsed.
+    Puzzles stored as deltas against a twin (see writeDeltaPixels()) are rebuilt as they are parsed.
+    When shuffling, each iteration (epoch) gets a new order (deterministic for a seed).
+    Images are given in the requested layout, whatever layout the split was written in
+    (rearranging is done as part of the single pass that makes the float batch).
+    With symmetries, each puzzle is served under its own random sudoku symmetry (see gridbank.randomCellPermutations()):
+    the cells of the images and cellLabels are permuted together, so puzzle labels still hold
+    (a symmetry maps rows, columns, and blocks onto rows, columns, and blocks).
+    Each epoch gets new symmetries (deterministic for a seed), so a split can serve many more distinct puzzles than it stores.
+    '''
+
+    def __init__(self, splitDir, partition,
+            batchSize = DEFAULT_BATCH_SIZE, shuffle = False, seed = None,
+            prefetch = DEFAULT_PREFETCH, dropLast = False, layout = LAYOUT_CELL_MAJOR, symmetries = False):
+        if (partition not in PARTITIONS):
+            raise ValueError("Unknown partition '%s'. Known partitions: [%s]." % (partition, ', '.join(PARTITIONS)))
+
+        if (layout not in LAYOUTS):
+            raise ValueError("Unknown layout '%s'. Known layouts: [%s]." % (layout, ', '.join(LAYOUTS)))
+
+        if (batchSize < 1):
+            raise ValueError("Batch size must be >= 1, got: %d." % (batchSize))
+
+        self.splitDir = splitDir
+        self.partition = partition
+        self.batchSize = batchSize
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+        self.dropLast = dropLast
+        self.layout = layout
+        self.symmetries = symmetries
+
+        options = loadOptions(splitDir)
+        self.dimension = options['dimension']
+        self.labels = getLabels(options)
+        self._storedLayout = getLayout(options)
+
+        self.labelsOnly = options.get('labelsOnly', False)
+
+        self._pixels = None
+        self._textPixels = None
+
+        self._cellLabels = readCellLabels(splitDir, partition, self.labels)
+        self._puzzleLabels = readPuzzleLabels(splitDir, partition)
+
+        if (self.labelsOnly):
+            numPixelRows = len(self._cellLabels)
+        elif (hasBinary(splitDir, partition)):
+            self._pixels = numpy.load(getBinaryPath(splitDir, partition, PUZZLE_PIXELS_FILENAME), mmap_mode = 'r')
+            numPixelRows = len(self._pixels)
+        else:
+            self._textPixels = TextPixelReader(splitDir, partition, self.dimension, self._storedLayout)
+            numPixelRows = len(self._textPixels)
+
+        if (numPixelRows != len(self._cellLabels) or len(self._puzzleLabels) != len(self._cellLabels)):
+            raise ValueError("Mismatched number of puzzles in %s (%s). Pixels: %d, Cell Labels: %d, Puzzle Labels: %d." % (
+                    splitDir, partition, numPixelRows, len(self._cellLabels), len(self._puzzleLabels)))
+
+        self._rng = numpy.random.default_rng(seed)
+
+    def numPuzzles(self):
+        return len(self._cellLabels)
+
+    def __len__(self):
+        if (self.dropLast):
+            return self.numPuzzles() // self.batchSize
+
+        return int(math.ceil(self.numPuzzles() / self.batchSize))
+
+    def __iter__(self):
+        if (self.shuffle):
+            order = self._rng.permutation(self.numPuzzles())
+        else:
+            order = numpy.arange(self.numPuzzles())
+
+        # Symmetries get their own generator for each epoch, since batches may be read on another thread.
+        symmetryRng = None
+        if (self.symmetries):
+            symmetryRng = numpy.random.default_rng(self._rng.integers(2 ** 63))
+
+        if (self.prefetch <= 0):
+            return self._readBatches(order, symmetryRng)
+
+        return util.prefetch(self._readBatches(order, symmetryRng), self.prefetch)
+
+    def _readBatches(self, order, symmetryRng = None):
+        if (self._pixels is not None):
+            pixelValues = datasets.PIXEL_VALUES.astype(numpy.float32)
+
+        for batchIndex in range(len(self)):
+            indexes = order[(batchIndex * self.batchSize):((batchIndex + 1) * self.batchSize)]
+
+            cellLabels = self._cellLabels[indexes]
+
+            if (self.labelsOnly):
+                if (symmetryRng is not None):
+                    permutations = gridbank.randomCellPermutations(self.dimension, len(indexes), symmetryRng)
+                    cellLabels = numpy.take_along_axis(cellLabels, permutations, axis = 1)
+
+                yield None, cellLabels, self._puzzleLabels[indexes]
+                continue
+
+            if (self._pixels is not None):
+                pixels = self._pixels[indexes]
+            else:
+                pixels = self._textPixels.read(indexes)
+
+            pixelLayout = self._storedLayout
+
+            if (symmetryRng is not None):
+                permutations = gridbank.randomCellPermutations(self.dimension, len(indexes), symmetryRng)
+                pixels = self._permuteCells(pixels, permutations)
+                pixelLayout = LAYOUT_CELL_MAJOR
+                cellLabels = numpy.take_along_axis(cellLabels, permutations, axis = 1)
+
+            if (self._pixels is not None):
+                images = pixelValues[viewPixels(pixels, self.dimension, pixelLayout, self.layout)]
+            else:
+                images = numpy.ascontiguousarray(viewPixels(pixels, self.dimension, pixelLayout, self.layout))
+
+            yield images.reshape(getImageShape(len(indexes), self.dimension, self.layout)), cellLabels, self._puzzleLabels[indexes]
+
+    def _permuteCells(self, pixels, permutations):
+        '''
+        Gather the cells of pixel rows (in the stored layout) into the order given by permutations ([numPuzzles, dimension ** 2]).
+        Returns: pixel rows in the cell-major layout.
+        '''
+
+        cells = viewPixels(pixels, self.dimension, self._storedLayout, LAYOUT_CELL_MAJOR)
+        puzzleIndexes = numpy.arange(len(pixels))[:, numpy.newaxis]
+
+        return cells[puzzleIndexes, permutations // self.dimension, permutations % self.dimension].reshape((len(pixels), -1))
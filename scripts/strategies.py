@@ -3,11 +3,14 @@ Handle the standard variants for dataset generation.
 """
 
 import abc
-import copy
-import random
+
+import numpy
 
 import datasets
+import gridbank
+import labelpuzzles
 import puzzles
+import splits
 
 # Will be added to as the strategies are defined.
 _strategies = []
@@ -22,6 +25,31 @@ def getStrategy(name):
 
     raise ValueError("Unknown strategy '%s'. Known strategies: [%s]." % (name, ", ".join(map(str, _strategies))))
 
+def gatherImages(examples, exampleIndexes, augmenter = None, rng = None):
+    """
+    Gather images (by index) from an ExampleChooser.
+    With an augmenter (augment.Augmenter), each distinct example is augmented once (using rng, a numpy.random.Generator),
+    so a corrupted puzzle keeps the same images as its correct twin.
+
+    Returns:
+        float [exampleIndexes.shape..., MNIST_DIMENSION ** 2]
+    """
+
+    if (augmenter is None or not augmenter.isEnabled()):
+        return examples.getImages()[exampleIndexes]
+
+    uniqueIndexes, inverse = numpy.unique(exampleIndexes, return_inverse = True)
+    images = augmenter.augment(examples.getImages()[uniqueIndexes], rng)
+
+    return images[inverse.reshape(exampleIndexes.shape)]
+
+def _sampleLabels(labels, count, rng):
+    """
+    Choose count distinct labels (uniformly, without replacement, in a random order).
+    """
+
+    return [labels[index] for index in rng.choice(len(labels), size = count, replace = False).tolist()]
+
 class BaseStrategy(abc.ABC):
     """
     Strategies represent the methods we use to generate data for different variants of the dataset.
@@ -29,6 +57,9 @@ class BaseStrategy(abc.ABC):
     Strategies are not thread-safe.
     """
 
+    # Whether test/valid only draw from the labels that were used in train.
+    limitToSeenLabels = False
+
     def __init__(self, name):
         self.name = name
 
@@ -45,74 +76,302 @@ class BaseStrategy(abc.ABC):
         pass
 
     @abc.abstractmethod
-    def generateSplit(self, dimension, data, corruptChance, numTrain, numTest, numValid):
+    def chooseSplitLabels(self, dimension, data, rng):
         """
-        Create a new split using the class' specific strategy.
-        Returns three tuples: train, test, and valid.
-        Each tuple has two elements: visual puzzles, label puzzles.
+        Choose the labels that each partition of a split can draw from (using rng, a numpy.random.Generator).
+        Returns three lists of labels: train, test, and valid.
         """
 
         pass
 
-    def _generateSplit(self, dimension, corruptChance, numTrain, numTest, numValid,
-            labels, trainExamples, testExamples, validExamples):
+    def choosePuzzleLabels(self, dimension, labels, rng):
+        """
+        Choose the labels for a single puzzle from the labels of its partition.
+        """
+
+        return labels
+
+    def choosePuzzleLabelSets(self, dimension, numLabels, count, rng):
         """
-        A common base for generating splits.
+        The vectorized version of choosePuzzleLabels() (see planLabels()), using rng (a numpy.random.Generator).
+        Returns: int [count, numPuzzleLabels] (indexes into the partition's numLabels labels).
         """
 
-        train = {
-            'images': [],
-            'cellLabels': [],
-            'labels': [],
-            'notes': [],
+        return numpy.tile(numpy.arange(numLabels), (count, 1))
+
+    def generateSplit(self, dimension, data, corruptChance, numTrain, numTest, numValid, augmenter = None, gridBank = None, rng = None, hardCorruption = False):
+        """
+        Create a new split using the class' specific strategy.
+        Returns three dicts: train, test, and valid.
+        Each dict has: images (float [numPuzzles, dimension, dimension, MNIST_DIMENSION ** 2]), cellLabels, labels, and notes.
+        All randomness comes from rng (a numpy.random.Generator, unseeded if not supplied).
+        If an augmenter (augment.Augmenter) is supplied, then the gathered images are augmented (with a generator seeded from rng).
+        If a grid bank (gridbank.GridBank) is supplied, then grids are sampled from it (see planSplit()).
+        If hardCorruption, then corruptions replace cells with the most confusable labels and examples (see planSplit()).
+        """
+
+        if (rng is None):
+            rng = numpy.random.default_rng()
+
+        # Both stages use the same merge, so the images of each partition are only stacked once.
+        mergedData = self._mergeDatasets(data)
+
+        plan = self.planSplit(dimension, data, corruptChance, numTrain, numTest, numValid, rng = rng, gridBank = gridBank, hardCorruption = hardCorruption,
+                mergedData = mergedData)
+
+        augmentRng = None
+        if (augmenter is not None):
+            augmentRng = numpy.random.default_rng(rng.integers(2 ** 63))
+
+        return self.gatherSplit(plan, data, augmenter = augmenter, rng = augmentRng, mergedData = mergedData)
+
+    def planSplit(self, dimension, data, corruptChance, numTrain, numTest, numValid, rng = None, gridBank = None, hardCorruption = False,
+            mergedData = None, partitionLabels = None):
+        """
+        Make every decision for a split (labels, grids, corruptions, and examples) without touching any images.
+        The plan is only integers (and notes), so it is cheap to keep, inspect, or cache.
+        All randomness comes from rng (a numpy.random.Generator, unseeded if not supplied).
+        If a grid bank (gridbank.GridBank) is supplied, then the grid for each puzzle that uses exactly |dimension| labels is sampled from it
+        (see puzzles.generatePuzzle()).
+        If hardCorruption, then corruptions that replace cells draw from the labels and examples (of the partition)
+        that are most confusable with the replaced ones (see puzzles.corruptPuzzleByReplacement() and confusion.py).
+        mergedData is the result of _mergeDatasets(data) to plan from (merged once and reused across many plans,
+        so their examples and confusion indexes are only built once, see puzzlestream.PuzzleStream).
+        partitionLabels is the result of chooseSplitLabels() to plan with (chosen once and reused across many plans,
+        so every plan draws from the same labels, see puzzlestream.PuzzleStream).
+
+        Returns:
+            {
+                'dimension': dimension,
+                'labels': [label, ...] (all the labels in data, sorted),
+                'partitions': {
+                    partition: {
+                        'labels': [label, ...] (the labels this partition draws from),
+                        'cellLabels': int [numPuzzles, dimension, dimension] (indexes into plan['labels']),
+                        'examples': int [numPuzzles, dimension, dimension] (indexes into the partition's ExampleChooser.getImages()),
+                        'puzzleLabels': int [numPuzzles, 2],
+                        'notes': [[note, ...], ...],
+                    },
+                    ...
+                },
+            }
+        """
+
+        if (rng is None):
+            rng = numpy.random.default_rng()
+
+        if (mergedData is None):
+            mergedData = self._mergeDatasets(data)
+
+        if (partitionLabels is None):
+            partitionLabels = self.chooseSplitLabels(dimension, data, rng)
+
+        allLabels, trainExamples, testExamples, validExamples = mergedData
+
+        labelIndexes = {label: index for (index, label) in enumerate(allLabels)}
+
+        plan = {
+            'dimension': dimension,
+            'labels': allLabels,
+            'partitions': {},
         }
-        test = copy.deepcopy(train)
-        valid = copy.deepcopy(train)
 
-        splits = [
-            [train, numTrain, trainExamples],
-            [test, numTest, testExamples],
-            [valid, numValid, validExamples],
-        ]
+        # The labels used in train (for strategies that limit test/valid to them).
+        seenLabels = set()
+
+        partitions = zip(splits.PARTITIONS, [numTrain, numTest, numValid], [trainExamples, testExamples, validExamples], partitionLabels)
+        for (partition, count, examples, labels) in partitions:
+            if (self.limitToSeenLabels and partition != splits.PARTITIONS[0]):
+                labels = list(sorted(seenLabels))
+
+            examples = datasets.ExampleIndexChooser(examples)
+
+            cellLabels = []
+            exampleIndexes = []
+            puzzleLabels = []
+            notes = []
+
+            for _ in range(count):
+                puzzleLabelSet = self.choosePuzzleLabels(dimension, labels, rng)
 
-        for (split, count, examples) in splits:
-            for i in range(count):
                 # Generate a correct puzzle.
 
-                puzzleImages, puzzleCellLabels = puzzles.generatePuzzle(dimension, labels, examples)
+                puzzleExamples, puzzleCellLabels = puzzles.generatePuzzle(dimension, puzzleLabelSet, examples, rng = rng, gridBank = gridBank)
 
-                split['images'].append(puzzleImages)
-                split['cellLabels'].append(puzzleCellLabels)
-                split['labels'].append(puzzles.PUZZLE_LABEL_CORRECT)
-                split['notes'].append([puzzles.PUZZLE_NOTE_CORRRECT])
+                exampleIndexes.append(puzzleExamples)
+                cellLabels.append(puzzleCellLabels)
+                puzzleLabels.append(puzzles.PUZZLE_LABEL_CORRECT)
+                notes.append([puzzles.PUZZLE_NOTE_CORRRECT, puzzles.PUZZLE_NOTE_VIOLATIONS % (0)])
 
                 # Corrupt a puzzle.
 
-                corruptImages, corruptCellLabels, corruptNote = puzzles.corruptPuzzle(dimension, labels, examples, puzzleImages, puzzleCellLabels, corruptChance)
+                corruptExamples, corruptCellLabels, corruptNote, corruptViolations = puzzles.corruptPuzzle(
+                        dimension, puzzleLabelSet, examples, puzzleExamples, puzzleCellLabels, corruptChance, rng = rng, hard = hardCorruption)
 
-                split['images'].append(corruptImages)
-                split['cellLabels'].append(corruptCellLabels)
-                split['labels'].append(puzzles.PUZZLE_LABEL_INCORRECT)
-                split['notes'].append([corruptNote])
+                exampleIndexes.append(corruptExamples)
+                cellLabels.append(corruptCellLabels)
+                puzzleLabels.append(puzzles.PUZZLE_LABEL_INCORRECT)
+                notes.append([corruptNote, puzzles.PUZZLE_NOTE_VIOLATIONS % (corruptViolations)])
 
-        return train, test, valid
+                if (partition == splits.PARTITIONS[0]):
+                    seenLabels.update([label for grid in (puzzleCellLabels, corruptCellLabels) for row in grid for label in row])
 
-    def _mergeDatasets(self, data):
+            plan['partitions'][partition] = {
+                'labels': labels,
+                'cellLabels': numpy.array([[[labelIndexes[label] for label in row] for row in grid] for grid in cellLabels], dtype = numpy.int64).reshape((-1, dimension, dimension)),
+                'examples': numpy.array(exampleIndexes, dtype = numpy.int64).reshape((-1, dimension, dimension)),
+                'puzzleLabels': numpy.array(puzzleLabels, dtype = numpy.int64).reshape((-1, 2)),
+                'notes': notes,
+            }
+
+        return plan
+
+    def generateLabels(self, dimension, data, corruptChance, numTrain, numTest, numValid, gridBank = None, rng = None):
+        """
+        Create a new split of only labels (no images), see planLabels().
+        data only needs the labels of each dataset: {datasetName: {'labels': [label, ...]}, ...}.
+        Returns the same three dicts as generateSplit(), but with images set to None.
+        """
+
+        plan = self.planLabels(dimension, data, corruptChance, numTrain, numTest, numValid, rng = rng, gridBank = gridBank)
+        allLabels = numpy.array(plan['labels'], dtype = object)
+
+        results = []
+        for partition in splits.PARTITIONS:
+            partitionPlan = plan['partitions'][partition]
+
+            results.append({
+                'images': None,
+                'cellLabels': allLabels[partitionPlan['cellLabels']].tolist(),
+                'labels': partitionPlan['puzzleLabels'].tolist(),
+                'notes': partitionPlan['notes'],
+            })
+
+        return tuple(results)
+
+    def planLabels(self, dimension, data, corruptChance, numTrain, numTest, numValid, rng = None, gridBank = None):
+        """
+        The vectorized, label-only version of planSplit(): no datasets, examples, or images are touched.
+        Labels are chosen with the same rules as planSplit() (chooseSplitLabels() and choosePuzzleLabelSets()),
+        puzzles over exactly |dimension| labels are sampled from a grid bank (gridbank.getGridBank() if none is supplied),
+        and puzzles over more labels are built cell by cell (see labelpuzzles.fillGrids()).
+        All randomness comes from rng (a numpy.random.Generator, unseeded if not supplied).
+
+        Returns the same plan as planSplit(), without 'examples'.
+        """
+
+        if (rng is None):
+            rng = numpy.random.default_rng()
+
+        allLabels = self._mergeLabels(data)
+        partitionLabels = self.chooseSplitLabels(dimension, data, rng)
+
+        labelIndexes = {label: index for (index, label) in enumerate(allLabels)}
+
+        plan = {
+            'dimension': dimension,
+            'labels': allLabels,
+            'partitions': {},
+        }
+
+        seenLabels = []
+
+        for (partition, count, labels) in zip(splits.PARTITIONS, [numTrain, numTest, numValid], partitionLabels):
+            if (self.limitToSeenLabels and partition != splits.PARTITIONS[0]):
+                labels = list(sorted(seenLabels))
+
+            labelSets = self.choosePuzzleLabelSets(dimension, len(labels), count, rng)
+            numPuzzleLabels = labelSets.shape[1]
+
+            if (numPuzzleLabels == dimension):
+                if (gridBank is None):
+                    gridBank = gridbank.getGridBank(dimension)
+
+                grids = gridBank.sampleGrids(count, rng)
+            else:
+                grids = labelpuzzles.fillGrids(dimension, numPuzzleLabels, count, rng)
+
+            corruptGrids, corruptNotes, corruptViolations = labelpuzzles.corruptGrids(grids, numPuzzleLabels, corruptChance, rng)
+
+            # Grids hold indexes into each puzzle's labels, so map them back to indexes into all the labels.
+            partitionLabelIndexes = numpy.array([labelIndexes[label] for label in labels], dtype = numpy.int64)
+            puzzleLabelIndexes = partitionLabelIndexes[labelSets]
+
+            cellLabels = numpy.stack([grids, corruptGrids], axis = 1).reshape((count * 2, dimension ** 2))
+            cellLabels = numpy.take_along_axis(numpy.repeat(puzzleLabelIndexes, 2, axis = 0), cellLabels, axis = 1)
+
+            notes = []
+            for (corruptNote, violations) in zip(corruptNotes, corruptViolations.tolist()):
+                notes.append([puzzles.PUZZLE_NOTE_CORRRECT, puzzles.PUZZLE_NOTE_VIOLATIONS % (0)])
+                notes.append([corruptNote, puzzles.PUZZLE_NOTE_VIOLATIONS % (violations)])
+
+            if (partition == splits.PARTITIONS[0]):
+                seenLabels = [allLabels[index] for index in numpy.unique(cellLabels)]
+
+            plan['partitions'][partition] = {
+                'labels': labels,
+                'cellLabels': cellLabels.reshape((-1, dimension, dimension)),
+                'puzzleLabels': numpy.tile(numpy.array([puzzles.PUZZLE_LABEL_CORRECT, puzzles.PUZZLE_LABEL_INCORRECT], dtype = numpy.int64), (count, 1)),
+                'notes': notes,
+            }
+
+        return plan
+
+    def gatherSplit(self, plan, data, augmenter = None, rng = None, mergedData = None):
+        """
+        Turn a plan (see planSplit()) into puzzles, with a single gather of the images for each partition.
+        data must hold the same examples the plan was made from.
+        mergedData is the result of _mergeDatasets(data) to gather from (usually the same one the plan was made from, see generateSplit()).
+        Returns the same three dicts as generateSplit().
+        """
+
+        if (mergedData is None):
+            mergedData = self._mergeDatasets(data)
+
+        _, trainExamples, testExamples, validExamples = mergedData
+        allLabels = numpy.array(plan['labels'], dtype = object)
+
+        results = []
+        for (partition, examples) in zip(splits.PARTITIONS, [trainExamples, testExamples, validExamples]):
+            partitionPlan = plan['partitions'][partition]
+
+            if (len(partitionPlan['examples']) == 0):
+                images = numpy.empty(partitionPlan['examples'].shape + (datasets.MNIST_DIMENSION ** 2, ))
+            else:
+                images = gatherImages(examples, partitionPlan['examples'], augmenter = augmenter, rng = rng)
+
+            results.append({
+                'images': images,
+                'cellLabels': allLabels[partitionPlan['cellLabels']].tolist(),
+                'labels': partitionPlan['puzzleLabels'].tolist(),
+                'notes': partitionPlan['notes'],
+            })
+
+        return tuple(results)
+
+    def _mergeLabels(self, data):
         labels = []
+        for datasetName in data:
+            labels.extend(data[datasetName]['labels'])
+
+        return list(sorted(set(labels)))
+
+    def _mergeDatasets(self, data):
         trainExamples = {}
         testExamples = {}
         validExamples = {}
 
         for datasetName in data:
-            labels.extend(data[datasetName]['labels'])
             trainExamples.update(data[datasetName]['train']._examples)
             testExamples.update(data[datasetName]['test']._examples)
             validExamples.update(data[datasetName]['valid']._examples)
 
-        labels = list(sorted(set(labels)))
-        trainExamples = datasets.ExampleChooser(trainExamples)
-        testExamples = datasets.ExampleChooser(testExamples)
-        validExamples = datasets.ExampleChooser(validExamples)
+        replacement = any([data[datasetName]['train'].replacement for datasetName in data])
+
+        labels = self._mergeLabels(data)
+        trainExamples = datasets.ExampleChooser(trainExamples, replacement = replacement)
+        testExamples = datasets.ExampleChooser(testExamples, replacement = replacement)
+        validExamples = datasets.ExampleChooser(validExamples, replacement = replacement)
 
         return labels, trainExamples, testExamples, validExamples
 
@@ -133,15 +392,10 @@ class SimpleStrategy(BaseStrategy):
                     "%s (%s) can only be used with a single dataset, found [%s]." %
                     (type(self).__name__, self.name, ', '.join(arguments.datasetNames)))
 
-    def generateSplit(self, dimension, data, corruptChance, numTrain, numTest, numValid):
+    def chooseSplitLabels(self, dimension, data, rng):
         datasetName = list(data.keys())[0]
-        dataset = data[datasetName]
-
-        # Choose the first |dimension| labels.
-        labels = dataset['labels'][0:dimension]
-
-        return self._generateSplit(dimension, corruptChance, numTrain, numTest, numValid, labels,
-                dataset['train'], dataset['test'], dataset['valid'])
+        labels = data[datasetName]['labels'][0:dimension]
+        return labels, labels, labels
 
 class RandomSplitStrategy(BaseStrategy):
     """
@@ -151,138 +405,47 @@ class RandomSplitStrategy(BaseStrategy):
     def __init__(self):
         super().__init__('r_split')
 
-    def generateSplit(self, dimension, data, corruptChance, numTrain, numTest, numValid):
-        labels, trainExamples, testExamples, validExamples = self._mergeDatasets(data)
-
-        labels = random.sample(labels, k = dimension)
-
-        return self._generateSplit(dimension, corruptChance, numTrain, numTest, numValid, labels,
-                trainExamples, testExamples, validExamples)
+    def chooseSplitLabels(self, dimension, data, rng):
+        labels = _sampleLabels(self._mergeLabels(data), dimension, rng)
+        return labels, labels, labels
 
 class RandomPuzzleStrategy(BaseStrategy):
     """
     Choose |dimension| random classes from all datasets for each puzzle.
     """
 
+    # Reuse the same pool of labels from train for test/valid.
+    limitToSeenLabels = True
+
     def __init__(self):
         super().__init__('r_puzzle')
 
-    def generateSplit(self, dimension, data, corruptChance, numTrain, numTest, numValid):
-        baseLabels, trainExamples, testExamples, validExamples = self._mergeDatasets(data)
-
-        train = {
-            'images': [],
-            'cellLabels': [],
-            'labels': [],
-            'notes': [],
-        }
-        test = copy.deepcopy(train)
-        valid = copy.deepcopy(train)
-
-        splits = [
-            [train, numTrain, trainExamples],
-            [test, numTest, testExamples],
-            [valid, numValid, validExamples],
-        ]
-
-        # Reuse the same pool of labels from train for test/valid.
-        seenLabels = set()
-
-        for i in range(len(splits)):
-            (split, count, examples) = splits[i]
-
-            if (i != 0):
-                seenLabels = list(sorted(seenLabels))
+    def chooseSplitLabels(self, dimension, data, rng):
+        # planSplit() further limits test/valid to the labels seen in train (which, for enough puzzles, is all of them).
+        labels = self._mergeLabels(data)
+        return labels, labels, labels
 
-            for _ in range(count):
-                if (i == 0):
-                    labels = random.sample(baseLabels, k = dimension)
-                    seenLabels.update(set(labels))
-                else:
-                    labels = random.sample(seenLabels, k = dimension)
-
-                # Generate a correct puzzle.
-
-                puzzleImages, puzzleCellLabels = puzzles.generatePuzzle(dimension, labels, examples)
-
-                split['images'].append(puzzleImages)
-                split['cellLabels'].append(puzzleCellLabels)
-                split['labels'].append(puzzles.PUZZLE_LABEL_CORRECT)
-                split['notes'].append([puzzles.PUZZLE_NOTE_CORRRECT])
-
-                # Corrupt a puzzle.
+    def choosePuzzleLabels(self, dimension, labels, rng):
+        return _sampleLabels(labels, dimension, rng)
 
-                corruptImages, corruptCellLabels, corruptNote = puzzles.corruptPuzzle(dimension, labels, examples, puzzleImages, puzzleCellLabels, corruptChance)
-
-                split['images'].append(corruptImages)
-                split['cellLabels'].append(corruptCellLabels)
-                split['labels'].append(puzzles.PUZZLE_LABEL_INCORRECT)
-                split['notes'].append([corruptNote])
-
-        return train, test, valid
+    def choosePuzzleLabelSets(self, dimension, numLabels, count, rng):
+        return numpy.argsort(rng.random((count, numLabels)), axis = 1)[:, 0:dimension]
 
 class RandomCellStrategy(BaseStrategy):
     """
     Use all available classes (more than |dimension|) for every cell.
     """
 
+    # Reuse the same pool of labels from train for test/valid.
+    limitToSeenLabels = True
+
     def __init__(self):
         super().__init__('r_cell')
 
-    def generateSplit(self, dimension, data, corruptChance, numTrain, numTest, numValid):
-        baseLabels, trainExamples, testExamples, validExamples = self._mergeDatasets(data)
-
-        train = {
-            'images': [],
-            'cellLabels': [],
-            'labels': [],
-            'notes': [],
-        }
-        test = copy.deepcopy(train)
-        valid = copy.deepcopy(train)
-
-        splits = [
-            [train, numTrain, trainExamples],
-            [test, numTest, testExamples],
-            [valid, numValid, validExamples],
-        ]
-
-        # Reuse the same pool of labels from train for test/valid.
-        seenLabels = set()
-
-        for i in range(len(splits)):
-            (split, count, examples) = splits[i]
-
-            if (i == 0):
-                labels = baseLabels
-            else:
-                labels = list(sorted(seenLabels))
-
-            for _ in range(count):
-                # Generate a correct puzzle.
-
-                puzzleImages, puzzleCellLabels = puzzles.generatePuzzle(dimension, labels, examples)
-
-                split['images'].append(puzzleImages)
-                split['cellLabels'].append(puzzleCellLabels)
-                split['labels'].append(puzzles.PUZZLE_LABEL_CORRECT)
-                split['notes'].append([puzzles.PUZZLE_NOTE_CORRRECT])
-
-                # Corrupt a puzzle.
-
-                corruptImages, corruptCellLabels, corruptNote = puzzles.corruptPuzzle(dimension, labels, examples, puzzleImages, puzzleCellLabels, corruptChance)
-
-                split['images'].append(corruptImages)
-                split['cellLabels'].append(corruptCellLabels)
-                split['labels'].append(puzzles.PUZZLE_LABEL_INCORRECT)
-                split['notes'].append([corruptNote])
-
-                if (i == 0):
-                    # Keep track of all the labels we have seen.
-                    seenLabels.update(set([label for row in puzzleCellLabels for label in row]))
-                    seenLabels.update(set([label for row in corruptCellLabels for label in row]))
-
-        return train, test, valid
+    def chooseSplitLabels(self, dimension, data, rng):
+        # planSplit() further limits test/valid to the labels seen in train (which, for enough puzzles, is all of them).
+        labels = self._mergeLabels(data)
+        return labels, labels, labels
 
 class TransferStrategy(BaseStrategy):
     """
@@ -307,17 +470,9 @@ class TransferStrategy(BaseStrategy):
                     "%s (%s) does not have enough labels. Need %d, found %d." %
                     (type(self).__name__, self.name, (arguments.dimension * 2), datasets.NUM_LABELS[datasetName]))
 
-    def generateSplit(self, dimension, data, corruptChance, numTrain, numTest, numValid):
+    def chooseSplitLabels(self, dimension, data, rng):
         datasetName = list(data.keys())[0]
-        dataset = data[datasetName]
-
-        labels = dataset['labels'].copy()
-        random.shuffle(labels)
-
-        trainLabels = labels[0:dimension]
-        testLabels = labels[dimension:(dimension * 2)]
 
-        train, _, _ = self._generateSplit(dimension, corruptChance, numTrain, 0, 0, trainLabels, dataset['train'], None, None)
-        _, test, valid = self._generateSplit(dimension, corruptChance, 0, numTest, numValid, testLabels, None, dataset['test'], dataset['valid'])
+        labels = _sampleLabels(data[datasetName]['labels'], dimension * 2, rng)
 
-        return train, test, valid
+        return labels[0:dimension], labels[dimension:(dimension * 2)], labels[dimension:(dimension * 2)]
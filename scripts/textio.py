@@ -0,0 +1,405 @@
+'''
+Reading and writing the text files of splits, optionally compressed (with gzip, lzma (xz), or zlib).
+
+Compressed files keep their usual names, and readers detect the codec from the first bytes of a file.
+Writers compress on a background thread, and cut the text into independent members (gzip members, xz streams, or zlib streams)
+of about BLOCK_SIZE characters that always end on a line.
+So a compressed file can be appended to (a new member is just added to the end),
+gzip and xz files can be read with the usual tools (e.g. zcat and xzcat),
+and a reader can jump to any line by only decompressing the members that hold it (see LineIndex).
+'''
+
+import io
+import lzma
+import queue
+import threading
+import zlib
+
+CODEC_GZIP = 'gzip'
+CODEC_LZMA = 'lzma'
+CODEC_ZLIB = 'zlib'
+CODECS = [CODEC_GZIP, CODEC_LZMA, CODEC_ZLIB]
+
+# The level each codec uses when none is given (gzip and zlib take 0 - 9, and lzma takes a preset of 0 - 9).
+DEFAULT_LEVELS = {
+    CODEC_GZIP: 6,
+    CODEC_LZMA: 6,
+    CODEC_ZLIB: 6,
+}
+
+MIN_LEVEL = 0
+MAX_LEVEL = 9
+
+GZIP_MAGIC = b'\x1f\x8b'
+LZMA_MAGIC = b'\xfd7zXZ\x00'
+ZLIB_METHOD = 0x78
+
+ENCODING = 'utf-8'
+
+# About how much text (in characters) goes into each compressed member.
+BLOCK_SIZE = 2 ** 20
+
+# How many blocks can be waiting to be compressed before writers have to wait.
+WRITE_QUEUE_SIZE = 4
+
+# How many bytes to read from a compressed file at a time.
+READ_SIZE = 2 ** 16
+
+def detectCodec(path):
+    '''
+    Returns: the codec a file was compressed with, or None for plain text.
+    '''
+
+    with open(path, 'rb') as file:
+        header = file.read(len(LZMA_MAGIC))
+
+    if (header.startswith(GZIP_MAGIC)):
+        return CODEC_GZIP
+
+    if (header.startswith(LZMA_MAGIC)):
+        return CODEC_LZMA
+
+    # A zlib header is deflate (with any window) and a check value that makes it a multiple of 31.
+    # Split files are numbers and dataset labels, so plain text never starts this way.
+    if (len(header) >= 2 and header[0] == ZLIB_METHOD and ((header[0] << 8) | header[1]) % 31 == 0):
+        return CODEC_ZLIB
+
+    return None
+
+def compress(data, codec, level = None):
+    '''
+    Compress bytes into a single, complete member.
+    '''
+
+    if (level is None):
+        level = DEFAULT_LEVELS[codec]
+
+    if (codec == CODEC_GZIP):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+    if (codec == CODEC_LZMA):
+        return lzma.compress(data, format = lzma.FORMAT_XZ, preset = level)
+
+    if (codec == CODEC_ZLIB):
+        return zlib.compress(data, level)
+
+    raise ValueError("Unknown codec '%s'. Known codecs: [%s]." % (codec, ', '.join(CODECS)))
+
+def _newDecompressor(codec):
+    if (codec == CODEC_GZIP):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    if (codec == CODEC_LZMA):
+        return lzma.LZMADecompressor(format = lzma.FORMAT_XZ)
+
+    return zlib.decompressobj()
+
+def readMembers(file, codec, start = 0, end = None):
+    '''
+    Decompress the members of a (binary) file, from the byte offset start (which must be the start of a member) up to end.
+    Yields: (the byte offset of the member, the byte offset just past the member, the decompressed member).
+    '''
+
+    file.seek(start)
+
+    memberStart = start
+    position = start
+    decompressor = _newDecompressor(codec)
+    parts = []
+
+    while (end is None or position < end):
+        size = READ_SIZE
+        if (end is not None):
+            size = min(size, end - position)
+
+        data = file.read(size)
+        if (len(data) == 0):
+            break
+
+        position += len(data)
+
+        while (len(data) > 0):
+            parts.append(decompressor.decompress(data))
+            if (not decompressor.eof):
+                break
+
+            # Whatever is left over is the start of the next member.
+            data = decompressor.unused_data
+            memberEnd = position - len(data)
+
+            yield memberStart, memberEnd, b''.join(parts)
+
+            memberStart = memberEnd
+            decompressor = _newDecompressor(codec)
+            parts = []
+
+    if (memberStart != position):
+        raise ValueError("Truncated %s member at byte %d of %s." % (codec, memberStart, getattr(file, 'name', 'file')))
+
+class _MemberStream(io.RawIOBase):
+    '''
+    A raw (binary) stream of the decompressed contents of a compressed file.
+    '''
+
+    def __init__(self, path, codec):
+        self._file = open(path, 'rb')
+        self._members = readMembers(self._file, codec)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, out):
+        while (len(self._buffer) == 0):
+            member = next(self._members, None)
+            if (member is None):
+                return 0
+
+            self._buffer = member[2]
+
+        size = min(len(out), len(self._buffer))
+        out[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+
+        return size
+
+    def close(self):
+        if (not self.closed):
+            self._file.close()
+
+        super().close()
+
+def openRead(path, binary = False):
+    '''
+    Open a (possibly compressed) text file for reading, like open(path, 'r') (or 'rb' if binary).
+    '''
+
+    codec = detectCodec(path)
+    if (codec is None):
+        return open(path, 'rb' if binary else 'r')
+
+    stream = io.BufferedReader(_MemberStream(path, codec))
+    if (binary):
+        return stream
+
+    return io.TextIOWrapper(stream, encoding = ENCODING)
+
+class TextWriter(object):
+    '''
+    Write text to a file (a drop-in for the file from open(path, 'w') when only writing),
+    compressing it on a background thread if a codec is given.
+    With append, text (with the same codec) is added to the end of an existing file.
+    Any error from compressing or writing is raised from the next write() or from close().
+    '''
+
+    def __init__(self, path, codec = None, level = None, append = False):
+        if (codec is not None and codec not in CODECS):
+            raise ValueError("Unknown codec '%s'. Known codecs: [%s]." % (codec, ', '.join(CODECS)))
+
+        if (level is not None and (level < MIN_LEVEL or level > MAX_LEVEL)):
+            raise ValueError("Compression level must be in [%d, %d], got: %d." % (MIN_LEVEL, MAX_LEVEL, level))
+
+        self.path = path
+        self.codec = codec
+        self.level = level
+
+        if (codec is None):
+            self._file = open(path, 'a' if append else 'w')
+            return
+
+        self._file = open(path, 'ab' if append else 'wb')
+
+        self._buffer = []
+        self._bufferSize = 0
+
+        self._blocks = queue.Queue(maxsize = WRITE_QUEUE_SIZE)
+        self._exception = None
+
+        self._thread = threading.Thread(target = self._compressBlocks, daemon = True)
+        self._thread.start()
+
+    def write(self, text):
+        if (self.codec is None):
+            return self._file.write(text)
+
+        self._buffer.append(text)
+        self._bufferSize += len(text)
+
+        if (self._bufferSize >= BLOCK_SIZE):
+            self._flushLines()
+
+        return len(text)
+
+    def writelines(self, lines):
+        if (self.codec is None):
+            return self._file.writelines(lines)
+
+        for line in lines:
+            self.write(line)
+
+    def close(self):
+        if (self._file.closed):
+            return
+
+        if (self.codec is not None):
+            text = ''.join(self._buffer)
+            self._buffer = []
+
+            if (len(text) > 0):
+                self._putBlock(text)
+
+            self._blocks.put(None)
+            self._thread.join()
+
+        self._file.close()
+
+        if (self.codec is not None and self._exception is not None):
+            raise self._exception
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+    def _flushLines(self):
+        # Members always end on a line, so everything after the last newline waits for the next block.
+        text = ''.join(self._buffer)
+
+        end = text.rfind("\n") + 1
+        if (end == 0):
+            self._buffer = [text]
+            return
+
+        self._buffer = [text[end:]]
+        self._bufferSize = len(self._buffer[0])
+
+        self._putBlock(text[:end])
+
+    def _putBlock(self, text):
+        if (self._exception is not None):
+            raise self._exception
+
+        self._blocks.put(text)
+
+    def _compressBlocks(self):
+        while (True):
+            text = self._blocks.get()
+            if (text is None):
+                return
+
+            if (self._exception is not None):
+                continue
+
+            try:
+                self._file.write(compress(text.encode(ENCODING), self.codec, self.level))
+            except Exception as ex:
+                self._exception = ex
+
+class LineIndex(object):
+    '''
+    Random access to the non-empty lines of a (possibly compressed) text file.
+    Plain files index the byte offset of each line.
+    Compressed files index the members (grouped so every group ends on a line) and where each line is in its group,
+    so reading a line only decompresses its group (the last group read is kept).
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.codec = detectCodec(path)
+
+        # Plain: [offset, ...]. Compressed: [(group, offset within the group), ...].
+        self._lines = []
+
+        # Compressed: [(first byte, end byte), ...].
+        self._groups = []
+        self._cachedGroup = (None, None)
+
+        if (self.codec is None):
+            self._indexPlain()
+        else:
+            self._indexCompressed()
+
+    def __len__(self):
+        return len(self._lines)
+
+    def read(self, lineIndexes):
+        '''
+        Returns: [line (bytes, with its newline), ...].
+        '''
+
+        if (self.codec is None):
+            lines = []
+            with open(self.path, 'rb') as file:
+                for index in lineIndexes:
+                    file.seek(self._lines[index])
+                    lines.append(file.readline())
+
+            return lines
+
+        lines = [None] * len(lineIndexes)
+
+        # Read group by group, so each group is only decompressed once.
+        order = sorted(range(len(lineIndexes)), key = lambda i: self._lines[lineIndexes[i]][0])
+
+        with open(self.path, 'rb') as file:
+            for i in order:
+                (group, offset) = self._lines[lineIndexes[i]]
+                data = self._readGroup(file, group)
+
+                end = data.find(b"\n", offset) + 1
+                if (end == 0):
+                    end = len(data)
+
+                lines[i] = data[offset:end]
+
+        return lines
+
+    def _readGroup(self, file, group):
+        if (self._cachedGroup[0] != group):
+            (start, end) = self._groups[group]
+            data = b''.join([member for (_, _, member) in readMembers(file, self.codec, start, end)])
+            self._cachedGroup = (group, data)
+
+        return self._cachedGroup[1]
+
+    def _indexPlain(self):
+        with open(self.path, 'rb') as file:
+            offset = 0
+            for line in file:
+                if (line.strip() != b''):
+                    self._lines.append(offset)
+                offset += len(line)
+
+    def _indexCompressed(self):
+        with open(self.path, 'rb') as file:
+            groupStart = 0
+            groupEnd = 0
+            parts = []
+
+            for (memberStart, memberEnd, member) in readMembers(file, self.codec):
+                if (len(parts) == 0):
+                    groupStart = memberStart
+
+                parts.append(member)
+                groupEnd = memberEnd
+
+                if (not member.endswith(b"\n")):
+                    continue
+
+                self._addGroup(groupStart, groupEnd, b''.join(parts))
+                parts = []
+
+            if (len(parts) > 0):
+                self._addGroup(groupStart, groupEnd, b''.join(parts))
+
+    def _addGroup(self, start, end, data):
+        group = len(self._groups)
+        self._groups.append((start, end))
+
+        offset = 0
+        for line in io.BytesIO(data):
+            if (line.strip() != b''):
+                self._lines.append((group, offset))
+            offset += len(line)
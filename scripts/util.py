@@ -1,4 +1,64 @@
-def writeRows(path, rows):
-    with open(path, 'w') as file:
+import queue
+import threading
+
+import textio
+
+# How long (in seconds) a background producer waits on a full buffer before checking if it should stop.
+PREFETCH_POLL_SECONDS = 0.1
+
+def writeRows(path, rows, compression = None, compressionLevel = None):
+    """
+    compression is a codec from textio.CODECS (or None for plain text), see textio.TextWriter.
+    """
+
+    with textio.TextWriter(path, codec = compression, level = compressionLevel) as file:
         for row in rows:
             file.write('\t'.join([str(item) for item in row]) + "\n")
+
+def prefetch(items, bufferSize):
+    """
+    Iterate over items (any iterable) on a background thread, keeping up to bufferSize items ready.
+    Exceptions raised while producing items are re-raised in the consumer.
+    """
+
+    buffer = queue.Queue(maxsize = max(1, bufferSize))
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        while (not stop.is_set()):
+            try:
+                buffer.put(item, timeout = PREFETCH_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if (not put((item, None))):
+                    return
+        except Exception as ex:
+            put((done, ex))
+            return
+
+        put((done, None))
+
+    thread = threading.Thread(target = produce, daemon = True)
+    thread.start()
+
+    try:
+        while (True):
+            (item, exception) = buffer.get()
+            if (item is done):
+                if (exception is not None):
+                    raise exception
+
+                return
+
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,127 @@
+'''
+Handle virtual splits: splits that are stored as only their options,
+with any puzzle materialized on demand.
+
+Every puzzle (pair) gets its own random number generator derived from a counter-based generator (Philox)
+keyed on (seed, partition, index), so any puzzle can be made in O(1) without making the puzzles before it.
+Virtual puzzles follow the same strategies as generated splits, with two differences
+(since making a puzzle cannot depend on the puzzles before it):
+examples are drawn with replacement from each partition's examples (instead of being consumed),
+and test/valid draw from their partition's full set of labels (instead of only the labels seen in train).
+'''
+
+import numpy
+
+import datasets
+import gridbank
+import puzzles
+import splits
+import strategies
+
+# The key for the split-wide choices (e.g. which labels r_split uses).
+SPLIT_STREAM = len(splits.PARTITIONS)
+
+def getRandom(seed, stream, index):
+    '''
+    Get the (independent) random number generator (a numpy.random.Generator) for one puzzle pair (or split-wide choice) in O(1).
+    stream is the index of a partition in splits.PARTITIONS (or SPLIT_STREAM).
+    '''
+
+    # Philox increments the lowest word of the counter, so the puzzle is placed in the upper words.
+    return numpy.random.Generator(numpy.random.Philox(key = seed, counter = [0, 0, index, stream]))
+
+class VirtualSplit(object):
+    '''
+    A split that materializes any puzzle from its options (see generate-split.py --virtual).
+    Puzzles come in pairs: every even index is a correct puzzle and the following odd index is its corrupted copy.
+    '''
+
+    def __init__(self, splitDir, banks = None):
+        banks = banks or {}
+
+        self.options = splits.loadOptions(splitDir)
+        self.dimension = self.options['dimension']
+        self.strategy = strategies.getStrategy(self.options['strategy'])
+
+        self._seed = self.options['seed']
+
+        # Reserve examples exactly as generate-split.py would.
+        rng = numpy.random.default_rng(self._seed)
+
+        data = {}
+        for datasetName in self.options['datasets']:
+            labels, trainExamples, testExamples, validExamples = datasets.fetchData(
+                    self.dimension, datasetName, self.options['overlap'],
+                    self.options['numTrain'], self.options['numTest'], self.options['numValid'],
+                    bank = banks.get(datasetName), rng = rng)
+
+            data[datasetName] = {
+                'labels': labels,
+                'train': datasets.ExampleChooser(trainExamples._examples, replacement = True),
+                'test': datasets.ExampleChooser(testExamples._examples, replacement = True),
+                'valid': datasets.ExampleChooser(validExamples._examples, replacement = True),
+            }
+
+        self.labels = splits.getLabels(self.options)
+
+        _, trainExamples, testExamples, validExamples = self.strategy._mergeDatasets(data)
+        self._examples = dict(zip(splits.PARTITIONS, [trainExamples, testExamples, validExamples]))
+
+        self._gridBank = None
+        if (self.options.get('gridBank', False)):
+            self._gridBank = gridbank.getGridBank(self.dimension)
+
+        rng = getRandom(self._seed, SPLIT_STREAM, 0)
+        self._partitionLabels = dict(zip(splits.PARTITIONS, self.strategy.chooseSplitLabels(self.dimension, data, rng)))
+
+    def numPuzzles(self, partition):
+        return 2 * self.options[splits.PARTITION_SIZE_OPTIONS[partition]]
+
+    def getPuzzle(self, partition, index):
+        '''
+        Materialize a single puzzle.
+
+        Returns:
+            (images, cellLabels, puzzleLabel, notes) in the same form the strategies produce.
+        '''
+
+        if (index < 0 or index >= self.numPuzzles(partition)):
+            raise IndexError("Puzzle index %d is out of range for %s (%d puzzles)." % (index, partition, self.numPuzzles(partition)))
+
+        rng = getRandom(self._seed, splits.PARTITIONS.index(partition), index // 2)
+        examples = self._examples[partition]
+
+        labels = self.strategy.choosePuzzleLabels(self.dimension, self._partitionLabels[partition], rng)
+        puzzleImages, puzzleCellLabels = puzzles.generatePuzzle(self.dimension, labels, examples, rng = rng, gridBank = self._gridBank)
+
+        if (index % 2 == 0):
+            notes = [puzzles.PUZZLE_NOTE_CORRRECT, puzzles.PUZZLE_NOTE_VIOLATIONS % (0)]
+            return puzzleImages, puzzleCellLabels, puzzles.PUZZLE_LABEL_CORRECT, notes
+
+        corruptImages, corruptCellLabels, corruptNote, corruptViolations = puzzles.corruptPuzzle(
+                self.dimension, labels, examples, puzzleImages, puzzleCellLabels, self.options['corruptChance'], rng = rng,
+                hard = self.options.get('hardCorruption', False))
+
+        notes = [corruptNote, puzzles.PUZZLE_NOTE_VIOLATIONS % (corruptViolations)]
+        return corruptImages, corruptCellLabels, puzzles.PUZZLE_LABEL_INCORRECT, notes
+
+    def getBatch(self, partition, indexes):
+        '''
+        Materialize puzzles as arrays (the same batches splits.SplitLoader gives).
+        '''
+
+        numCells = self.dimension ** 2
+        labelIndexes = {label: index for (index, label) in enumerate(self.labels)}
+
+        images = numpy.empty((len(indexes), numCells, datasets.MNIST_DIMENSION ** 2), dtype = numpy.float32)
+        cellLabels = numpy.empty((len(indexes), numCells), dtype = numpy.int64)
+        puzzleLabels = numpy.empty((len(indexes), 2), dtype = numpy.int64)
+
+        for (i, index) in enumerate(indexes):
+            puzzleImages, puzzleCellLabels, puzzleLabel, _ = self.getPuzzle(partition, index)
+
+            images[i] = [cell for row in puzzleImages for cell in row]
+            cellLabels[i] = [labelIndexes[label] for row in puzzleCellLabels for label in row]
+            puzzleLabels[i] = puzzleLabel
+
+        return images, cellLabels, puzzleLabels